@@ -15,7 +15,7 @@ curl -X POST http://localhost:8001/admin/auto-import-youtube \
 echo "Import completed, starting cleanup..." >> /home/smcso/vid_stream/auto_import.log
 
 # Cleanup old unwatched autobot videos (older than 7 days, max 100)
-curl -X POST "http://localhost:8001/admin/cleanup-autobot-videos?days_old=7&max_videos=100" \
+curl -X POST "http://localhost:8001/admin/cleanup-bot-videos?username=autobot&days_old=7&max_videos=100" \
   >> /home/smcso/vid_stream/auto_import.log 2>&1
 
 echo "=== Completed at $(date) ===" >> /home/smcso/vid_stream/auto_import.log
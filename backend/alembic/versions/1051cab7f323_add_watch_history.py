@@ -0,0 +1,46 @@
+"""add_watch_history
+
+Revision ID: 1051cab7f323
+Revises: beaaa57fc263
+Create Date: 2026-10-19 17:52:36.804412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1051cab7f323'
+down_revision: Union[str, Sequence[str], None] = 'beaaa57fc263'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Range-partitioned by month; watch_history.ensure_partitions creates the partitions
+    op.execute("""
+        CREATE TABLE watch_history (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            watched_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+            session_id VARCHAR(64) NOT NULL,
+            watch_duration INTEGER NOT NULL,
+            video_duration INTEGER,
+            completion_percentage NUMERIC(5, 2),
+            last_position INTEGER,
+            watch_source VARCHAR(50),
+            PRIMARY KEY (id, watched_at),
+            CONSTRAINT uq_watch_history_session UNIQUE (user_id, video_id, session_id, watched_at)
+        ) PARTITION BY RANGE (watched_at)
+    """)
+    op.execute("CREATE INDEX ix_watch_history_user_watched ON watch_history (user_id, watched_at DESC)")
+    op.execute("CREATE INDEX ix_watch_history_video_watched ON watch_history (video_id, watched_at)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Dropping the parent drops every partition
+    op.drop_table('watch_history')
@@ -0,0 +1,29 @@
+"""add_videos_to_user_watch_rollups
+
+Revision ID: 29d62c1e178a
+Revises: c1cf0c90e3c0
+Create Date: 2026-10-19 21:05:12.481932
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '29d62c1e178a'
+down_revision: Union[str, Sequence[str], None] = 'c1cf0c90e3c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Distinct videos per bucket; existing rows are filled by POST /admin/backfill-watch-stats
+    op.add_column('user_watch_rollups', sa.Column('videos', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_watch_rollups', 'videos')
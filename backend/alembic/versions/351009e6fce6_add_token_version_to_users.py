@@ -0,0 +1,28 @@
+"""add_token_version_to_users
+
+Revision ID: 351009e6fce6
+Revises: fbd67505b074
+Create Date: 2026-10-19 15:48:20.631907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '351009e6fce6'
+down_revision: Union[str, Sequence[str], None] = 'fbd67505b074'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
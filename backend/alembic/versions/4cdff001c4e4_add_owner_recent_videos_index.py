@@ -0,0 +1,32 @@
+"""add_owner_recent_videos_index
+
+Revision ID: 4cdff001c4e4
+Revises: 351009e6fce6
+Create Date: 2026-10-19 16:32:07.418265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4cdff001c4e4'
+down_revision: Union[str, Sequence[str], None] = '351009e6fce6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Subscriptions feed reads each followed channel's newest completed videos
+    op.execute("""
+        CREATE INDEX ix_videos_owner_completed_recent
+        ON videos (owner_id, upload_date DESC, id DESC)
+        WHERE processing_status = 'completed'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_videos_owner_completed_recent', table_name='videos')
@@ -0,0 +1,28 @@
+"""add_live_low_latency_to_videos
+
+Revision ID: 7a037cd7dec3
+Revises: ae7734533ed9
+Create Date: 2026-10-19 14:02:37.915204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a037cd7dec3'
+down_revision: Union[str, Sequence[str], None] = 'ae7734533ed9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('videos', sa.Column('live_low_latency', sa.Boolean(), nullable=True, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('videos', 'live_low_latency')
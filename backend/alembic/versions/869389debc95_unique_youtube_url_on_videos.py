@@ -0,0 +1,42 @@
+"""unique_youtube_url_on_videos
+
+Revision ID: 869389debc95
+Revises: aa36af002264
+Create Date: 2026-10-19 11:24:05.910377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '869389debc95'
+down_revision: Union[str, Sequence[str], None] = 'aa36af002264'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Remove duplicate YouTube imports (keeping the oldest) before adding the unique constraint
+    op.execute("""
+        CREATE TEMP TABLE duplicate_youtube_videos AS
+        SELECT v.id FROM videos v
+        WHERE v.youtube_url IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM videos o
+              WHERE o.youtube_url = v.youtube_url AND o.id < v.id
+          )
+    """)
+    op.execute("DELETE FROM video_likes WHERE video_id IN (SELECT id FROM duplicate_youtube_videos)")
+    op.execute("DELETE FROM playlist_videos WHERE video_id IN (SELECT id FROM duplicate_youtube_videos)")
+    op.execute("DELETE FROM videos WHERE id IN (SELECT id FROM duplicate_youtube_videos)")
+    op.execute("DROP TABLE duplicate_youtube_videos")
+
+    op.create_unique_constraint('videos_youtube_url_key', 'videos', ['youtube_url'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('videos_youtube_url_key', 'videos', type_='unique')
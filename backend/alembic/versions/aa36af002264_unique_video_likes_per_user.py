@@ -0,0 +1,42 @@
+"""unique_video_likes_per_user
+
+Revision ID: aa36af002264
+Revises: af23311db334
+Create Date: 2026-10-19 10:02:17.544109
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aa36af002264'
+down_revision: Union[str, Sequence[str], None] = 'af23311db334'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Drop duplicate reactions left by double-clicks, keeping the newest one
+    op.execute("""
+        DELETE FROM video_likes a
+        USING video_likes b
+        WHERE a.user_id = b.user_id
+          AND a.video_id = b.video_id
+          AND a.id < b.id
+    """)
+    op.create_unique_constraint('uq_video_likes_user_video', 'video_likes', ['user_id', 'video_id'])
+
+    # Counters drifted along with the duplicates; recompute them once
+    op.execute("""
+        UPDATE videos SET
+            likes = (SELECT count(*) FROM video_likes vl WHERE vl.video_id = videos.id AND vl.is_like),
+            dislikes = (SELECT count(*) FROM video_likes vl WHERE vl.video_id = videos.id AND NOT vl.is_like)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_video_likes_user_video', 'video_likes', type_='unique')
@@ -0,0 +1,32 @@
+"""add_image_variants
+
+Revision ID: ae7734533ed9
+Revises: b5143eaec7d4
+Create Date: 2026-10-19 13:15:02.481377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ae7734533ed9'
+down_revision: Union[str, Sequence[str], None] = 'b5143eaec7d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('videos', sa.Column('thumbnail_variants', sa.JSON(), nullable=True))
+    op.add_column('users', sa.Column('avatar_variants', sa.JSON(), nullable=True))
+    op.add_column('users', sa.Column('banner_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'banner_variants')
+    op.drop_column('users', 'avatar_variants')
+    op.drop_column('videos', 'thumbnail_variants')
@@ -0,0 +1,28 @@
+"""add_unique_viewers_to_videos
+
+Revision ID: af23311db334
+Revises: 1033de0fb71e
+Create Date: 2026-10-19 09:12:41.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'af23311db334'
+down_revision: Union[str, Sequence[str], None] = '1033de0fb71e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('videos', sa.Column('unique_viewers', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('videos', 'unique_viewers')
@@ -0,0 +1,35 @@
+"""add_last_checked_at_to_videos
+
+Revision ID: b5143eaec7d4
+Revises: 869389debc95
+Create Date: 2026-10-19 12:40:53.127604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5143eaec7d4'
+down_revision: Union[str, Sequence[str], None] = '869389debc95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('videos', sa.Column('last_checked_at', sa.DateTime(timezone=True), nullable=True))
+    # Availability checker scans YouTube videos oldest-checked first
+    op.execute("""
+        CREATE INDEX ix_videos_youtube_last_checked
+        ON videos (last_checked_at ASC NULLS FIRST, id)
+        WHERE youtube_url IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_videos_youtube_last_checked', table_name='videos')
+    op.drop_column('videos', 'last_checked_at')
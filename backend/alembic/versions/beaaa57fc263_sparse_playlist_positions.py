@@ -0,0 +1,38 @@
+"""sparse_playlist_positions
+
+Revision ID: beaaa57fc263
+Revises: c61adc408e14
+Create Date: 2026-10-19 17:24:13.550981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'beaaa57fc263'
+down_revision: Union[str, Sequence[str], None] = 'c61adc408e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Spread existing positions 1024 apart (playlists.POSITION_GAP) so moves have room
+    op.execute("""
+        UPDATE playlist_videos SET position = ordered.rn * 1024
+        FROM (
+            SELECT playlist_id, video_id,
+                   row_number() OVER (PARTITION BY playlist_id ORDER BY position, added_at, video_id) AS rn
+            FROM playlist_videos
+        ) AS ordered
+        WHERE playlist_videos.playlist_id = ordered.playlist_id AND playlist_videos.video_id = ordered.video_id
+    """)
+    # Playlist pages are read in position order
+    op.create_index('ix_playlist_videos_position', 'playlist_videos', ['playlist_id', 'position'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_playlist_videos_position', table_name='playlist_videos')
@@ -0,0 +1,39 @@
+"""add_user_watch_rollups
+
+Revision ID: c1cf0c90e3c0
+Revises: 1051cab7f323
+Create Date: 2026-10-19 18:21:09.377160
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1cf0c90e3c0'
+down_revision: Union[str, Sequence[str], None] = '1051cab7f323'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_watch_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Date(), nullable=False),
+    sa.Column('dimension', sa.String(length=16), nullable=False),
+    sa.Column('item', sa.String(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('seconds', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('completions', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completion_sum', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'bucket', 'dimension', 'item')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_watch_rollups')
@@ -0,0 +1,28 @@
+"""add_subscriptions_reverse_index
+
+Revision ID: c61adc408e14
+Revises: 4cdff001c4e4
+Create Date: 2026-10-19 16:58:41.203517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61adc408e14'
+down_revision: Union[str, Sequence[str], None] = '4cdff001c4e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The primary key covers subscriber -> channel; follower lookups and counts need the reverse
+    op.create_index('ix_subscriptions_subscribed_to', 'subscriptions', ['subscribed_to_id', 'subscriber_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_subscriptions_subscribed_to', table_name='subscriptions')
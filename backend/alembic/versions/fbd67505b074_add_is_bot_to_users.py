@@ -0,0 +1,43 @@
+"""add_is_bot_to_users
+
+Revision ID: fbd67505b074
+Revises: 7a037cd7dec3
+Create Date: 2026-10-19 15:11:48.402716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fbd67505b074'
+down_revision: Union[str, Sequence[str], None] = '7a037cd7dec3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Accounts previously hardcoded in /admin/cleanup-bot-videos and create_content_users.py
+BOT_USERNAMES = [
+    "autobot", "techreviewer", "gamingpro", "foodiechef", "musiclover",
+    "sciencegeek", "fitnessguru", "naturewild", "outdoorexplorer",
+    "devopsguru", "aienthusiast", "politicsnow", "cryptofinance",
+    "photogeek", "mindfulzen", "newstoday", "diycrafter", "biztips",
+    "polyglot", "filmcritic", "truecrime", "stargazer", "podcastclips",
+    "latenightcomedy", "jazzblues", "rockmusic", "triphop", "indierock",
+    "singersongwriter", "shoegaze", "autochannel", "cleanupbot",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('is_bot', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.execute(
+        sa.text("UPDATE users SET is_bot = true WHERE username = ANY(:usernames)")
+        .bindparams(usernames=BOT_USERNAMES)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'is_bot')
@@ -0,0 +1,221 @@
+"""Cache of authenticated principals.
+
+Access tokens carry the user's id (``uid``) and token version (``ver``) next
+to the username, and authenticating a request only needs the minimal
+principal behind them: id, is_active and current token version. That is kept
+in a per-worker TTL cache, backed by an optional Redis tier shared by all
+workers, so an authenticated request normally costs a dictionary lookup
+instead of a users query.
+
+A token is accepted only while its ``ver`` matches ``users.token_version``;
+bumping the version (password change, deactivation) revokes every token
+issued before. Whatever changes a user calls ``invalidate``, which also tells
+the other workers over pub/sub to drop their copy.
+
+A load can race an invalidation: it reads the row, ``invalidate`` runs, and
+then the load writes the old row back. To refuse that write, ``invalidate``
+bumps a per-user generation in Redis (``auth:gen:{id}``). A load only writes
+the Redis tier if the generation is still the one it read before querying.
+Locally, a process-wide invalidation counter plays the same role.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from . import models, singleflight
+from .database import SessionLocal
+from .redis_client import REDIS_URL, redis_client
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))  # Seconds a worker trusts its copy
+AUTH_CACHE_REDIS_TTL = int(os.getenv("AUTH_CACHE_REDIS_TTL", "600"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_REDIS = os.getenv("AUTH_CACHE_REDIS", "true").lower() in ("1", "true", "yes")
+CHANNEL = "auth:invalidate"
+GENERATION_TTL = 24 * 3600  # Far longer than any load takes
+
+# Write the principal only if no invalidation happened since the load read the generation
+# KEYS[1] = principal, KEYS[2] = generation; ARGV = expected generation ('' if none), principal, ttl
+_STORE_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return nil
+"""
+
+
+class Principal:
+    """The authenticated user as route handlers see it (use .id to load anything else)"""
+    __slots__ = ("id", "is_active", "token_version")
+
+    def __init__(self, id: int, is_active: bool, token_version: int):
+        self.id = id
+        self.is_active = is_active
+        self.token_version = token_version
+
+    def to_json(self) -> str:
+        return json.dumps([self.id, self.is_active, self.token_version])
+
+    @classmethod
+    def from_json(cls, data: str) -> "Principal":
+        return cls(*json.loads(data))
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, tuple]" = OrderedDict()  # user id -> (expires, Principal)
+_usernames: "OrderedDict[str, int]" = OrderedDict()  # username -> user id, for tokens issued before uid was added
+_invalidation_count = 0  # Bumped by every invalidate; a load that saw it change doesn't cache locally
+_stats = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+# Concurrent misses for one user (a page firing several calls at once) share one query
+_load_flight = singleflight.group("auth_principals")
+
+
+def _redis_key(user_id: int) -> str:
+    return f"auth:principal:{user_id}"
+
+
+def _generation_key(user_id: int) -> str:
+    return f"auth:gen:{user_id}"
+
+
+def _remember(principal: Principal, invalidation_count: Optional[int] = None):
+    with _lock:
+        if invalidation_count is not None and invalidation_count != _invalidation_count:
+            return
+        _entries[principal.id] = (time.monotonic() + AUTH_CACHE_TTL, principal)
+        _entries.move_to_end(principal.id)
+        while len(_entries) > AUTH_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def _load(user_id: int) -> Optional[Principal]:
+    generation = None
+    if AUTH_CACHE_REDIS:
+        try:
+            generation = redis_client.get(_generation_key(user_id)) or ""
+        except redis.RedisError:
+            pass
+    db = SessionLocal()
+    try:
+        row = db.query(
+            models.User.id, models.User.is_active, models.User.token_version
+        ).filter(models.User.id == user_id).first()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    # is_active is nullable; rows created before the column defaulted to active
+    principal = Principal(row.id, row.is_active is not False, row.token_version or 0)
+    if generation is not None:
+        try:
+            redis_client.eval(
+                _STORE_SCRIPT, 2, _redis_key(user_id), _generation_key(user_id),
+                generation, principal.to_json(), AUTH_CACHE_REDIS_TTL
+            )
+        except redis.RedisError:
+            pass
+    return principal
+
+
+def principal_for(user_id: int) -> Optional[Principal]:
+    """The cached principal for a user id, loading it on a miss (None if the user is gone)"""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _stats["hits"] += 1
+            return entry[1]
+        invalidation_count = _invalidation_count
+
+    principal = None
+    if AUTH_CACHE_REDIS:
+        try:
+            data = redis_client.get(_redis_key(user_id))
+            if data:
+                principal = Principal.from_json(data)
+                _stats["redis_hits"] += 1
+        except redis.RedisError:
+            pass
+    if principal is None:
+        _stats["misses"] += 1
+        principal = _load_flight.do(str(user_id), _load, user_id)
+        if principal is None:
+            return None
+    _remember(principal, invalidation_count)
+    return principal
+
+
+def principal_for_username(username: str) -> Optional[Principal]:
+    """Resolve a legacy (username-only) token; the username -> id mapping is cached too"""
+    with _lock:
+        user_id = _usernames.get(username)
+        if user_id is not None:
+            _usernames.move_to_end(username)
+    if user_id is None:
+        db = SessionLocal()
+        try:
+            user_id = db.query(models.User.id).filter(models.User.username == username).scalar()
+        finally:
+            db.close()
+        if user_id is None:
+            return None
+        with _lock:
+            _usernames[username] = user_id
+            while len(_usernames) > AUTH_CACHE_MAX_ENTRIES:
+                _usernames.popitem(last=False)
+    return principal_for(user_id)
+
+
+def invalidate(user_id: int, broadcast: bool = True):
+    """Forget a user's principal here, in Redis and (via pub/sub) in every other worker"""
+    global _invalidation_count
+    with _lock:
+        _entries.pop(user_id, None)
+        _invalidation_count += 1
+        _stats["invalidations"] += 1
+    if not broadcast:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(_generation_key(user_id))
+        pipe.expire(_generation_key(user_id), GENERATION_TTL)
+        pipe.delete(_redis_key(user_id))
+        pipe.execute()
+        redis_client.publish(CHANNEL, str(user_id))
+    except redis.RedisError:
+        pass  # Other workers catch up within AUTH_CACHE_TTL
+
+
+def revoke_tokens(user: models.User):
+    """Invalidate every token issued to user so far; commit, then call invalidate(user.id)"""
+    user.token_version = (user.token_version or 0) + 1
+
+
+def stats() -> dict:
+    with _lock:
+        result = dict(_stats)
+        result["entries"] = len(_entries)
+    lookups = result["hits"] + result["redis_hits"] + result["misses"]
+    result["hit_ratio"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    return result
+
+
+async def listen():
+    """Drop principals other workers have invalidated"""
+    while True:
+        try:
+            client = aioredis.from_url(REDIS_URL, decode_responses=True)
+            pubsub = client.pubsub()
+            await pubsub.subscribe(CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    invalidate(int(message["data"]), broadcast=False)
+        except Exception as e:
+            print(f"Auth cache listener error, reconnecting: {e}")
+            await asyncio.sleep(2)
@@ -0,0 +1,163 @@
+"""Rolling availability checker for imported YouTube videos.
+
+Each video carries ``last_checked_at``; every run takes the videos checked
+longest ago (never-checked first), so repeated cron runs sweep the whole
+library instead of re-checking the same rows. A pass cursor in Redis records
+when the current sweep started and how far it got.
+
+Availability is probed with YouTube's oEmbed endpoint (a small JSON response)
+instead of a full yt-dlp extraction, with bounded concurrency. Deletions and
+``last_checked_at`` updates are applied per batch in one transaction, and file
+cleanup happens on the background cleanup thread.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import nullsfirst
+
+from . import cleanup, models
+from .database import SessionLocal
+from .redis_client import redis_client
+
+AVAILABILITY_CONCURRENCY = int(os.getenv("AVAILABILITY_CONCURRENCY", "16"))
+AVAILABILITY_BATCH_SIZE = 200
+PASS_KEY = "availability_check:pass"
+OEMBED_URL = "https://www.youtube.com/oembed"
+
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=AVAILABILITY_CONCURRENCY, pool_maxsize=AVAILABILITY_CONCURRENCY))
+
+
+def probe(youtube_id: str) -> Optional[bool]:
+    """True if available, False if deleted/private/unembeddable, None if we couldn't tell"""
+    try:
+        response = _http.get(OEMBED_URL, params={
+            "url": f"https://www.youtube.com/watch?v={youtube_id}",
+            "format": "json",
+        }, timeout=10)
+    except requests.RequestException:
+        return None
+    if response.status_code == 200:
+        return True
+    if response.status_code in (401, 403, 404):
+        # 404: deleted/never existed, 401/403: private or embedding disabled (unplayable here)
+        return False
+    return None  # Rate limited or YouTube error, retry next run
+
+
+def _load_pass() -> dict:
+    try:
+        state = redis_client.hgetall(PASS_KEY)
+    except redis.RedisError as e:
+        print(f"Error reading availability pass cursor: {e}")
+        state = {}
+    if not state:
+        state = {"started_at": str(time.time()), "checked": "0", "unavailable": "0"}
+    return state
+
+
+def _save_pass(state: dict):
+    try:
+        redis_client.hset(PASS_KEY, mapping=state)
+    except redis.RedisError as e:
+        print(f"Error saving availability pass cursor: {e}")
+
+
+def check_availability(limit: int, delete_unavailable: bool) -> dict:
+    """Check up to `limit` least-recently-checked YouTube videos"""
+    state = _load_pass()
+    pass_started = datetime.fromtimestamp(float(state["started_at"]), tz=timezone.utc)
+
+    checked_count = 0
+    available_count = 0
+    unknown_count = 0
+    deleted_count = 0
+    unavailable_videos = []
+
+    run_started = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=AVAILABILITY_CONCURRENCY) as pool:
+            while checked_count + unknown_count < limit:
+                batch = db.query(
+                    models.Video.id, models.Video.youtube_url, models.Video.title
+                ).filter(
+                    models.Video.youtube_url.isnot(None),
+                    # Never re-check a video this run already stamped
+                    (models.Video.last_checked_at.is_(None)) | (models.Video.last_checked_at < run_started)
+                ).order_by(
+                    nullsfirst(models.Video.last_checked_at.asc()), models.Video.id
+                ).limit(min(AVAILABILITY_BATCH_SIZE, limit - checked_count - unknown_count)).all()
+                if not batch:
+                    break
+
+                results = list(pool.map(lambda video: probe(video.youtube_url), batch))
+
+                now = datetime.now(timezone.utc)
+                checked_ids = []
+                unavailable_ids = []
+                for video, available in zip(batch, results):
+                    if available is None:
+                        unknown_count += 1
+                    else:
+                        checked_ids.append(video.id)
+                    if available:
+                        available_count += 1
+                    elif available is False:
+                        unavailable_ids.append(video.id)
+                        unavailable_videos.append({
+                            "id": video.id,
+                            "title": video.title,
+                            "youtube_url": video.youtube_url,
+                        })
+
+                # Stamp everything we probed (even inconclusive ones, so one flaky video
+                # can't stall the sweep); inconclusive ones come round again next pass
+                db.query(models.Video).filter(
+                    models.Video.id.in_([video.id for video in batch])
+                ).update({models.Video.last_checked_at: now}, synchronize_session=False)
+
+                # Stamps and deletions for the batch commit together
+                if delete_unavailable and unavailable_ids:
+                    deleted_count += len(cleanup.delete_videos(db, unavailable_ids))
+                else:
+                    db.commit()
+
+                checked_count += len(checked_ids)
+                print(f"Availability batch: {len(checked_ids)} checked, {len(unavailable_ids)} unavailable")
+
+        # Advance the pass cursor; once every video has been checked since the pass
+        # started, the sweep is complete and the next run starts a new one
+        remaining = db.query(models.Video.id).filter(
+            models.Video.youtube_url.isnot(None),
+            (models.Video.last_checked_at.is_(None)) | (models.Video.last_checked_at < pass_started)
+        ).count()
+    finally:
+        db.close()
+
+    state["checked"] = str(int(state["checked"]) + checked_count)
+    state["unavailable"] = str(int(state["unavailable"]) + len(unavailable_videos))
+    pass_complete = remaining == 0
+    if pass_complete:
+        print(f"Availability pass complete: {state['checked']} checked, {state['unavailable']} unavailable")
+        state = {"started_at": str(time.time()), "checked": "0", "unavailable": "0"}
+    _save_pass(state)
+
+    return {
+        "message": f"Checked {checked_count} videos: {available_count} available, {len(unavailable_videos)} unavailable",
+        "total_checked": checked_count,
+        "available": available_count,
+        "unknown": unknown_count,
+        "unavailable_count": len(unavailable_videos),
+        "unavailable": unavailable_videos,
+        "deleted": deleted_count,
+        "pass_remaining": remaining,
+        "pass_complete": pass_complete,
+    }
@@ -0,0 +1,304 @@
+"""Set-based video deletion and background file cleanup.
+
+Deleting rows and deleting files are decoupled: rows go in one transaction
+(dependents first, then ``DELETE ... RETURNING`` the paths we need), and the
+returned files are handed to a background thread so request handlers and batch
+jobs never block on disk I/O.
+
+``collect_orphan_files`` is the safety net for everything that path misses
+(crashes between commit and unlink, abandoned uploads, streams whose worker
+died): it reconciles the media directories against the database and reports,
+or removes, whatever no row refers to any more.
+"""
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import hls_splice, media, models, response_cache, segment_cache, streams, tv_channel
+from .redis_client import redis_client
+
+PROCESSED_DIR = "/app/processed_videos"
+UPLOAD_DIR = "/app/uploads"
+UPLOAD_TEMP_DIR = "/app/uploads/temp"
+THUMBNAIL_DIR = "/app/thumbnails"
+DERIVED_DIR = "/app/thumbnails/derived"
+
+DELETE_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "200"))
+# Files younger than this are never orphans: uploads are written before their row exists
+ORPHAN_MIN_AGE = int(os.getenv("ORPHAN_GC_MIN_AGE", "3600"))
+ORPHAN_SAMPLE_SIZE = 20  # Paths listed per location in a report
+ORPHAN_GC_LOCK = "cleanup:orphan_gc"
+
+_file_queue: "queue.Queue[str]" = queue.Queue()
+_worker_started = False
+_worker_lock = threading.Lock()
+
+
+def _file_deletion_worker():
+    while True:
+        path = _file_queue.get()
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Error deleting {path}: {e}")
+        finally:
+            _file_queue.task_done()
+
+
+def schedule_file_deletion(paths: Iterable[str]):
+    """Queue files or directories for deletion on the background cleanup thread"""
+    global _worker_started
+    with _worker_lock:
+        if not _worker_started:
+            threading.Thread(target=_file_deletion_worker, name="file-cleanup", daemon=True).start()
+            _worker_started = True
+    for path in paths:
+        if path:
+            _file_queue.put(path)
+
+
+def pending_file_deletions() -> int:
+    return _file_queue.qsize()
+
+
+def local_thumbnail_path(thumbnail_path: str):
+    """Map a public /thumbnails/... or /processed/... path to the file on disk"""
+    if not thumbnail_path or not thumbnail_path.startswith("/"):
+        return None  # External URL (e.g. placeholder image)
+    if thumbnail_path.startswith("/processed/"):
+        return os.path.join(PROCESSED_DIR, thumbnail_path[len("/processed/"):])
+    return f"/app{thumbnail_path}"
+
+
+def video_file_paths(video_id: int, file_path: str, thumbnail_path: str) -> List[str]:
+    """Every file or directory on disk that belongs to a video"""
+    paths = [
+        file_path,
+        local_thumbnail_path(thumbnail_path),
+        os.path.join(PROCESSED_DIR, str(video_id)),
+    ]
+    return [path for path in paths if path]
+
+
+def delete_videos(db: Session, video_ids: List[int]) -> List[int]:
+    """Delete videos and their dependent rows in one transaction, then queue their files.
+
+    Commits the session. Returns the ids that were actually deleted.
+    """
+    if not video_ids:
+        return []
+    params = {"ids": list(video_ids)}
+    db.execute(text("DELETE FROM video_likes WHERE video_id = ANY(:ids)"), params)
+    db.execute(text("DELETE FROM playlist_videos WHERE video_id = ANY(:ids)"), params)
+    rows = db.execute(text(
+        "DELETE FROM videos WHERE id = ANY(:ids) RETURNING id, file_path, thumbnail_path"
+    ), params).fetchall()
+
+    db.commit()
+
+    # Only touch the disk once the rows are gone for good
+    paths = []
+    for row in rows:
+        paths.extend(video_file_paths(row.id, row.file_path, row.thumbnail_path))
+    schedule_file_deletion(paths)
+    segment_cache.invalidate_videos(row.id for row in rows)
+    for row in rows:
+        hls_splice.invalidate_video(row.id)
+        media.forget_video(row.id)
+    tv_channel.forget_videos([row.id for row in rows])
+    if rows:
+        response_cache.invalidate("video_deleted")
+    return [row.id for row in rows]
+
+
+def delete_unwatched_videos(
+    db: Session, owner_ids: List[int], cutoff: datetime, max_per_owner: int
+) -> Dict[int, int]:
+    """Delete up to max_per_owner of each owner's oldest videos with no views or likes.
+
+    Candidates are picked in one query and removed in ``DELETE_BATCH_SIZE``
+    batches, each its own short transaction. Every batch re-checks (and locks)
+    its rows first, so a video that got watched in the meantime survives.
+    Returns the number of videos deleted per owner.
+    """
+    if not owner_ids or max_per_owner <= 0:
+        return {}
+    candidates = db.execute(text("""
+        SELECT id, owner_id FROM (
+            SELECT id, owner_id,
+                   row_number() OVER (PARTITION BY owner_id ORDER BY upload_date, id) AS position
+            FROM videos
+            WHERE owner_id = ANY(:owner_ids)
+              AND upload_date < :cutoff
+              AND views = 0 AND likes = 0
+        ) ranked
+        WHERE position <= :max_per_owner
+    """), {"owner_ids": list(owner_ids), "cutoff": cutoff, "max_per_owner": max_per_owner}).fetchall()
+    db.commit()
+
+    owners = {row.id: row.owner_id for row in candidates}
+    ids = list(owners)
+    deleted = {owner_id: 0 for owner_id in owner_ids}
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        still_unwatched = [row.id for row in db.execute(text("""
+            SELECT id FROM videos
+            WHERE id = ANY(:ids) AND views = 0 AND likes = 0
+            FOR UPDATE SKIP LOCKED
+        """), {"ids": ids[start:start + DELETE_BATCH_SIZE]})]
+        if not still_unwatched:
+            db.commit()
+            continue
+        for video_id in delete_videos(db, still_unwatched):
+            deleted[owners[video_id]] += 1
+    return deleted
+
+
+# --- Orphan file collection ---------------------------------------------------
+
+
+def _size_of(path: str) -> int:
+    """Bytes used by a file or a directory tree (without following symlinks)"""
+    try:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+    except OSError:
+        return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _old_enough(path: str, now: float) -> bool:
+    try:
+        return now - os.lstat(path).st_mtime >= ORPHAN_MIN_AGE
+    except OSError:
+        return False
+
+
+def _entries(directory: str) -> List[os.DirEntry]:
+    try:
+        return list(os.scandir(directory))
+    except OSError:
+        return []
+
+
+def _variant_urls(variants: Optional[dict]) -> Iterable[str]:
+    for entry in ((variants or {}).get("srcset") or {}).values():
+        for key, value in entry.items():
+            if key != "width" and isinstance(value, str):
+                yield value
+
+
+def _referenced(db: Session) -> Tuple[Set[int], Set[str], Set[str], Set[str]]:
+    """Video ids, upload files, thumbnail files and derived files the database refers to"""
+    video_ids = set()
+    uploads = set()
+    thumbnail_files = set()
+    derived = set()
+    rows = db.query(
+        models.Video.id, models.Video.file_path, models.Video.thumbnail_path, models.Video.thumbnail_variants
+    ).yield_per(1000)
+    for video_id, file_path, thumbnail_path, variants in rows:
+        video_ids.add(video_id)
+        if file_path:
+            uploads.add(os.path.normpath(file_path))
+        local = local_thumbnail_path(thumbnail_path)
+        if local:
+            thumbnail_files.add(os.path.normpath(local))
+        derived.update(_variant_urls(variants))
+    for avatar_variants, banner_variants in db.query(models.User.avatar_variants, models.User.banner_variants):
+        derived.update(_variant_urls(avatar_variants))
+        derived.update(_variant_urls(banner_variants))
+    derived_files = {os.path.normpath(local_thumbnail_path(url)) for url in derived if url.startswith("/")}
+    return video_ids, uploads, thumbnail_files, derived_files
+
+
+def _find_orphans(db: Session, now: float) -> Dict[str, List[str]]:
+    video_ids, uploads, thumbnail_files, derived_files = _referenced(db)
+    orphans: Dict[str, List[str]] = {
+        "uploads": [], "uploads_temp": [], "processed_videos": [], "thumbnails": [], "streams": [],
+    }
+
+    for entry in _entries(UPLOAD_DIR):
+        if entry.is_file(follow_symlinks=False) and entry.path not in uploads:
+            orphans["uploads"].append(entry.path)
+
+    # Metadata extraction removes its temp copy itself; anything left is from a crash
+    for entry in _entries(UPLOAD_TEMP_DIR):
+        orphans["uploads_temp"].append(entry.path)
+
+    for entry in _entries(PROCESSED_DIR):
+        if entry.name.isdigit() and int(entry.name) not in video_ids:
+            orphans["processed_videos"].append(entry.path)
+
+    for entry in _entries(THUMBNAIL_DIR):
+        if entry.is_file(follow_symlinks=False) and entry.path not in thumbnail_files:
+            orphans["thumbnails"].append(entry.path)
+    for bucket in _entries(DERIVED_DIR):
+        for entry in _entries(bucket.path):
+            if entry.is_file(follow_symlinks=False) and entry.path not in derived_files:
+                orphans["thumbnails"].append(entry.path)
+
+    # A stream directory is live while some worker holds its ownership claim
+    claimed = set(streams.supervisor.active_stream_ids()) | set(streams.supervisor.streams)
+    for entry in _entries(streams.STREAMS_DIR):
+        if entry.name.isdigit() and int(entry.name) not in claimed:
+            orphans["streams"].append(entry.path)
+
+    return {
+        location: [path for path in paths if _old_enough(path, now)]
+        for location, paths in orphans.items()
+    }
+
+
+def claim_orphan_collection(interval: int) -> bool:
+    """True if this worker should run the periodic collection (one per interval cluster-wide)"""
+    try:
+        return bool(redis_client.set(ORPHAN_GC_LOCK, streams.WORKER_ID, nx=True, ex=max(60, interval - 60)))
+    except redis.RedisError:
+        return True  # Single-worker fallback; collecting twice is harmless
+
+
+def collect_orphan_files(db: Session, dry_run: bool = True) -> dict:
+    """Reconcile media directories with the database.
+
+    Reports orphaned files/directories and the bytes they use per location;
+    unless dry_run, also queues them for deletion.
+    """
+    started = time.time()
+    orphans = _find_orphans(db, started)
+    locations = {}
+    total_files = 0
+    total_bytes = 0
+    for location, paths in orphans.items():
+        size = sum(_size_of(path) for path in paths)
+        locations[location] = {"orphans": len(paths), "bytes": size, "sample": paths[:ORPHAN_SAMPLE_SIZE]}
+        total_files += len(paths)
+        total_bytes += size
+        if not dry_run:
+            schedule_file_deletion(paths)
+
+    return {
+        "dry_run": dry_run,
+        "orphans": total_files,
+        "reclaimable_bytes": total_bytes,
+        "locations": locations,
+        "min_age_seconds": ORPHAN_MIN_AGE,
+        "duration_seconds": round(time.time() - started, 3),
+    }
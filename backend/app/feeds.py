@@ -0,0 +1,193 @@
+"""Card projections for video list endpoints.
+
+Feeds, search, trending, channel pages and the related/similar sidebars only
+render a card per video: title, thumbnail (with srcset and placeholder),
+duration, views, date, status, tags and the channel name. ``card_query``
+selects just those columns, joined to the owner in the same statement, and
+``card_response`` maps the rows straight into dicts serialized with orjson.
+No ORM objects, no lazy owner loads, no per-row pydantic validation.
+
+``schemas.VideoCard`` documents the shape; full videos (description, file and
+stream URLs, likes) still come from ``/videos/{id}``.
+
+``similar_video_ids`` ranks the similar sidebar in SQL over the videos that
+share the channel or a tag, so it never loads the whole table.
+
+``subscription_page`` is the subscriptions feed: a k-way merge of the followed
+channels' newest videos, paged by an opaque (upload_date, id) cursor.
+"""
+import base64
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import case, func, select, text, true, tuple_
+from sqlalchemy.orm import Query, Session
+
+from . import models
+
+SIMILAR_LIMIT = 10
+
+# Same channel +50, each shared tag +10, uploaded this week +5 / month +2, likes * 0.5, views * 0.01
+SIMILAR_VIDEOS_SQL = text("""
+SELECT v.id FROM videos v
+WHERE v.processing_status = 'completed' AND v.id <> :video_id
+  AND (v.owner_id = :owner_id OR v.tags && CAST(:tags AS varchar[]))
+ORDER BY
+    CASE WHEN v.owner_id = :owner_id THEN 50 ELSE 0 END
+    + 10 * (SELECT count(DISTINCT tag) FROM unnest(v.tags) AS tag WHERE tag = ANY(CAST(:tags AS varchar[])))
+    + CASE WHEN v.upload_date > now() - interval '7 days' THEN 5
+           WHEN v.upload_date > now() - interval '30 days' THEN 2 ELSE 0 END
+    + coalesce(v.likes, 0) * 0.5 + coalesce(v.views, 0) * 0.01 DESC,
+    v.id DESC
+LIMIT :limit
+""")
+
+CARD_COLUMNS = (
+    models.Video.id,
+    models.Video.title,
+    models.Video.thumbnail_path,
+    models.Video.thumbnail_variants["srcset"].label("thumbnail_srcset"),
+    models.Video.thumbnail_variants["placeholder"].label("thumbnail_placeholder"),
+    models.Video.duration,
+    models.Video.views,
+    models.Video.upload_date,
+    models.Video.processing_status,
+    models.Video.is_live_stream,
+    models.Video.tags,
+    models.Video.owner_id,
+    models.User.username.label("owner_username"),
+    models.User.channel_name.label("owner_channel_name"),
+)
+
+
+def trending_score_expression():
+    """SQL expression for the trending score (trending feed, cache warming, TV channel)"""
+    # Calculate trending score:
+    # Score = views * 1 + unique_viewers * 2 + likes * 5 + (like_ratio * 10) - (days_old * 0.1)
+    # Like ratio = likes / (likes + dislikes) if total > 0, else 0.5
+    # This weights: views (1x), unique viewers (2x, resistant to replayed views),
+    # likes (5x), engagement quality (10x), and recency
+    now = func.now()
+    days_old = func.extract('epoch', now - models.Video.upload_date) / 86400.0
+    total_reactions = models.Video.likes + models.Video.dislikes
+    like_ratio = case(
+        (total_reactions > 0, models.Video.likes * 1.0 / total_reactions),
+        else_=0.5
+    )
+
+    return (
+        models.Video.views * 1.0 +
+        func.coalesce(models.Video.unique_viewers, 0) * 2.0 +
+        models.Video.likes * 5.0 +
+        like_ratio * 10.0 -
+        days_old * 0.1
+    )
+
+
+def similar_video_ids(db: Session, video_id: int, owner_id: Optional[int], tags: Optional[List[str]],
+                      limit: int = SIMILAR_LIMIT) -> List[int]:
+    """Videos from the same channel or sharing a tag, best first, topped up with trending ones"""
+    ids = list(db.execute(SIMILAR_VIDEOS_SQL, {
+        "video_id": video_id, "owner_id": owner_id, "tags": list(tags or []), "limit": limit,
+    }).scalars())
+    if len(ids) < limit:
+        ids += [row.id for row in db.query(models.Video.id).filter(
+            models.Video.processing_status == "completed",
+            models.Video.id.notin_(ids + [video_id])
+        ).order_by(trending_score_expression().desc()).limit(limit - len(ids))]
+    return ids
+
+
+def card_query(db: Session) -> Query:
+    """Query of card rows; filter and order it like a models.Video query"""
+    return db.query(*CARD_COLUMNS).outerjoin(models.User, models.User.id == models.Video.owner_id)
+
+
+def card(row) -> dict:
+    owner = None
+    if row.owner_username is not None:
+        owner = {"id": row.owner_id, "username": row.owner_username, "channel_name": row.owner_channel_name}
+    return {
+        "id": row.id,
+        "title": row.title,
+        "thumbnail_path": row.thumbnail_path,
+        "thumbnail_srcset": row.thumbnail_srcset,
+        "thumbnail_placeholder": row.thumbnail_placeholder,
+        "duration": row.duration,
+        "views": row.views or 0,
+        "upload_date": row.upload_date,
+        "processing_status": row.processing_status,
+        "is_live_stream": bool(row.is_live_stream),
+        "tags": row.tags or [],
+        "owner_id": row.owner_id,
+        "owner": owner,
+    }
+
+
+def cards_by_ids(db: Session, video_ids: List[int]) -> list:
+    """Card rows for video_ids, in that order (missing videos are skipped)"""
+    if not video_ids:
+        return []
+    rows = {row.id: row for row in card_query(db).filter(models.Video.id.in_(video_ids))}
+    return [rows[video_id] for video_id in video_ids if video_id in rows]
+
+
+def card_response(rows: Iterable, headers: Optional[dict] = None) -> ORJSONResponse:
+    return ORJSONResponse([card(row) for row in rows], headers=headers)
+
+
+def encode_cursor(upload_date: datetime, video_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{upload_date.isoformat()}|{video_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on anything it didn't produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        upload_date, video_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(upload_date), int(video_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def subscription_page(
+    db: Session, subscriber_id: int, limit: int, cursor: Optional[str] = None
+) -> Tuple[list, Optional[str]]:
+    """One page of the subscriptions feed, newest first, and the cursor for the next page (None at the end).
+
+    Each followed channel contributes at most limit + 1 rows, read from
+    ix_videos_owner_completed_recent in a LATERAL subquery, and only those
+    are merged. The cost depends on the page size and the number of channels
+    followed, not on how many videos those channels have.
+    """
+    sub = models.subscriptions
+    conditions = [
+        models.Video.owner_id == sub.c.subscribed_to_id,
+        models.Video.processing_status == "completed",
+        models.Video.upload_date.isnot(None),
+    ]
+    if cursor:
+        conditions.append(tuple_(models.Video.upload_date, models.Video.id) < tuple_(*decode_cursor(cursor)))
+
+    recent = (
+        select(models.Video.id, models.Video.upload_date)
+        .where(*conditions)
+        .order_by(models.Video.upload_date.desc(), models.Video.id.desc())
+        .limit(limit + 1)
+        .lateral("recent")
+    )
+    stmt = (
+        select(recent.c.id, recent.c.upload_date)
+        .select_from(sub.join(recent, true()))
+        .where(sub.c.subscriber_id == subscriber_id)
+        .order_by(recent.c.upload_date.desc(), recent.c.id.desc())
+        .limit(limit + 1)
+    )
+    merged = db.execute(stmt).all()
+
+    next_cursor = None
+    if len(merged) > limit:
+        merged = merged[:limit]
+        next_cursor = encode_cursor(merged[-1].upload_date, merged[-1].id)
+    return cards_by_ids(db, [row.id for row in merged]), next_cursor
@@ -0,0 +1,204 @@
+"""Virtual HLS playlists that splice several processed videos into one stream.
+
+Every processed video already has a VOD media playlist in
+``/app/processed_videos/<id>/`` (one rendition, ``-hls_time 10``). A spliced
+playlist lists the segments of several videos back to back and puts an
+``#EXT-X-DISCONTINUITY`` at each video boundary. The player keeps one HLS
+session across videos, and we never run ffmpeg or copy a segment. The
+segment URIs point at the normal ``/processed/...`` files, so they are
+served (and cached) exactly as they are for single videos.
+
+Each video's playlist is parsed once and kept in an LRU keyed by file path.
+The entry is re-stat'ed at most every ``REVALIDATE_SECONDS`` and dropped by
+``invalidate_video`` on reprocess/delete. Only finished playlists
+(``#EXT-X-ENDLIST``) are cached or spliced. Building a spliced playlist is
+then only string assembly.
+
+Two shapes:
+
+- ``vod_playlist``: a window of consecutive videos, as a VOD playlist. Very
+  long playlists are played a window at a time.
+- ``live_playlist``: the videos looping forever as a live channel. Where the
+  channel is at a given moment is derived from the wall clock and a fixed
+  epoch: (now - epoch) modulo the loop length. The response is a sliding
+  window of ``LIVE_WINDOW_SEGMENTS`` segments ending at that point, with
+  media and discontinuity sequence numbers counted from the epoch. Every
+  viewer and every worker sees the same channel without shared state.
+  Changing the video list shifts the schedule from that moment on.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+PROCESSED_DIR = "/app/processed_videos"
+PARSED_CACHE_SIZE = int(os.getenv("HLS_SPLICE_CACHE_SIZE", "4096"))  # Parsed video playlists kept in memory
+REVALIDATE_SECONDS = 30
+LIVE_WINDOW_SEGMENTS = 6
+
+
+class ParsedPlaylist(NamedTuple):
+    video_id: int
+    segments: List[Tuple[float, str]]  # (duration, URI), in order
+    duration: float
+
+
+class _Entry:
+    __slots__ = ("playlist", "mtime_ns", "size", "checked_at")
+
+    def __init__(self, playlist: ParsedPlaylist, stat: os.stat_result):
+        self.playlist = playlist
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.checked_at = time.monotonic()
+
+
+_lock = threading.Lock()
+_parsed: "OrderedDict[str, _Entry]" = OrderedDict()
+
+
+def _parse(video_id: int, path: str, uri_prefix: str) -> Optional[ParsedPlaylist]:
+    try:
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    if "#EXT-X-ENDLIST" not in lines:
+        return None  # Still being segmented
+    segments = []
+    duration = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            except ValueError:
+                duration = None
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((duration, uri_prefix + line))
+            duration = None
+    if not segments:
+        return None
+    return ParsedPlaylist(video_id, segments, sum(duration for duration, _ in segments))
+
+
+def parsed_playlist(video_id: int, hls_path: Optional[str]) -> Optional[ParsedPlaylist]:
+    """A processed video's segment list, from the cache when it is still current. None if it can't be spliced."""
+    if not hls_path or not hls_path.startswith("/processed/"):
+        return None
+    path = os.path.join(PROCESSED_DIR, hls_path[len("/processed/"):])
+    with _lock:
+        entry = _parsed.get(path)
+        if entry is not None and time.monotonic() - entry.checked_at < REVALIDATE_SECONDS:
+            _parsed.move_to_end(path)
+            return entry.playlist
+    try:
+        stat = os.stat(path)
+    except OSError:
+        invalidate_path(path)
+        return None
+    if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+        entry.checked_at = time.monotonic()
+        return entry.playlist
+
+    playlist = _parse(video_id, path, os.path.dirname(hls_path) + "/")
+    with _lock:
+        if playlist is None:
+            _parsed.pop(path, None)
+        else:
+            _parsed[path] = _Entry(playlist, stat)
+            _parsed.move_to_end(path)
+            while len(_parsed) > PARSED_CACHE_SIZE:
+                _parsed.popitem(last=False)
+    return playlist
+
+
+def parsed_playlists(videos: Sequence) -> List[ParsedPlaylist]:
+    """Parsed playlists for rows with id and hls_path, in order, skipping videos that can't be spliced"""
+    return [
+        playlist for playlist in (parsed_playlist(video.id, video.hls_path) for video in videos)
+        if playlist is not None
+    ]
+
+
+def invalidate_path(path: str):
+    with _lock:
+        _parsed.pop(path, None)
+
+
+def invalidate_video(video_id: int):
+    prefix = os.path.join(PROCESSED_DIR, str(video_id)) + os.sep
+    with _lock:
+        for path in [path for path in _parsed if path.startswith(prefix)]:
+            del _parsed[path]
+
+
+def _target_duration(playlists: Sequence[ParsedPlaylist]) -> int:
+    return max(math.ceil(duration) for playlist in playlists for duration, _ in playlist.segments)
+
+
+def vod_playlist(playlists: Sequence[ParsedPlaylist]) -> str:
+    """One VOD playlist playing the given videos back to back"""
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        f"#EXT-X-TARGETDURATION:{_target_duration(playlists)}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for index, playlist in enumerate(playlists):
+        if index:
+            lines.append("#EXT-X-DISCONTINUITY")
+        for duration, uri in playlist.segments:
+            lines.append(f"#EXTINF:{duration:.6f},")
+            lines.append(uri)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def live_playlist(
+    playlists: Sequence[ParsedPlaylist], epoch: float, now: Optional[float] = None,
+    window: int = LIVE_WINDOW_SEGMENTS
+) -> str:
+    """Sliding-window live playlist of the videos looping forever since epoch (unix seconds)"""
+    now = time.time() if now is None else now
+    # Start offset of every segment within one loop, and where each video's segments begin
+    segment_starts, first_segment_of = [], []
+    offset = 0.0
+    for playlist in playlists:
+        first_segment_of.append(len(segment_starts))
+        for duration, _ in playlist.segments:
+            segment_starts.append(offset)
+            offset += duration
+    loop_length, loop_segments = offset, len(segment_starts)
+
+    elapsed = max(now - epoch, 0.0)
+    loop, position = divmod(elapsed, loop_length)
+    loop = int(loop)
+    live_edge = loop * loop_segments + bisect.bisect_right(segment_starts, position) - 1
+    first = max(live_edge - window + 1, 0)
+
+    entries = []
+    for absolute in range(first, live_edge + 1):
+        loop_index, index = divmod(absolute, loop_segments)
+        video = bisect.bisect_right(first_segment_of, index) - 1
+        duration, uri = playlists[video].segments[index - first_segment_of[video]]
+        entries.append((loop_index * len(playlists) + video, index == first_segment_of[video], duration, uri))
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{_target_duration(playlists)}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        # Each video boundary since the epoch is one discontinuity
+        f"#EXT-X-DISCONTINUITY-SEQUENCE:{entries[0][0]}",
+    ]
+    for position_in_window, (_, starts_video, duration, uri) in enumerate(entries):
+        if starts_video and position_in_window:
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append(f"#EXTINF:{duration:.6f},")
+        lines.append(uri)
+    return "\n".join(lines) + "\n"
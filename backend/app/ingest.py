@@ -0,0 +1,217 @@
+"""Ingest worker pool for slow outbound work (yt-dlp extraction, thumbnail downloads).
+
+API handlers enqueue a job and return its id straight away. Jobs run in a
+dedicated threadpool with its own queue, separate from the request threadpool,
+and outbound fetches are capped by a semaphore so a large backfill can't
+saturate the uplink or get rate limited. Job state is kept in Redis (falling
+back to process memory) so any backend worker can answer status polls.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy.exc import IntegrityError
+
+from . import models, response_cache, thumbnails
+from .database import SessionLocal
+from .redis_client import redis_client
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_FETCH_CONCURRENCY = int(os.getenv("INGEST_FETCH_CONCURRENCY", "4"))
+JOB_TTL = 24 * 3600  # Keep job results for a day
+THUMBNAIL_DIR = "/app/thumbnails"
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+fetch_slots = threading.BoundedSemaphore(INGEST_FETCH_CONCURRENCY)
+_local_jobs: Dict[str, dict] = {}
+
+# Pooled HTTP client for thumbnail downloads
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=INGEST_FETCH_CONCURRENCY, pool_maxsize=INGEST_FETCH_CONCURRENCY))
+_http.mount("http://", HTTPAdapter(pool_connections=INGEST_FETCH_CONCURRENCY, pool_maxsize=INGEST_FETCH_CONCURRENCY))
+
+
+def _save_job(job: dict):
+    _local_jobs[job["job_id"]] = job
+    try:
+        redis_client.setex(f"ingest_job:{job['job_id']}", JOB_TTL, json.dumps(job, default=str))
+    except redis.RedisError as e:
+        print(f"Error saving ingest job {job['job_id']} to Redis: {e}")
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    try:
+        data = redis_client.get(f"ingest_job:{job_id}")
+        if data:
+            return json.loads(data)
+    except redis.RedisError as e:
+        print(f"Error reading ingest job {job_id} from Redis: {e}")
+    return _local_jobs.get(job_id)
+
+
+def _run_job(job: dict, fn: Callable, args: tuple, kwargs: dict):
+    job.update(status="running", started_at=time.time())
+    _save_job(job)
+    try:
+        result = fn(*args, **kwargs)
+        job.update(status="completed", result=result, finished_at=time.time())
+    except Exception as e:
+        print(f"Ingest job {job['job_id']} ({job['kind']}) failed: {e}")
+        job.update(status="failed", error=str(e), finished_at=time.time())
+    _save_job(job)
+
+
+def submit_job(kind: str, fn: Callable, *args: Any, **kwargs: Any) -> str:
+    """Queue fn on the ingest pool and return a job id for status polling"""
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "created_at": time.time(),
+    }
+    _save_job(job)
+    _executor.submit(_run_job, job, fn, args, kwargs)
+    return job["job_id"]
+
+
+def fetch_youtube_info(youtube_id: str) -> dict:
+    """Fetch full metadata for a single YouTube video"""
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+    }
+    with fetch_slots:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(f"https://www.youtube.com/watch?v={youtube_id}", download=False)
+
+
+def download_thumbnail(thumbnail_url: str, youtube_id: str) -> str:
+    """Download a YouTube thumbnail and return its public path"""
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    thumbnail_filename = f"youtube_{youtube_id}.jpg"
+
+    with fetch_slots:
+        response = _http.get(thumbnail_url, timeout=10)
+    response.raise_for_status()
+
+    with open(os.path.join(THUMBNAIL_DIR, thumbnail_filename), "wb") as f:
+        f.write(response.content)
+    return f"/thumbnails/{thumbnail_filename}"
+
+
+def add_youtube_video_job(youtube_id: str, tag_list: List[str], owner_id: int) -> dict:
+    """Fetch metadata + thumbnail for a YouTube video and create its record"""
+    # It may have been added between queueing and now; the unique index still backs this up
+    db = SessionLocal()
+    try:
+        exists = db.query(models.Video.id).filter(models.Video.youtube_url == youtube_id).first() is not None
+    finally:
+        db.close()
+    if exists:
+        raise RuntimeError("This YouTube video has already been added")
+
+    try:
+        info = fetch_youtube_info(youtube_id)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch YouTube video info: {e}")
+
+    title = info.get('title', 'Untitled YouTube Video')
+    description = info.get('description', '')
+    duration = info.get('duration', 0)  # Duration in seconds
+    thumbnail_url = info.get('thumbnail', '')
+
+    thumbnail_path = None
+    if thumbnail_url:
+        try:
+            thumbnail_path = download_thumbnail(thumbnail_url, youtube_id)
+        except Exception as e:
+            print(f"Failed to download YouTube thumbnail: {e}")
+
+    db = SessionLocal()
+    try:
+        db_video = models.Video(
+            title=title,
+            description=description[:500] if description else None,  # Limit description length
+            tags=tag_list,
+            youtube_url=youtube_id,  # Store just the video ID
+            file_path=None,
+            thumbnail_path=thumbnail_path,
+            owner_id=owner_id,
+            processing_status="completed",  # YouTube videos are immediately available
+            duration=duration
+        )
+        db.add(db_video)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise RuntimeError("This YouTube video has already been added")
+        db.refresh(db_video)
+        response_cache.invalidate("video_added")
+        if thumbnail_path:
+            thumbnails.enqueue_video_thumbnail(db_video.id)
+        return {"video_id": db_video.id, "title": db_video.title}
+    finally:
+        db.close()
+
+
+def backfill_thumbnails_job(limit: int) -> dict:
+    """Backfill missing thumbnails for YouTube videos"""
+    db = SessionLocal()
+    try:
+        videos = db.query(models.Video.id, models.Video.youtube_url, models.Video.title).filter(
+            models.Video.youtube_url.isnot(None),
+            models.Video.thumbnail_path.is_(None)
+        ).limit(limit).all()
+    finally:
+        db.close()
+
+    if not videos:
+        return {"message": "No videos missing thumbnails", "updated": 0, "failed": 0, "total_processed": 0}
+
+    def fetch(video):
+        info = fetch_youtube_info(video.youtube_url)
+        thumbnail_url = info.get('thumbnail')
+        if not thumbnail_url:
+            raise RuntimeError("No thumbnail URL found")
+        return download_thumbnail(thumbnail_url, video.youtube_url)
+
+    updates = []
+    failed_count = 0
+    # Fetches are bounded by the fetch semaphore; the nested pool only overlaps them
+    with ThreadPoolExecutor(max_workers=INGEST_FETCH_CONCURRENCY) as pool:
+        for video, future in [(v, pool.submit(fetch, v)) for v in videos]:
+            try:
+                updates.append({"id": video.id, "thumbnail_path": future.result()})
+                print(f"✓ Updated thumbnail for video {video.id}: {video.title[:50]}")
+            except Exception as e:
+                failed_count += 1
+                print(f"✗ Failed to backfill thumbnail for video {video.id}: {e}")
+
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(models.Video, updates)
+        db.commit()
+    finally:
+        db.close()
+
+    for update in updates:
+        thumbnails.enqueue_video_thumbnail(update["id"])
+
+    return {
+        "message": f"Backfilled {len(updates)} thumbnails, {failed_count} failed",
+        "updated": len(updates),
+        "failed": failed_count,
+        "total_processed": len(videos)
+    }
+
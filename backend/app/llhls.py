@@ -0,0 +1,344 @@
+"""Low-latency live mode (LL-HLS) for RTSP streams.
+
+ffmpeg writes short fMP4 chunks (``LL_PART_SECONDS``, a forced keyframe at each)
+plus its own rolling playlist of them. Every chunk becomes an LL-HLS *part*,
+and each run of ``LL_SEGMENT_PARTS`` parts becomes a full segment, served as
+the concatenation of its parts (``seg_<msn>.m4s``). The playlist players see
+is rendered from in-memory state, never read from disk per request:
+
+- state is refreshed when ffmpeg logs that it opened its next chunk (it has
+  just finished the previous one), not on a timer;
+- ``_HLS_msn``/``_HLS_part`` requests block until that part exists;
+- the preload hint lets players request the next part before it is written.
+
+The owning worker publishes each state change over Redis pub/sub so blocking
+reloads work on whichever backend worker a request lands on.
+
+Every ffmpeg start writes files under a new run prefix (``r<run>_``, from
+``next_run``) and is marked with EXT-X-DISCONTINUITY, so names never collide
+across restarts or owners. A worker that takes a stream over starts from
+fresh state (``claim``) rather than the previous owner's snapshot.
+
+State is only mutated on the event loop (file reads and Redis writes run in
+threads), so renders and blocked reloads never see a half-applied merge.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from .redis_client import REDIS_URL, redis_client
+
+LL_PART_SECONDS = float(os.getenv("LL_PART_SECONDS", "0.5"))
+LL_SEGMENT_PARTS = int(os.getenv("LL_SEGMENT_PARTS", "4"))  # 4 x 0.5s = 2s segments
+PLAYLIST_SEGMENTS = 6  # Complete segments kept in the playlist
+PART_SEGMENTS = 3  # Segments at the live edge that also list their parts
+SOURCE_PLAYLIST = "parts.m3u8"  # ffmpeg's own playlist; internal only
+CHANNEL = "stream:llhls"
+
+_PART_URI = re.compile(r"^r(\d+)_part_(\d+)\.m4s$")
+_PART_OPENED = re.compile(r"Opening '.*r\d+_part_\d+\.m4s' for writing")
+
+
+def ffmpeg_command(stream_url: str, directory: str, run: int) -> List[str]:
+    # Parts can only be cut on keyframes, so force one per part. That needs a
+    # (zero-latency) re-encode instead of the stream copy used in normal mode.
+    return [
+        "ffmpeg", "-nostats",
+        "-rtsp_transport", "tcp",
+        "-i", stream_url,
+        "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+        "-force_key_frames", f"expr:gte(t,n_forced*{LL_PART_SECONDS})",
+        "-c:a", "aac",
+        "-f", "hls",
+        "-hls_time", str(LL_PART_SECONDS),
+        "-hls_list_size", str((PLAYLIST_SEGMENTS + 2) * LL_SEGMENT_PARTS),
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", f"r{run}_init.mp4",
+        "-hls_flags", "delete_segments+independent_segments+program_date_time",
+        "-hls_segment_filename", os.path.join(directory, f"r{run}_part_%d.m4s"),
+        os.path.join(directory, SOURCE_PLAYLIST),
+    ]
+
+
+def next_run() -> int:
+    """Run prefix for a new ffmpeg; increases across restarts, workers and process lifetimes"""
+    return time.time_ns() // 1_000_000
+
+
+def is_part_opened(line: str) -> bool:
+    return bool(_PART_OPENED.search(line))
+
+
+class LiveState:
+    """Segments/parts of one low-latency stream, as players see them"""
+
+    def __init__(self):
+        self.segments: List[dict] = []
+        self.last_part: Optional[List[int]] = None  # [run, index]
+        self.discontinuity_sequence = 0
+        self.condition = asyncio.Condition()
+
+    def to_dict(self) -> dict:
+        return {
+            "segments": self.segments,
+            "last_part": self.last_part,
+            "discontinuity_sequence": self.discontinuity_sequence,
+        }
+
+    def load(self, data: dict):
+        self.segments = data["segments"]
+        self.last_part = data["last_part"]
+        self.discontinuity_sequence = data["discontinuity_sequence"]
+
+    def merge(self, entries: List[dict]) -> bool:
+        """Add parts from ffmpeg's playlist that we haven't seen. Returns True if anything changed."""
+        changed = False
+        for entry in entries:
+            run, index = entry["run"], entry["index"]
+            if self.last_part and (run, index) <= tuple(self.last_part):
+                continue
+            contiguous = self.last_part is not None and [run, index - 1] == self.last_part
+            current = self.segments[-1] if self.segments else None
+            if current is not None and not contiguous:
+                current["complete"] = True  # ffmpeg restarted; close the short segment
+            if current is None or current["complete"]:
+                self.segments.append({
+                    "msn": current["msn"] + 1 if current else 0,
+                    "parts": [],
+                    "map": f"r{run}_init.mp4",
+                    "pdt": entry.get("pdt"),
+                    "discontinuity": current is not None and not contiguous,
+                    "complete": False,
+                })
+                current = self.segments[-1]
+            current["parts"].append({"uri": entry["uri"], "duration": entry["duration"]})
+            if len(current["parts"]) >= LL_SEGMENT_PARTS:
+                current["complete"] = True
+            self.last_part = [run, index]
+            changed = True
+
+        while len(self.segments) > PLAYLIST_SEGMENTS + 1:
+            if self.segments.pop(0)["discontinuity"]:
+                self.discontinuity_sequence += 1
+        return changed
+
+    def has(self, msn: int, part: Optional[int]) -> bool:
+        for segment in reversed(self.segments):
+            if segment["msn"] > msn:
+                return True
+            if segment["msn"] == msn:
+                if part is None:
+                    return segment["complete"]
+                return segment["complete"] or len(segment["parts"]) > part
+        return False
+
+    def segment_parts(self, msn: int) -> Optional[List[str]]:
+        for segment in self.segments:
+            if segment["msn"] == msn and segment["complete"]:
+                return [part["uri"] for part in segment["parts"]]
+        return None
+
+    def has_part(self, uri: str) -> bool:
+        return any(part["uri"] == uri for segment in self.segments for part in segment["parts"])
+
+    def render(self) -> str:
+        segments = self.segments
+        part_target = max(
+            [LL_PART_SECONDS] + [part["duration"] for s in segments for part in s["parts"]]
+        )
+        segment_durations = [sum(p["duration"] for p in s["parts"]) for s in segments if s["complete"]]
+        target_duration = math.ceil(max(segment_durations + [LL_PART_SECONDS * LL_SEGMENT_PARTS]))
+        first = segments[0] if segments else {"msn": 0, "discontinuity": False}
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:9",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * part_target:.3f}",
+            f"#EXT-X-PART-INF:PART-TARGET={part_target:.3f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first['msn']}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{self.discontinuity_sequence + (1 if first['discontinuity'] else 0)}",
+        ]
+        current_map = None
+        for position, segment in enumerate(segments):
+            if segment["discontinuity"] and position > 0:
+                lines.append("#EXT-X-DISCONTINUITY")
+            if segment["map"] != current_map:
+                lines.append(f'#EXT-X-MAP:URI="{segment["map"]}"')
+                current_map = segment["map"]
+            if segment["pdt"]:
+                lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{segment['pdt']}")
+            if position >= len(segments) - PART_SEGMENTS:
+                for part in segment["parts"]:
+                    lines.append(f'#EXT-X-PART:DURATION={part["duration"]:.3f},URI="{part["uri"]}",INDEPENDENT=YES')
+            if segment["complete"]:
+                lines.append(f"#EXTINF:{sum(p['duration'] for p in segment['parts']):.3f},")
+                lines.append(f"seg_{segment['msn']}.m4s")
+        if self.last_part:
+            run, index = self.last_part
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="r{run}_part_{index + 1}.m4s"')
+        return "\n".join(lines) + "\n"
+
+
+_states: Dict[int, LiveState] = {}
+_owned = set()  # Streams whose ffmpeg runs in this worker
+
+
+def _state_key(video_id: int) -> str:
+    return f"{CHANNEL}:{video_id}"
+
+
+def claim(video_id: int):
+    """Called by a worker about to run the stream's ffmpeg: start from empty state, never another owner's"""
+    _owned.add(video_id)
+    _states[video_id] = LiveState()
+
+
+def get_state(video_id: int) -> LiveState:
+    state = _states.get(video_id)
+    if state is None:
+        state = _states[video_id] = LiveState()
+        if video_id not in _owned:
+            # Another worker owns it; start from its last published state
+            try:
+                data = redis_client.get(_state_key(video_id))
+                if data:
+                    state.load(json.loads(data))
+            except redis.RedisError:
+                pass
+    return state
+
+
+def parse_source_playlist(text: str) -> List[dict]:
+    entries = []
+    duration = None
+    pdt = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line.startswith("#EXT-X-PROGRAM-DATE-TIME:"):
+            pdt = line[len("#EXT-X-PROGRAM-DATE-TIME:"):]
+        elif line and not line.startswith("#"):
+            match = _PART_URI.match(os.path.basename(line))
+            if match and duration is not None:
+                entries.append({
+                    "run": int(match.group(1)),
+                    "index": int(match.group(2)),
+                    "uri": os.path.basename(line),
+                    "duration": duration,
+                    "pdt": pdt,
+                })
+            duration = None
+            pdt = None
+    return entries
+
+
+def _read_source(directory: str) -> Optional[List[dict]]:
+    try:
+        with open(os.path.join(directory, SOURCE_PLAYLIST), "r") as f:
+            return parse_source_playlist(f.read())
+    except OSError:
+        return None
+
+
+def _publish(video_id: int, payload: str):
+    try:
+        redis_client.set(_state_key(video_id), payload, ex=30)
+        redis_client.publish(CHANNEL, payload)
+    except redis.RedisError:
+        pass
+
+
+async def refresh(video_id: int, directory: str):
+    """Called by the owner when ffmpeg starts a new part (so the previous one is done)"""
+    if video_id not in _owned:
+        return  # Stopped in the meantime
+    state = get_state(video_id)
+    # ffmpeg logs the open just before rewriting its playlist; retry briefly until it lands
+    for _ in range(10):
+        entries = await asyncio.to_thread(_read_source, directory)
+        # Merged here on the loop, where render() and wait_for read the same state
+        if entries is not None and state.merge(entries):
+            payload = json.dumps(dict(state.to_dict(), video_id=video_id))
+            async with state.condition:
+                state.condition.notify_all()
+            await asyncio.to_thread(_publish, video_id, payload)
+            return
+        await asyncio.sleep(0.02)
+
+
+def forget(video_id: int, owned: bool = True):
+    """Drop local state; the owner also deletes the published snapshot so no later start reloads it"""
+    _owned.discard(video_id)
+    _states.pop(video_id, None)
+    if owned:
+        try:
+            redis_client.delete(_state_key(video_id))
+        except redis.RedisError:
+            pass
+
+
+async def wait_for(video_id: int, msn: Optional[int] = None, part: Optional[int] = None, timeout: float = 0) -> bool:
+    """Block until the playlist contains msn/part (or, with no msn, any part at all)"""
+    state = get_state(video_id)
+
+    def ready():
+        if msn is None:
+            return state.last_part is not None
+        return state.has(msn, part)
+
+    async with state.condition:
+        try:
+            await asyncio.wait_for(state.condition.wait_for(ready), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return ready()
+
+
+async def wait_for_part(video_id: int, uri: str, timeout: float) -> bool:
+    """Block until a (preload-hinted) part has been written"""
+    state = get_state(video_id)
+    async with state.condition:
+        try:
+            await asyncio.wait_for(state.condition.wait_for(lambda: state.has_part(uri)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return state.has_part(uri)
+
+
+def blocking_timeout() -> float:
+    # Spec: block for up to three target durations
+    return 3 * LL_PART_SECONDS * LL_SEGMENT_PARTS
+
+
+async def listen():
+    """Apply state published by other workers and wake their blocked requests"""
+    while True:
+        try:
+            client = aioredis.from_url(REDIS_URL, decode_responses=True)
+            pubsub = client.pubsub()
+            await pubsub.subscribe(CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = json.loads(message["data"])
+                video_id = data.pop("video_id")
+                if video_id in _owned:
+                    continue
+                state = _states.get(video_id)
+                if state is None:
+                    continue  # Nobody here is watching it
+                state.load(data)
+                async with state.condition:
+                    state.condition.notify_all()
+        except Exception as e:
+            print(f"LL-HLS listener error, reconnecting: {e}")
+            await asyncio.sleep(2)
@@ -1,64 +1,151 @@
 from typing import List, Optional
 from datetime import timedelta, datetime
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Header, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_, String
 import os
 import shutil
+import time
 import httpx # Import httpx
-import requests
-import subprocess
 import asyncio
+import anyio
 
-from . import models, schemas, security
-from .database import SessionLocal, engine
+from . import models, schemas, security, viewers, reactions, ingest, youtube_import, availability, thumbnails, media, progressive, cleanup, segment_cache, streams, llhls, singleflight, auth_cache, feeds, compression, response_cache, subscriptions, playlists, watch_history, watch_stats, tv_channel, hls_splice
+from .database import SessionLocal, engine, API_THREADPOOL_SIZE
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# orjson for every JSON response; list endpoints additionally skip validation (see feeds.py)
+app = FastAPI(default_response_class=ORJSONResponse)
 
-# Track active stream processes and viewer counts
-# Format: {video_id: {"process": Popen, "last_access": timestamp, "viewers": 0}}
-active_streams = {}
-STREAM_TIMEOUT = 300  # Stop stream after 5 minutes of no activity
+REACTION_RECONCILE_INTERVAL = 3600  # Seconds between likes/dislikes counter reconciliations
+UNIQUE_VIEWERS_PERSIST_INTERVAL = 60  # Seconds between HLL -> videos.unique_viewers syncs
 
-async def cleanup_inactive_streams():
-    """Background task to stop FFmpeg processes for inactive streams"""
-    import time
+async def persist_unique_viewers_loop():
+    """Background task to persist HyperLogLog unique viewer estimates to the database"""
     while True:
-        await asyncio.sleep(10)  # Check every 10 seconds
-        current_time = time.time()
-        streams_to_stop = []
+        await asyncio.sleep(UNIQUE_VIEWERS_PERSIST_INTERVAL)
+        try:
+            updated = await asyncio.to_thread(viewers.persist_unique_viewer_counts)
+            if updated:
+                print(f"Persisted unique viewer counts for {updated} videos")
+        except Exception as e:
+            print(f"Error in unique viewer persistence loop: {e}")
 
-        for video_id, stream_data in active_streams.items():
-            if current_time - stream_data["last_access"] > STREAM_TIMEOUT:
-                streams_to_stop.append(video_id)
+def reconcile_reactions_task():
+    db = SessionLocal()
+    try:
+        return reactions.reconcile_reaction_counts(db)
+    finally:
+        db.close()
 
-        for video_id in streams_to_stop:
-            stream_data = active_streams.pop(video_id, None)
-            if stream_data and stream_data["process"]:
-                try:
-                    stream_data["process"].terminate()
-                    stream_data["process"].wait(timeout=5)
-                except:
-                    try:
-                        stream_data["process"].kill()
-                    except:
-                        pass
-                # Clean up stream directory
-                stream_dir = f"/app/streams/{video_id}"
-                if os.path.exists(stream_dir):
-                    shutil.rmtree(stream_dir, ignore_errors=True)
-                print(f"Stopped inactive stream for video {video_id}")
+async def reconcile_reactions_loop():
+    """Background task to periodically fix drifted likes/dislikes counters"""
+    while True:
+        await asyncio.sleep(REACTION_RECONCILE_INTERVAL)
+        try:
+            fixed = await asyncio.to_thread(reconcile_reactions_task)
+            if fixed:
+                print(f"Reconciled reaction counters for {fixed} videos")
+        except Exception as e:
+            print(f"Error in reaction reconciliation loop: {e}")
+
+ORPHAN_GC_INTERVAL = int(os.getenv("ORPHAN_GC_INTERVAL", "21600"))  # Seconds between orphan-file collections
+
+def collect_orphan_files_task():
+    # Every worker runs this loop; only one of them collects per interval
+    if not cleanup.claim_orphan_collection(ORPHAN_GC_INTERVAL):
+        return None
+    db = SessionLocal()
+    try:
+        return cleanup.collect_orphan_files(db, dry_run=False)
+    finally:
+        db.close()
+
+async def collect_orphan_files_loop():
+    """Background task to delete media files no database row refers to any more"""
+    while True:
+        await asyncio.sleep(ORPHAN_GC_INTERVAL)
+        try:
+            report = await asyncio.to_thread(collect_orphan_files_task)
+            if report and report["orphans"]:
+                print(f"Orphan GC: removing {report['orphans']} orphans ({report['reclaimable_bytes']} bytes)")
+        except Exception as e:
+            print(f"Error in orphan file collection loop: {e}")
+
+SEGMENT_CACHE_WARM_INTERVAL = 300  # Seconds between trending-video cache warming passes
+SEGMENT_CACHE_WARM_VIDEOS = 20  # Top trending videos whose opening segments are kept warm
+
+def warm_segment_cache_task():
+    db = SessionLocal()
+    try:
+        videos = db.query(models.Video.id, models.Video.hls_path).filter(
+            models.Video.processing_status == "completed",
+            models.Video.hls_path.isnot(None)
+        ).order_by(feeds.trending_score_expression().desc()).limit(SEGMENT_CACHE_WARM_VIDEOS).all()
+    finally:
+        db.close()
+    stale = segment_cache.revalidate()
+    loaded = sum(segment_cache.warm_video(video.id, video.hls_path) for video in videos)
+    return loaded, stale
+
+async def warm_segment_cache_loop():
+    """Background task to keep newly trending videos' playlists and first segments in memory"""
+    while True:
+        try:
+            loaded, stale = await asyncio.to_thread(warm_segment_cache_task)
+            if loaded or stale:
+                print(f"Segment cache: warmed {loaded} objects, dropped {stale} stale")
+        except Exception as e:
+            print(f"Error in segment cache warming loop: {e}")
+        await asyncio.sleep(SEGMENT_CACHE_WARM_INTERVAL)
+
+WATCH_HISTORY_FLUSH_INTERVAL = 10  # Seconds between watch-session flushes to watch_history
+WATCH_HISTORY_PARTITION_INTERVAL = 86400  # Seconds between partition create/drop passes
+
+async def flush_watch_history_loop():
+    """Background task to write idle/ended watch sessions from Redis to watch_history"""
+    while True:
+        await asyncio.sleep(WATCH_HISTORY_FLUSH_INTERVAL)
+        try:
+            # Keep draining while there are full batches waiting
+            while await asyncio.to_thread(watch_history.flush_sessions) >= watch_history.FLUSH_BATCH_SIZE:
+                pass
+        except Exception as e:
+            print(f"Error in watch history flush loop: {e}")
+
+def maintain_watch_history_partitions_task():
+    db = SessionLocal()
+    try:
+        created = watch_history.ensure_partitions(db)
+        dropped = watch_history.drop_expired_partitions(db)
+        return created, dropped
+    finally:
+        db.close()
+
+async def maintain_watch_history_partitions_loop():
+    """Background task to create upcoming watch_history partitions and drop expired ones"""
+    while True:
+        try:
+            created, dropped = await asyncio.to_thread(maintain_watch_history_partitions_task)
+            if created or dropped:
+                print(f"Watch history partitions: created {created}, dropped {dropped}")
+        except Exception as e:
+            print(f"Error in watch history partition loop: {e}")
+        await asyncio.sleep(WATCH_HISTORY_PARTITION_INTERVAL)
 
 # Startup event to handle stuck processing videos
 @app.on_event("startup")
 async def startup_event():
     """Handle videos stuck in processing status on startup"""
+    # Sync route handlers and dependencies run in this threadpool; size it to match the DB pool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
     db = SessionLocal()
     try:
         # Find videos stuck in processing
@@ -98,8 +185,38 @@ async def startup_event():
     finally:
         db.close()
 
-    # Start background task to cleanup inactive streams
-    asyncio.create_task(cleanup_inactive_streams())
+    # Start the live stream supervisor (ownership renewal, idle shutdown, health)
+    asyncio.create_task(streams.supervisor.run())
+
+    # Follow LL-HLS playlist updates from whichever worker owns each stream
+    asyncio.create_task(llhls.listen())
+
+    # Drop cached principals invalidated by other workers
+    asyncio.create_task(auth_cache.listen())
+
+    # Follow response cache invalidations (domain events) from other workers
+    asyncio.create_task(response_cache.listen())
+
+    # Start background task to persist unique viewer estimates
+    asyncio.create_task(persist_unique_viewers_loop())
+
+    # Start background task to reconcile like/dislike counters
+    asyncio.create_task(reconcile_reactions_loop())
+
+    # Start background task to warm the in-memory segment cache
+    asyncio.create_task(warm_segment_cache_loop())
+
+    # Start background task to garbage-collect orphaned media files
+    asyncio.create_task(collect_orphan_files_loop())
+
+    # Start background tasks to flush watch sessions and manage watch_history partitions
+    asyncio.create_task(maintain_watch_history_partitions_loop())
+    asyncio.create_task(flush_watch_history_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop our ffmpeg processes and release their claims so another worker can take over
+    await streams.supervisor.shutdown()
 
 # Add CORS middleware
 app.add_middleware(
@@ -114,11 +231,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Start", "X-Video-Ids"],
 )
 
-# Mount static files for thumbnails
+# Compress JSON/text responses above COMPRESSION_MIN_BYTES (media passes through untouched)
+app.add_middleware(compression.CompressionMiddleware)
+
 os.makedirs("/app/thumbnails", exist_ok=True)
-app.mount("/thumbnails", StaticFiles(directory="/app/thumbnails"), name="thumbnails")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -134,51 +253,65 @@ def get_db():
 def get_user(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-# Helper function to get current user (required - raises exception if not authenticated)
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = security.decode_access_token(token)
-        username: str = payload.get("sub")
+def resolve_principal(token: str) -> Optional[auth_cache.Principal]:
+    """Map a bearer token to its (cached) principal; None if it is invalid or revoked"""
+    payload = security.decode_access_token(token)
+    if not payload:
+        return None
+    user_id = payload.get("uid")
+    if user_id is None:
+        # Token issued before tokens carried the user id; valid until the first revocation
+        username = payload.get("sub")
         if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except security.JWTError:
-        raise credentials_exception
-    user = get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+            return None
+        principal = auth_cache.principal_for_username(username)
+        version = 0
+    else:
+        principal = auth_cache.principal_for(user_id)
+        version = payload.get("ver", 0)
+    if principal is None or not principal.is_active or principal.token_version != version:
+        return None
+    return principal
+
+# Helper function to get current user (required - raises exception if not authenticated).
+# Returns the cached principal (.id); use get_current_user_record for the full row.
+def get_current_user(token: str = Depends(oauth2_scheme)) -> auth_cache.Principal:
+    principal = resolve_principal(token)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
 
 # Helper function to get current user optionally (returns None if not authenticated)
-async def get_current_user_optional(
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
-) -> Optional[models.User]:
+def get_current_user_optional(authorization: Optional[str] = Header(None)) -> Optional[auth_cache.Principal]:
     if not authorization or not authorization.startswith("Bearer "):
         return None
+    return resolve_principal(authorization[len("Bearer "):])
 
-    token = authorization.replace("Bearer ", "")
-    try:
-        payload = security.decode_access_token(token)
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        user = get_user(db, username=username)
-        return user
-    except:
-        return None
+# The current user's row, for handlers that read or change more than the id
+def get_current_user_record(
+    principal: auth_cache.Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> models.User:
+    user = db.get(models.User, principal.id)
+    if user is None:
+        auth_cache.invalidate(principal.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Video Streaming Backend!"}
 
 @app.get("/test-db")
-async def test_db_connection(db: Session = Depends(get_db)):
+def test_db_connection(db: Session = Depends(get_db)):
     try:
         db.execute("SELECT 1")
         return {"message": "Database connection successful!"}
@@ -187,46 +320,78 @@ async def test_db_connection(db: Session = Depends(get_db)):
 
 @app.post("/register", response_model=schemas.User)
 async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user(db, username=user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_password = security.get_password_hash(user.password)
-    db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    def existing_field():
+        if get_user(db, username=user.username):
+            return "Username"
+        if db.query(models.User.id).filter(models.User.email == user.email).first():
+            return "Email"
+        return None
+
+    taken = await run_in_threadpool(existing_field)
+    if taken:
+        raise HTTPException(status_code=400, detail=f"{taken} already registered")
+
+    # bcrypt runs on its own pool, never on the event loop
+    hashed_password = await security.get_password_hash_async(user.password)
+
+    def create():
+        db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password)
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+        return db_user
+
+    return await run_in_threadpool(create)
 
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user(db, username=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    user = await run_in_threadpool(get_user, db, form_data.username)
+    if not user or not await security.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if user.is_active is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is deactivated")
     access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = security.create_user_access_token(user, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: schemas.User = Depends(get_current_user)):
+def read_users_me(current_user: models.User = Depends(get_current_user_record)):
     return current_user
 
+@app.post("/users/me/password", response_model=schemas.Token)
+async def change_my_password(
+    current_password: str = Form(...),
+    new_password: str = Form(...),
+    current_user: models.User = Depends(get_current_user_record),
+    db: Session = Depends(get_db)
+):
+    """Change the password; every previously issued token stops working"""
+    if not await security.verify_password_async(current_password, current_user.hashed_password):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    hashed_password = await security.get_password_hash_async(new_password)
+
+    def save():
+        current_user.hashed_password = hashed_password
+        auth_cache.revoke_tokens(current_user)
+        db.commit()
+        auth_cache.invalidate(current_user.id)
+
+    await run_in_threadpool(save)
+    access_token = security.create_user_access_token(
+        current_user, expires_delta=timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
 @app.post("/videos/extract-metadata")
-async def extract_video_metadata(
+def extract_video_metadata(
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Extract metadata from video file for auto-populating title/description"""
-    UPLOAD_DIR = "/app/uploads"
     TEMP_DIR = "/app/uploads/temp"
     os.makedirs(TEMP_DIR, exist_ok=True)
 
@@ -237,8 +402,8 @@ async def extract_video_metadata(
             shutil.copyfileobj(file.file, buffer)
 
         # Call video processor to extract metadata
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
+        with httpx.Client(timeout=30.0) as client:
+            response = client.post(
                 "http://video-processor:8002/extract-metadata",
                 params={"video_path": temp_file_path}
             )
@@ -264,13 +429,13 @@ async def extract_video_metadata(
             os.remove(temp_file_path)
 
 @app.post("/videos/upload", response_model=schemas.Video)
-async def upload_video(
+def upload_video(
     title: str = Form(...),
     description: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),  # Comma-separated tags
     file: UploadFile = File(...),
     thumbnail: Optional[UploadFile] = File(None),  # Optional custom thumbnail
-    current_user: models.User = Depends(get_current_user),
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     UPLOAD_DIR = "/app/uploads"
@@ -310,10 +475,13 @@ async def upload_video(
     db.commit()
     db.refresh(db_video)
 
+    if custom_thumbnail_path:
+        thumbnails.enqueue_video_thumbnail(db_video.id)
+
     # Trigger video processing
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        with httpx.Client() as client:
+            response = client.post(
                 "http://video-processor:8002/process-video",
                 json={
                     "video_path": file_location,
@@ -336,13 +504,14 @@ async def upload_video(
     return db_video
 
 @app.post("/videos/add-stream", response_model=schemas.Video)
-async def add_live_stream(
+def add_live_stream(
     title: str = Form(...),
     stream_url: str = Form(...),
     description: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),
+    low_latency: bool = Form(False),
     thumbnail: Optional[UploadFile] = File(None),
-    current_user: models.User = Depends(get_current_user),
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Add a live stream (RTSP/HLS URL) without uploading a file"""
@@ -370,6 +539,7 @@ async def add_live_stream(
         tags=tag_list,
         stream_url=stream_url,
         is_live_stream=True,
+        live_low_latency=low_latency,
         file_path=None,  # No file for live streams
         thumbnail_path=custom_thumbnail_path,
         owner_id=current_user.id,
@@ -379,18 +549,21 @@ async def add_live_stream(
     db.add(db_video)
     db.commit()
     db.refresh(db_video)
+    response_cache.invalidate("video_added")
+
+    if custom_thumbnail_path:
+        thumbnails.enqueue_video_thumbnail(db_video.id)
 
     return db_video
 
-@app.post("/videos/add-youtube", response_model=schemas.Video)
-async def add_youtube_video(
+@app.post("/videos/add-youtube", status_code=202)
+def add_youtube_video(
     youtube_url: str = Form(...),
     tags: Optional[str] = Form(None),
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
-    """Add a YouTube video by URL - automatically fetches metadata"""
-    import yt_dlp
+    """Add a YouTube video by URL - metadata and thumbnail are fetched by the ingest pool"""
     import re
 
     # Extract video ID from YouTube URL
@@ -402,75 +575,31 @@ async def add_youtube_video(
 
     video_id = match.group(1)
 
-    # Use yt-dlp to fetch video metadata
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': False,
-    }
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
-
-            title = info.get('title', 'Untitled YouTube Video')
-            description = info.get('description', '')
-            duration = info.get('duration', 0)  # Duration in seconds
-            thumbnail_url = info.get('thumbnail', '')
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to fetch YouTube video info: {str(e)}")
-
-    # Download thumbnail if available
-    thumbnail_path = None
-    if thumbnail_url:
-        try:
-            import requests
-            THUMBNAIL_DIR = "/app/thumbnails"
-            os.makedirs(THUMBNAIL_DIR, exist_ok=True)
-
-            thumbnail_filename = f"youtube_{video_id}.jpg"
-            thumbnail_location = os.path.join(THUMBNAIL_DIR, thumbnail_filename)
-
-            response = requests.get(thumbnail_url, timeout=10)
-            response.raise_for_status()
-
-            with open(thumbnail_location, "wb") as f:
-                f.write(response.content)
-
-            thumbnail_path = f"/thumbnails/{thumbnail_filename}"
-        except Exception as e:
-            print(f"Failed to download YouTube thumbnail: {e}")
+    # Reject duplicates before queueing, so a re-submitted URL costs no fetch at all
+    if youtube_import.existing_youtube_ids(db, [video_id]):
+        raise HTTPException(status_code=409, detail="This YouTube video has already been added")
 
     # Parse tags
     tag_list = []
     if tags:
         tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
 
-    # Create video record for YouTube video
-    db_video = models.Video(
-        title=title,
-        description=description[:500] if description else None,  # Limit description length
-        tags=tag_list,
-        youtube_url=video_id,  # Store just the video ID
-        file_path=None,
-        thumbnail_path=thumbnail_path,
-        owner_id=current_user.id,
-        processing_status="completed",  # YouTube videos are immediately available
-        duration=duration
-    )
-    db.add(db_video)
-    db.commit()
-    db.refresh(db_video)
+    job_id = ingest.submit_job("add_youtube", ingest.add_youtube_video_job, video_id, tag_list, current_user.id)
+    return {"job_id": job_id, "status": "queued"}
 
-    return db_video
+@app.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    """Get the status (and result when finished) of an ingest job"""
+    job = ingest.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.post("/admin/auto-import-youtube")
-async def auto_import_youtube_videos(
+def auto_import_youtube_videos(
     categories: Optional[List[str]] = None,
     videos_per_category: int = 2,
-    username: str = "autobot",
-    background_tasks: BackgroundTasks = None
+    username: str = "autobot"
 ):
     """Auto-import YouTube videos from predefined categories (for cron job) - runs in background"""
     import socket
@@ -481,336 +610,56 @@ async def auto_import_youtube_videos(
     except OSError:
         return {"status": "skipped", "message": "No internet connection, waiting for next cron job"}
 
-    # Run import in background
-    if background_tasks:
-        background_tasks.add_task(import_youtube_videos_task, categories, videos_per_category, username)
-        return {"status": "started", "message": f"Import started in background for {username}"}
-    else:
-        # Fallback to sync if no background tasks
-        await import_youtube_videos_task(categories, videos_per_category, username)
-        return {"status": "completed", "message": f"Import completed for {username}"}
+    # Run import on the ingest pool so it never competes with request threads
+    job_id = ingest.submit_job("auto_import", import_youtube_videos_task, categories, videos_per_category, username)
+    return {"status": "started", "job_id": job_id, "message": f"Import started in background for {username}"}
 
 def import_youtube_videos_task(categories: Optional[List[str]] = None, videos_per_category: int = 2, username: str = "autobot"):
     """Background task for importing YouTube videos"""
-    import yt_dlp
-    import random
-    from app.database import SessionLocal
-
     db = SessionLocal()
-
-    # Expanded category pool for more variety
-    all_categories = [
-        # Tech & Science
-        "technology news today",
-        "AI artificial intelligence explained",
-        "space exploration documentary",
-        "science experiments",
-        "robotics innovation",
-        "cybersecurity tutorial",
-        "programming tutorial",
-        "gadget review 2024",
-        "tech unboxing",
-        "web development",
-
-        # Gaming
-        "gaming highlights 2024",
-        "game review",
-        "esports tournament",
-        "indie game showcase",
-        "speedrun gameplay",
-        "retro gaming",
-        "game walkthrough",
-        "gaming news",
-
-        # Food & Cooking
-        "cooking tutorial easy",
-        "baking recipe",
-        "street food around world",
-        "chef cooking tips",
-        "vegan recipe",
-        "dessert recipe",
-        "meal prep ideas",
-        "food review",
-
-        # Entertainment
-        "comedy sketches",
-        "stand up comedy",
-        "funny moments compilation",
-        "prank videos",
-        "magic tricks revealed",
-        "talent show performance",
-
-        # Music
-        "music video 2024",
-        "live concert performance",
-        "guitar tutorial",
-        "music production tips",
-        "cover songs",
-        "piano performance",
-        "jazz music",
-        "electronic music",
-
-        # Education & How-to
-        "history documentary",
-        "DIY home improvement",
-        "art tutorial drawing",
-        "photography tips",
-        "animation tutorial",
-        "language learning",
-        "math explained simply",
-
-        # Lifestyle
-        "travel vlog 2024",
-        "fitness workout routine",
-        "yoga for beginners",
-        "meditation guide",
-        "fashion haul",
-        "beauty makeup tutorial",
-        "home organization",
-        "productivity tips",
-
-        # Sports & Outdoors
-        "sports highlights today",
-        "extreme sports",
-        "hiking adventure",
-        "cycling tips",
-        "workout motivation",
-        "martial arts training",
-        "camping survival",
-
-        # Nature & Animals
-        "wildlife documentary",
-        "cute animals compilation",
-        "nature photography",
-        "ocean life documentary",
-        "bird watching",
-        "pet training tips",
-
-        # Cars & Vehicles
-        "car review 2024",
-        "motorcycle review",
-        "classic car restoration",
-        "electric vehicle",
-        "racing highlights",
-
-        # Business & Finance
-        "investing for beginners",
-        "cryptocurrency explained",
-        "business startup tips",
-        "personal finance advice",
-
-        # Creative & Arts
-        "woodworking projects",
-        "pottery tutorial",
-        "crafts DIY",
-        "digital art process",
-        "film making tips",
-        "short film"
-    ]
-
-    # Default categories if none provided - randomly select subset
-    if not categories:
-        # Select 12 random categories from the pool for variety
-        categories = random.sample(all_categories, min(12, len(all_categories)))
-
-    # Get the specified user
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        print(f"User '{username}' not found, skipping import")
-        return {"status": "error", "message": f"User '{username}' not found"}
-
-    imported_videos = []
-    errors = []
-
-    for category in categories:
-        try:
-            # Add randomization to search by using date filters or sorting
-            # This helps get different results each time
-            search_modifiers = [
-                "",  # No modifier
-                " this week",
-                " recent",
-                " new",
-                " latest",
-                " popular",
-            ]
-            search_suffix = random.choice(search_modifiers)
-
-            # Search YouTube for videos in this category
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'playlistend': videos_per_category * 3,  # Fetch more to account for duplicates
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                search_query = f"ytsearch{videos_per_category * 3}:{category}{search_suffix}"
-                results = ydl.extract_info(search_query, download=False)
-
-                if not results or 'entries' not in results:
-                    continue
-
-                # Track how many we've imported for this category
-                category_import_count = 0
-
-                for video_info in results['entries']:
-                    if not video_info:
-                        continue
-
-                    # Stop if we've imported enough for this category
-                    if category_import_count >= videos_per_category:
-                        break
-
-                    video_id = video_info.get('id')
-
-                    # Check if video already exists
-                    existing = db.query(models.Video).filter(
-                        models.Video.youtube_url == video_id
-                    ).first()
-
-                    if existing:
-                        continue  # Skip duplicates
-
-                    title = video_info.get('title', 'Untitled')
-                    description = video_info.get('description', '')
-                    duration = video_info.get('duration', 0)
-                    thumbnail_url = video_info.get('thumbnail', '')
-
-                    # Extract YouTube tags and combine with our category
-                    video_tags = [category, "auto-imported"]
-                    youtube_tags = video_info.get('tags', [])
-                    if youtube_tags and isinstance(youtube_tags, list):
-                        # Add first 5 YouTube tags (keep it manageable)
-                        video_tags.extend(youtube_tags[:5])
-
-                    # Download thumbnail
-                    thumbnail_path = None
-                    if thumbnail_url:
-                        try:
-                            THUMBNAIL_DIR = "/app/thumbnails"
-                            os.makedirs(THUMBNAIL_DIR, exist_ok=True)
-
-                            thumbnail_filename = f"youtube_{video_id}.jpg"
-                            thumbnail_location = os.path.join(THUMBNAIL_DIR, thumbnail_filename)
-
-                            response = requests.get(thumbnail_url, timeout=10)
-                            response.raise_for_status()
-
-                            with open(thumbnail_location, "wb") as f:
-                                f.write(response.content)
-
-                            thumbnail_path = f"/thumbnails/{thumbnail_filename}"
-                        except Exception as e:
-                            print(f"Failed to download thumbnail for {video_id}: {e}")
-
-                    # Create video record
-                    db_video = models.Video(
-                        title=title,
-                        description=description[:500] if description else None,
-                        tags=video_tags,
-                        youtube_url=video_id,
-                        file_path=None,
-                        thumbnail_path=thumbnail_path,
-                        owner_id=user.id,
-                        processing_status="completed",
-                        duration=duration
-                    )
-                    db.add(db_video)
-                    imported_videos.append({"id": video_id, "title": title, "category": category})
-                    category_import_count += 1
-
-        except Exception as e:
-            errors.append(f"Error importing {category}: {str(e)}")
-            print(f"Error importing {category}: {e}")
-
-    # Commit all imported videos
     try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        return {"status": "error", "message": f"Database error: {str(e)}", "imported": 0}
-
-    return {
-        "status": "success",
-        "imported_count": len(imported_videos),
-        "videos": imported_videos,
-        "errors": errors if errors else None
-    }
+        return youtube_import.import_youtube_videos(db, categories, videos_per_category, username)
+    finally:
+        db.close()
 
 @app.post("/admin/cleanup-bot-videos")
-async def cleanup_bot_videos(
+def cleanup_bot_videos(
     username: str = "cleanupbot",
     days_old: int = 7,
     max_videos: int = 100,
     db: Session = Depends(get_db)
 ):
     """Delete old unwatched/unliked bot videos to keep content fresh. If username is 'all', cleanup all bot users."""
-    from datetime import timedelta
-
     # Determine which users to clean up
+    users_query = db.query(models.User.id, models.User.username)
     if username == "all":
-        # Clean up all bot users
-        bot_users = ["autobot", "techreviewer", "gamingpro", "foodiechef", "musiclover",
-                     "sciencegeek", "fitnessguru", "naturewild", "outdoorexplorer",
-                     "devopsguru", "aienthusiast", "politicsnow", "cryptofinance",
-                     "photogeek", "mindfulzen", "newstoday", "diycrafter", "biztips",
-                     "polyglot", "filmcritic", "truecrime", "stargazer", "podcastclips",
-                     "latenightcomedy", "jazzblues", "rockmusic", "triphop", "indierock",
-                     "singersongwriter", "shoegaze"]
+        bot_users = users_query.filter(models.User.is_bot.is_(True)).order_by(models.User.username).all()
     else:
-        bot_users = [username]
+        bot_users = users_query.filter(models.User.username == username).all()
 
-    total_deleted = 0
     results = {}
-
-    for bot_username in bot_users:
-        # Get bot user
-        bot_user = db.query(models.User).filter(models.User.username == bot_username).first()
-        if not bot_user:
-            results[bot_username] = {"status": "error", "message": "User not found"}
-            continue
-
-        # Find old bot videos (older than X days, no views or likes)
-        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-
-        old_videos = db.query(models.Video).filter(
-            models.Video.owner_id == bot_user.id,
-            models.Video.upload_date < cutoff_date,
-            models.Video.views == 0,
-            models.Video.likes == 0
-        ).order_by(models.Video.upload_date.asc()).all()
-
-        deleted_count = 0
-
-        # Delete old unwatched videos
-        for video in old_videos:
-            if deleted_count >= max_videos:
-                break
-
-            # Delete thumbnail if exists
-            if video.thumbnail_path and os.path.exists(f"/app{video.thumbnail_path}"):
-                try:
-                    os.remove(f"/app{video.thumbnail_path}")
-                except:
-                    pass
-
-            db.delete(video)
-            deleted_count += 1
-            total_deleted += 1
-
-        db.commit()
-
-        # Get remaining video count for this user
-        remaining_videos = db.query(models.Video).filter(
-            models.Video.owner_id == bot_user.id
-        ).count()
-
-        results[bot_username] = {
-            "deleted": deleted_count,
-            "remaining": remaining_videos
+    if not bot_users:
+        results[username] = {"status": "error", "message": "User not found"}
+
+    # Set-based: one candidate query, batched DELETE ... RETURNING, files removed in the background
+    cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+    owner_ids = [user.id for user in bot_users]
+    deleted = cleanup.delete_unwatched_videos(db, owner_ids, cutoff_date, max_videos)
+
+    remaining = dict(
+        db.query(models.Video.owner_id, func.count(models.Video.id))
+        .filter(models.Video.owner_id.in_(owner_ids))
+        .group_by(models.Video.owner_id)
+        .all()
+    ) if owner_ids else {}
+
+    for user in bot_users:
+        results[user.username] = {
+            "deleted": deleted.get(user.id, 0),
+            "remaining": remaining.get(user.id, 0)
         }
 
+    total_deleted = sum(deleted.values())
     return {
         "status": "success",
         "total_deleted": total_deleted,
@@ -818,223 +667,126 @@ async def cleanup_bot_videos(
         "message": f"Deleted {total_deleted} old unwatched videos across {len(bot_users)} user(s)"
     }
 
-@app.post("/admin/backfill-thumbnails")
-async def backfill_missing_thumbnails(
-    limit: int = 100,
-    db: Session = Depends(get_db)
-):
-    """Backfill missing thumbnails for YouTube videos"""
-    import yt_dlp
-
-    # Find videos with missing thumbnails
-    videos_missing_thumbnails = db.query(models.Video).filter(
-        models.Video.youtube_url.isnot(None),
-        models.Video.thumbnail_path.is_(None)
-    ).limit(limit).all()
-
-    if not videos_missing_thumbnails:
-        return {
-            "status": "success",
-            "message": "No videos missing thumbnails",
-            "updated": 0
-        }
-
-    updated_count = 0
-    failed_count = 0
-
-    for video in videos_missing_thumbnails:
-        try:
-            # Get video info from YouTube
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                video_info = ydl.extract_info(f"https://www.youtube.com/watch?v={video.youtube_url}", download=False)
-
-            # Get thumbnail URL
-            thumbnail_url = video_info.get('thumbnail')
-
-            if thumbnail_url:
-                try:
-                    THUMBNAIL_DIR = "/app/thumbnails"
-                    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
-
-                    thumbnail_filename = f"youtube_{video.youtube_url}.jpg"
-                    thumbnail_location = os.path.join(THUMBNAIL_DIR, thumbnail_filename)
-
-                    response = requests.get(thumbnail_url, timeout=10)
-                    response.raise_for_status()
-
-                    with open(thumbnail_location, "wb") as f:
-                        f.write(response.content)
+@app.get("/admin/orphan-files")
+def orphan_files_report(db: Session = Depends(get_db)):
+    """Dry run of the orphan-file collector: what it would delete and how many bytes that frees"""
+    return cleanup.collect_orphan_files(db, dry_run=True)
 
-                    # Update video record
-                    video.thumbnail_path = f"/thumbnails/{thumbnail_filename}"
-                    db.commit()
+@app.post("/admin/orphan-files/collect", status_code=202)
+def collect_orphan_files(dry_run: bool = False):
+    """Queue every orphaned upload, processed directory, thumbnail and stream directory for deletion (runs on the ingest pool)"""
+    job_id = ingest.submit_job("collect_orphan_files", collect_orphan_files_job, dry_run)
+    return {"status": "queued", "job_id": job_id}
 
-                    updated_count += 1
-                    print(f"✓ Updated thumbnail for video {video.id}: {video.title[:50]}")
-
-                except Exception as e:
-                    failed_count += 1
-                    print(f"✗ Failed to download thumbnail for video {video.id}: {e}")
-            else:
-                failed_count += 1
-                print(f"✗ No thumbnail URL found for video {video.id}")
-
-        except Exception as e:
-            failed_count += 1
-            print(f"✗ Failed to fetch video info for {video.id}: {e}")
-
-    return {
-        "status": "success",
-        "message": f"Backfilled {updated_count} thumbnails, {failed_count} failed",
-        "updated": updated_count,
-        "failed": failed_count,
-        "total_processed": len(videos_missing_thumbnails)
-    }
+def collect_orphan_files_job(dry_run: bool) -> dict:
+    db = SessionLocal()
+    try:
+        report = cleanup.collect_orphan_files(db, dry_run=dry_run)
+    finally:
+        db.close()
+    report["pending_file_deletions"] = cleanup.pending_file_deletions()
+    return report
+
+@app.post("/admin/backfill-thumbnails", status_code=202)
+def backfill_missing_thumbnails(limit: int = 100):
+    """Backfill missing thumbnails for YouTube videos (runs on the ingest pool)"""
+    job_id = ingest.submit_job("backfill_thumbnails", ingest.backfill_thumbnails_job, limit)
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/admin/backfill-thumbnail-derivatives", status_code=202)
+def backfill_thumbnail_derivatives(limit: int = 1000):
+    """Generate resized WebP/JPEG derivatives for existing thumbnails, avatars and banners"""
+    job_id = ingest.submit_job("backfill_derivatives", thumbnails.backfill_derivatives, limit)
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/admin/backfill-watch-stats", status_code=202)
+def backfill_watch_stats():
+    """Rebuild the viewing-statistics rollups from watch_history (runs on the ingest pool)"""
+    job_id = ingest.submit_job("backfill_watch_stats", backfill_watch_stats_task)
+    return {"status": "queued", "job_id": job_id}
+
+def backfill_watch_stats_task() -> dict:
+    db = SessionLocal()
+    try:
+        return watch_stats.backfill(db)
+    finally:
+        db.close()
 
-@app.post("/admin/check-unavailable-videos")
-async def check_unavailable_youtube_videos(
+@app.post("/admin/check-unavailable-videos", status_code=202)
+def check_unavailable_youtube_videos(
     limit: int = 50,
-    delete_unavailable: bool = False,
-    db: Session = Depends(get_db)
+    delete_unavailable: bool = False
 ):
-    """Check for YouTube videos that are no longer available (deleted, private, region-blocked)"""
-    import yt_dlp
-
-    # Get all YouTube videos
-    youtube_videos = db.query(models.Video).filter(
-        models.Video.youtube_url.isnot(None)
-    ).limit(limit).all()
-
-    if not youtube_videos:
-        return {
-            "status": "success",
-            "message": "No YouTube videos to check",
-            "unavailable": []
-        }
-
-    unavailable_videos = []
-    available_count = 0
-
-    for video in youtube_videos:
-        try:
-            # Try to get video info from YouTube
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'skip_download': True,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.extract_info(f"https://www.youtube.com/watch?v={video.youtube_url}", download=False)
-
-            # If we get here, video is available
-            available_count += 1
-            print(f"✓ Video {video.id} is available: {video.title[:50]}")
-
-        except Exception as e:
-            # Video is unavailable (deleted, private, etc.)
-            error_msg = str(e)
-            unavailable_videos.append({
-                "id": video.id,
-                "title": video.title,
-                "youtube_url": video.youtube_url,
-                "owner": video.owner.username if video.owner else None,
-                "error": error_msg[:100]
-            })
-            print(f"✗ Video {video.id} is unavailable: {video.title[:50]} - {error_msg[:50]}")
-
-            # Delete if requested
-            if delete_unavailable:
-                # Delete thumbnail if exists
-                if video.thumbnail_path and os.path.exists(f"/app{video.thumbnail_path}"):
-                    try:
-                        os.remove(f"/app{video.thumbnail_path}")
-                    except:
-                        pass
-
-                db.delete(video)
-                db.commit()
-                print(f"  → Deleted video {video.id}")
-
-    return {
-        "status": "success",
-        "message": f"Checked {len(youtube_videos)} videos: {available_count} available, {len(unavailable_videos)} unavailable",
-        "total_checked": len(youtube_videos),
-        "available": available_count,
-        "unavailable_count": len(unavailable_videos),
-        "unavailable": unavailable_videos,
-        "deleted": len(unavailable_videos) if delete_unavailable else 0
-    }
+    """Check the least recently checked YouTube videos for availability (deleted, private, unembeddable)"""
+    job_id = ingest.submit_job(
+        "check_unavailable", availability.check_availability, limit, delete_unavailable
+    )
+    return {"status": "queued", "job_id": job_id}
 
-@app.get("/videos", response_model=List[schemas.Video])
-async def get_videos(
+@app.get("/videos", response_model=List[schemas.VideoCard])
+def get_videos(
+    request: Request,
     page: int = 1,
     page_size: int = 20,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     # Only show completed videos on main feed (public access), sorted by newest first
-    offset = (page - 1) * page_size
-    videos = db.query(models.Video).filter(
-        models.Video.processing_status == "completed"
-    ).order_by(models.Video.upload_date.desc()).offset(offset).limit(page_size).all()
-    # Populate owner info for each video
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
-    return videos
+    def compute(db: Session):
+        rows = feeds.card_query(db).filter(
+            models.Video.processing_status == "completed"
+        ).order_by(models.Video.upload_date.desc()).offset((page - 1) * page_size).limit(page_size).all()
+        return [feeds.card(row) for row in rows]
+
+    return response_cache.serve(request, db, "videos", {"page": page, "page_size": page_size}, compute)
 
 @app.get("/videos/count")
-async def get_videos_count(db: Session = Depends(get_db)):
+def get_videos_count(request: Request, db: Session = Depends(get_db)):
     """Get total count of completed videos for pagination"""
-    count = db.query(models.Video).filter(
-        models.Video.processing_status == "completed"
-    ).count()
-    return {"total": count}
+    def compute(db: Session):
+        count = db.query(models.Video).filter(
+            models.Video.processing_status == "completed"
+        ).count()
+        return {"total": count}
 
-@app.get("/videos/search", response_model=List[schemas.Video])
-async def search_videos(
+    return response_cache.serve(request, db, "videos_count", {}, compute)
+
+@app.get("/videos/search", response_model=List[schemas.VideoCard])
+def search_videos(
+    request: Request,
     q: str,
     page: int = 1,
     page_size: int = 20,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Search videos by title, description, or tags"""
     if not q or not q.strip():
         raise HTTPException(status_code=400, detail="Search query is required")
 
-    search_term = f"%{q.strip()}%"
+    # ilike is case-insensitive, so "Jazz" and "jazz " share one cache entry
+    query = response_cache.normalize_query(q)
+    search_term = f"%{query}%"
 
     # Search in title, description, and tags
-    offset = (page - 1) * page_size
-    videos = db.query(models.Video).filter(
-        models.Video.processing_status == "completed",
-        or_(
-            models.Video.title.ilike(search_term),
-            models.Video.description.ilike(search_term),
-            models.Video.tags.cast(String).ilike(search_term)
-        )
-    ).order_by(models.Video.upload_date.desc()).offset(offset).limit(page_size).all()
-
-    # Populate owner info
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
+    def compute(db: Session):
+        rows = feeds.card_query(db).filter(
+            models.Video.processing_status == "completed",
+            or_(
+                models.Video.title.ilike(search_term),
+                models.Video.description.ilike(search_term),
+                models.Video.tags.cast(String).ilike(search_term)
+            )
+        ).order_by(models.Video.upload_date.desc()).offset((page - 1) * page_size).limit(page_size).all()
+        return [feeds.card(row) for row in rows]
 
-    return videos
+    return response_cache.serve(
+        request, db, "videos_search", {"q": query, "page": page, "page_size": page_size}, compute
+    )
 
 @app.get("/videos/search/count")
-async def get_search_count(
+def get_search_count(
+    request: Request,
     q: str,
     db: Session = Depends(get_db)
 ):
@@ -1042,25 +794,31 @@ async def get_search_count(
     if not q or not q.strip():
         return {"total": 0}
 
-    search_term = f"%{q.strip()}%"
+    # Keyed like /videos/search; the query as typed is echoed outside the shared entry
+    query = response_cache.normalize_query(q)
+    search_term = f"%{query}%"
 
-    count = db.query(models.Video).filter(
-        models.Video.processing_status == "completed",
-        or_(
-            models.Video.title.ilike(search_term),
-            models.Video.description.ilike(search_term),
-            models.Video.tags.cast(String).ilike(search_term)
-        )
-    ).count()
+    def compute(db: Session):
+        count = db.query(models.Video).filter(
+            models.Video.processing_status == "completed",
+            or_(
+                models.Video.title.ilike(search_term),
+                models.Video.description.ilike(search_term),
+                models.Video.tags.cast(String).ilike(search_term)
+            )
+        ).count()
+        return {"total": count}
 
-    return {"total": count, "query": q.strip()}
+    return response_cache.serve(
+        request, db, "videos_search_count", {"q": query}, compute, echo={"query": q.strip()}
+    )
 
 @app.get("/videos/my-videos", response_model=List[schemas.Video])
-async def get_my_videos(
+def get_my_videos(
     page: int = 1,
     page_size: int = 20,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Get all videos uploaded by the current user, including processing ones"""
     offset = (page - 1) * page_size
@@ -1069,17 +827,14 @@ async def get_my_videos(
     ).order_by(models.Video.upload_date.desc()).offset(offset).limit(page_size).all()
 
     # Populate owner info for each video
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
+    subscriptions.attach_owner_counts(db, videos)
 
     return videos
 
 @app.get("/videos/my-videos/count")
-async def get_my_videos_count(
+def get_my_videos_count(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Get total count of user's videos for pagination"""
     count = db.query(models.Video).filter(
@@ -1088,10 +843,10 @@ async def get_my_videos_count(
     return {"total": count}
 
 @app.get("/videos/{video_id}/progress")
-async def get_video_progress(
+def get_video_progress(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Get processing progress for a video"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
@@ -1103,8 +858,8 @@ async def get_video_progress(
 
     # Try to get progress from video processor
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"http://video-processor:8002/progress/{video_id}")
+        with httpx.Client(timeout=5.0) as client:
+            response = client.get(f"http://video-processor:8002/progress/{video_id}")
             if response.status_code == 200:
                 return response.json()
     except Exception as e:
@@ -1118,22 +873,24 @@ async def get_video_progress(
     else:
         return {"video_id": video_id, "progress": 0, "status": "processing"}
 
-@app.get("/videos/{video_id}/related", response_model=List[schemas.Video])
-async def get_related_videos(
+@app.get("/videos/{video_id}/related", response_model=List[schemas.VideoCard])
+def get_related_videos(
     video_id: int,
     limit: int = 10,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get related videos based on tags and creator"""
     # Get the current video
-    current_video = db.query(models.Video).filter(models.Video.id == video_id).first()
+    current_video = db.query(
+        models.Video.id, models.Video.owner_id, models.Video.tags
+    ).filter(models.Video.id == video_id).first()
     if not current_video:
         raise HTTPException(status_code=404, detail="Video not found")
 
     if not current_video.tags or len(current_video.tags) == 0:
         # No tags, fall back to same creator
-        related = db.query(models.Video).filter(
+        related = feeds.card_query(db).filter(
             models.Video.id != video_id,
             models.Video.owner_id == current_video.owner_id,
             models.Video.processing_status == "completed"
@@ -1141,7 +898,7 @@ async def get_related_videos(
     else:
         # Find videos with overlapping tags
         # Using PostgreSQL array overlap operator
-        related = db.query(models.Video).filter(
+        related = feeds.card_query(db).filter(
             models.Video.id != video_id,
             models.Video.processing_status == "completed",
             models.Video.tags.op('&&')(current_video.tags)  # Array overlap
@@ -1174,22 +931,16 @@ async def get_related_videos(
 
         # If no meaningful overlaps, fall back to same creator
         if not related:
-            related = db.query(models.Video).filter(
+            related = feeds.card_query(db).filter(
                 models.Video.id != video_id,
                 models.Video.owner_id == current_video.owner_id,
                 models.Video.processing_status == "completed"
             ).order_by(models.Video.views.desc()).limit(limit).all()
 
-    # Populate owner info
-    for video in related:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
-
-    return related
+    return feeds.card_response(related)
 
 @app.patch("/videos/{video_id}/metadata")
-async def update_video_metadata(
+def update_video_metadata(
     video_id: int,
     metadata: schemas.VideoMetadataUpdate,
     db: Session = Depends(get_db)
@@ -1199,28 +950,38 @@ async def update_video_metadata(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    if metadata.thumbnail_path:
+    thumbnail_changed = bool(metadata.thumbnail_path) and metadata.thumbnail_path != video.thumbnail_path
+    if thumbnail_changed:
         video.thumbnail_path = metadata.thumbnail_path
+        video.thumbnail_variants = None
     if metadata.hls_path:
         video.hls_path = metadata.hls_path
     if metadata.duration is not None:
         video.duration = metadata.duration
+    status_changed = bool(metadata.processing_status) and metadata.processing_status != video.processing_status
     if metadata.processing_status:
         video.processing_status = metadata.processing_status
 
     db.commit()
     db.refresh(video)
+
+    if thumbnail_changed:
+        thumbnails.enqueue_video_thumbnail(video_id)
+    # Entering or leaving "completed" adds/removes the video from the public feeds
+    if status_changed or (thumbnail_changed and video.processing_status == "completed"):
+        response_cache.invalidate("upload_completed" if video.processing_status == "completed" else "video_updated")
+
     return {"message": "Metadata updated successfully"}
 
 @app.patch("/videos/{video_id}")
-async def update_video(
+def update_video(
     video_id: int,
     title: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
     tags: Optional[str] = Form(None),  # Comma-separated tags
     thumbnail: Optional[UploadFile] = File(None),  # Optional new thumbnail
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Update video title, description, tags, and thumbnail"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
@@ -1247,22 +1008,25 @@ async def update_video(
         with open(thumbnail_location, "wb") as buffer:
             shutil.copyfileobj(thumbnail.file, buffer)
         video.thumbnail_path = f"/thumbnails/{thumbnail_filename}"
+        video.thumbnail_variants = None
 
     db.commit()
     db.refresh(video)
+    response_cache.invalidate("video_updated")
+
+    if thumbnail:
+        thumbnails.enqueue_video_thumbnail(video_id)
 
     # Populate owner info for response
-    if video.owner:
-        video.owner.subscriber_count = len(video.owner.subscribers)
-        video.owner.video_count = len(video.owner.videos)
+    subscriptions.attach_owner_counts(db, [video])
 
     return {"message": "Video updated successfully", "video": video, "thumbnail_path": video.thumbnail_path}
 
 @app.delete("/videos/{video_id}")
-async def delete_video(
+def delete_video(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Delete a video"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
@@ -1272,26 +1036,13 @@ async def delete_video(
     if video.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this video")
 
-    # Delete files from filesystem
-    try:
-        if os.path.exists(video.file_path):
-            os.remove(video.file_path)
-
-        # Delete processed files
-        processed_dir = f"/app/processed_videos/{video_id}"
-        if os.path.exists(processed_dir):
-            shutil.rmtree(processed_dir)
-    except Exception as e:
-        print(f"Error deleting files for video {video_id}: {e}")
-
-    # Delete from database
-    db.delete(video)
-    db.commit()
+    # Rows go now; files are removed on the background cleanup thread
+    cleanup.delete_videos(db, [video_id])
 
     return {"message": "Video deleted successfully"}
 
 @app.get("/videos/{video_id}/stream")
-async def stream_video(video_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def stream_video(video_id: int, request: Request, db: Session = Depends(get_db), current_user: auth_cache.Principal = Depends(get_current_user)):
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
@@ -1299,50 +1050,150 @@ async def stream_video(video_id: int, db: Session = Depends(get_db), current_use
     # If HLS is available, return the HLS manifest path info
     # Otherwise, serve the raw uploaded file
     file_path = video.file_path
-    if not os.path.exists(file_path):
+    if not file_path or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Video file not found on server")
 
-    return FileResponse(file_path, media_type="video/mp4")
+    return media.serve_file(
+        request, file_path, "private, max-age=3600",
+        media_type="video/mp4", not_found="Video file not found on server", offload=True
+    )
+
+@app.get("/videos/{video_id}/file-urls")
+def get_video_file_urls(video_id: int, db: Session = Depends(get_db), current_user: auth_cache.Principal = Depends(get_current_user)):
+    """Signed direct-file URLs for external players (VLC, Fire TV) that can't send a bearer token"""
+    video = db.query(models.Video).filter(models.Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if video.youtube_url or video.is_live_stream:
+        raise HTTPException(status_code=400, detail="No direct file for this video")
+
+    urls = {}
+    if progressive.rendition_path(video, "original"):
+        urls["original"] = progressive.signed_url(video.id, "original")
+    if progressive.rendition_path(video, "faststart"):
+        urls["faststart"] = progressive.signed_url(video.id, "faststart")
+    elif progressive.ensure_faststart(video):
+        # Built in the background; the signed URL becomes valid once the remux finishes
+        urls["faststart"] = dict(progressive.signed_url(video.id, "faststart"), status="building")
+
+    if not urls:
+        raise HTTPException(status_code=404, detail="Video file not found on server")
+    return urls
+
+@app.get("/videos/{video_id}/file/{rendition}")
+def serve_video_file(video_id: int, rendition: str, expires: int, sig: str, request: Request, db: Session = Depends(get_db)):
+    """Range-capable progressive download, authorised by a signed URL instead of a bearer token"""
+    if rendition not in progressive.RENDITIONS:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    if not security.verify_media_signature(progressive.resource(video_id, rendition), expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+
+    video = db.query(models.Video).filter(models.Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    file_path = progressive.rendition_path(video, rendition)
+    if file_path is None:
+        if rendition == "faststart" and progressive.ensure_faststart(video):
+            raise HTTPException(status_code=503, detail="File is being prepared", headers={"Retry-After": "30"})
+        raise HTTPException(status_code=404, detail="Video file not found on server")
+
+    # The URL is already unique per expiry window, so shared caches can keep it until then
+    max_age = max(0, min(expires - int(time.time()), 86400))
+    extension = os.path.splitext(file_path)[1] or ".mp4"
+    return media.serve_file(
+        request, file_path, f"public, max-age={max_age}",
+        media_type=media.media_type_for(file_path, "video/mp4"),
+        filename=f"video_{video_id}{extension}", offload=True
+    )
 
 @app.get("/processed/{video_id}/{filename}")
-async def serve_processed_file(video_id: int, filename: str):
+async def serve_processed_file(video_id: int, filename: str, request: Request):
     """Serve processed video files (HLS segments, thumbnails) - No auth required for public access"""
-    file_path = f"/app/processed_videos/{video_id}/{filename}"
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-
-    # Determine media type based on extension
-    if filename.endswith('.m3u8'):
-        media_type = "application/vnd.apple.mpegurl"
-    elif filename.endswith('.ts'):
-        media_type = "video/MP2T"
-    elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-        media_type = "image/jpeg"
+    file_path = media.safe_join(f"/app/processed_videos/{video_id}", filename)
+
+    # Segment names are reused when a video is reprocessed, so nothing here is immutable:
+    # clients revalidate against the ETag instead.
+    # Hot playlists and opening segments are served from memory without touching the disk
+    cached = segment_cache.get(file_path)
+    if cached is not None:
+        return media.serve_cached(request, cached, media.VOD_MEDIA)
+
+    if filename.endswith('.ts'):
+        cache_control = media.VOD_MEDIA
+    elif filename.endswith('.m3u8'):
+        # The playlist is rewritten while the processor is still segmenting
+        try:
+            finished = await media.run_sync(lambda: media.playlist_finished(file_path, os.stat(file_path)))
+        except OSError:
+            finished = False
+        cache_control = media.VOD_MEDIA if finished else media.NO_CACHE
     else:
-        media_type = "application/octet-stream"
+        cache_control = media.REVALIDATE  # Thumbnails keep their name across reprocessing
 
-    return FileResponse(file_path, media_type=media_type)
+    response = await media.serve_file_async(request, file_path, cache_control)
+    if filename.endswith(('.ts', '.m3u8')):
+        # Admission reads the file after the response is sent
+        response.background = BackgroundTask(media.run_sync, segment_cache.admit, file_path)
+    return response
 
 @app.get("/avatars/{filename}")
-async def serve_avatar(filename: str):
+async def serve_avatar(filename: str, request: Request):
     """Serve user avatar images - No auth required for public access"""
-    file_path = f"/app/avatars/{filename}"
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Avatar not found")
+    file_path = media.safe_join("/app/avatars", filename)
+    return await media.serve_file_async(
+        request, file_path, media.REVALIDATE,
+        media_type=media.media_type_for(file_path, "image/jpeg"), not_found="Avatar not found"
+    )
 
-    # Determine media type based on file extension
-    import mimetypes
-    media_type = mimetypes.guess_type(file_path)[0] or "image/jpeg"
-    return FileResponse(file_path, media_type=media_type)
+@app.get("/thumbnails/{file_path:path}")
+async def serve_thumbnail(file_path: str, request: Request):
+    """Serve downloaded, uploaded and derived thumbnails - No auth required for public access"""
+    full_path = media.safe_join("/app/thumbnails", file_path)
+    if file_path.startswith("derived/"):
+        cache_control = media.IMMUTABLE  # Content-addressed
+    elif os.path.basename(file_path).startswith("youtube_"):
+        cache_control = media.STABLE
+    else:
+        cache_control = media.REVALIDATE  # Custom thumbnails can be replaced in place
+    return await media.serve_file_async(request, full_path, cache_control)
+
+@app.get("/admin/media-stats")
+def get_media_stats():
+    """Conditional-request hit ratio and bytes served/saved by the media layer (this worker)"""
+    return dict(media.media_stats(), segment_cache=segment_cache.stats())
+
+@app.get("/admin/auth-cache-stats")
+def get_auth_cache_stats():
+    """Principal cache hits/misses for this worker"""
+    return auth_cache.stats()
+
+@app.get("/admin/response-cache-stats")
+def get_response_cache_stats():
+    """Feed response cache hits (fresh/stale), misses, 304s and the current generation (this worker)"""
+    return response_cache.stats()
+
+@app.get("/admin/singleflight-stats")
+def get_singleflight_stats():
+    """Calls, executions and coalesced callers per single-flight group (this worker)"""
+    return singleflight.all_stats()
+
+def load_live_source(video_id: int):
+    """A live video's stream columns, on a session that is closed again before the caller waits on anything"""
+    db = SessionLocal()
+    try:
+        return db.query(
+            models.Video.is_live_stream, models.Video.stream_url, models.Video.live_low_latency
+        ).filter(models.Video.id == video_id).first()
+    finally:
+        db.close()
 
 @app.get("/stream/proxy/{video_id}/playlist.m3u8")
-async def stream_rtsp_proxy(video_id: int, db: Session = Depends(get_db)):
+async def stream_rtsp_proxy(video_id: int, request: Request):
     """Proxy RTSP stream to HLS for browser playback"""
-    import time
-
-    video = db.query(models.Video).filter(models.Video.id == video_id).first()
+    # No Depends(get_db): a pooled connection would stay checked out through the stream
+    # cold start and every LL-HLS blocking reload below
+    video = await run_in_threadpool(load_live_source, video_id)
 
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
@@ -1350,107 +1201,106 @@ async def stream_rtsp_proxy(video_id: int, db: Session = Depends(get_db)):
     if not video.is_live_stream or not video.stream_url:
         raise HTTPException(status_code=400, detail="Not a live stream")
 
-    # For RTSP streams, we'll use FFmpeg to convert to HLS
-    # Create a temporary HLS stream directory
-    STREAM_DIR = f"/app/streams/{video_id}"
-    os.makedirs(STREAM_DIR, exist_ok=True)
-
-    playlist_path = os.path.join(STREAM_DIR, "playlist.m3u8")
-
-    # Check if stream is already active
-    if video_id in active_streams:
-        # Update last access time
-        active_streams[video_id]["last_access"] = time.time()
-
-        # Stream is active, return playlist
-        if os.path.exists(playlist_path):
-            return FileResponse(playlist_path, media_type="application/vnd.apple.mpegurl")
-        else:
-            # Playlist missing, restart stream
-            print(f"Playlist missing for video {video_id}, restarting stream...")
-            active_streams.pop(video_id)
-
-    # Clean up old stream files before starting new stream
-    for file in os.listdir(STREAM_DIR):
-        file_path = os.path.join(STREAM_DIR, file)
-        try:
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error removing old stream file {file_path}: {e}")
-
-    # Start FFmpeg in background to convert RTSP to HLS
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-rtsp_transport", "tcp",  # Use TCP for more reliable RTSP
-        "-i", video.stream_url,
-        "-c:v", "copy",  # Copy video codec (no re-encoding for speed)
-        "-c:a", "aac",   # Convert audio to AAC
-        "-f", "hls",
-        "-hls_time", "2",  # 2 second segments
-        "-hls_list_size", "3",  # Keep last 3 segments (lower latency)
-        "-hls_flags", "delete_segments+append_list",
-        "-hls_segment_filename", os.path.join(STREAM_DIR, "segment_%d.ts"),
-        "-hls_start_number_source", "epoch",  # Use epoch for segment numbering
-        playlist_path
-    ]
-
-    # Start FFmpeg process in background
-    print(f"Starting stream for video {video_id}")
-    process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-    # Track this stream
-    active_streams[video_id] = {
-        "process": process,
-        "last_access": time.time(),
-        "viewers": 1
-    }
-
-    # Wait a moment for playlist to be created
-    for _ in range(20):  # Wait up to 2 seconds
-        if os.path.exists(playlist_path):
-            break
-        await asyncio.sleep(0.1)
+    # Every playlist reload counts as a viewer heartbeat
+    client_ip = viewers.client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    viewer = viewers.viewer_key(None, client_ip, request.headers.get("user-agent"))
+    await asyncio.to_thread(streams.supervisor.heartbeat, video_id, viewer)
 
-    if not os.path.exists(playlist_path):
-        # Clean up failed stream
-        active_streams.pop(video_id, None)
-        try:
-            process.terminate()
-        except:
-            pass
+    # One ffmpeg per stream across all workers; this starts it here if nobody owns it
+    low_latency = bool(video.live_low_latency) and video.stream_url.startswith("rtsp://")
+    if not await streams.supervisor.ensure_stream(video_id, video.stream_url, low_latency):
         raise HTTPException(status_code=500, detail="Failed to start stream")
 
-    return FileResponse(playlist_path, media_type="application/vnd.apple.mpegurl")
+    if not low_latency:
+        return await media.serve_file_async(request, streams.playlist_path(video_id), media.NO_CACHE)
+
+    # LL-HLS blocking playlist reload: hold the request until the asked-for part exists
+    msn = request.query_params.get("_HLS_msn")
+    part = request.query_params.get("_HLS_part")
+    cache_control = media.NO_CACHE
+    if msn is not None:
+        try:
+            msn, part = int(msn), (int(part) if part is not None else None)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid _HLS_msn/_HLS_part")
+        state = llhls.get_state(video_id)
+        if state.segments and msn > state.segments[-1]["msn"] + 2:
+            raise HTTPException(status_code=400, detail="Requested segment is too far in the future")
+        if not await llhls.wait_for(video_id, msn, part, timeout=llhls.blocking_timeout()):
+            raise HTTPException(status_code=503, detail="Requested part not available yet")
+        cache_control = "public, max-age=6"  # Each msn/part URL always yields the same playlist
+
+    return Response(
+        llhls.get_state(video_id).render(),
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": cache_control}
+    )
 
 @app.get("/stream/proxy/{video_id}/{segment_file}")
-async def stream_segment(video_id: int, segment_file: str):
+async def stream_segment(video_id: int, segment_file: str, request: Request):
     """Serve HLS segment files"""
-    import time
+    directory = streams.stream_dir(video_id)
 
-    # Update last access time for this stream
-    if video_id in active_streams:
-        active_streams[video_id]["last_access"] = time.time()
+    # LL-HLS full segments are the concatenation of their parts
+    if segment_file.startswith("seg_") and segment_file.endswith(".m4s"):
+        try:
+            msn = int(segment_file[len("seg_"):-len(".m4s")])
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        parts = llhls.get_state(video_id).segment_parts(msn)
+        if parts is None:
+            raise HTTPException(status_code=404, detail="Segment not found")
+
+        def read_parts():
+            chunks = []
+            for uri in parts:
+                with open(media.safe_join(directory, uri), "rb") as f:
+                    chunks.append(f.read())
+            return b"".join(chunks)
+
+        try:
+            body = await media.run_sync(read_parts)
+        except OSError:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        return Response(body, media_type="video/iso.segment", headers={"Cache-Control": media.LIVE_SEGMENT})
+
+    # A preload-hinted LL-HLS part is requested before ffmpeg has finished it
+    if "_part_" in segment_file and segment_file.endswith(".m4s") and not os.path.exists(os.path.join(directory, segment_file)):
+        if not await llhls.wait_for_part(video_id, segment_file, timeout=llhls.blocking_timeout()):
+            raise HTTPException(status_code=404, detail="Segment not found")
 
-    STREAM_DIR = f"/app/streams/{video_id}"
-    segment_path = os.path.join(STREAM_DIR, segment_file)
+    segment_path = media.safe_join(directory, segment_file)
 
-    if not os.path.exists(segment_path):
-        raise HTTPException(status_code=404, detail="Segment not found")
+    cache_control = media.NO_CACHE if segment_file.endswith(".m3u8") else media.LIVE_SEGMENT
+    return await media.serve_file_async(request, segment_path, cache_control, not_found="Segment not found")
 
-    return FileResponse(segment_path, media_type="video/mp2t")
+@app.get("/streams/{video_id}/health")
+def get_stream_health(video_id: int):
+    """Owner, process state, restarts and viewer count for a live stream"""
+    return streams.supervisor.health(video_id)
+
+@app.get("/admin/streams")
+def list_active_streams():
+    """Health of every live stream currently owned by some backend worker"""
+    return [streams.supervisor.health(video_id) for video_id in streams.supervisor.active_stream_ids()]
 
 @app.post("/videos/{video_id}/reprocess")
-async def reprocess_video(video_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def reprocess_video(video_id: int, db: Session = Depends(get_db), current_user: auth_cache.Principal = Depends(get_current_user)):
     """Manually trigger reprocessing of a video"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
+    # The faststart MP4 is remuxed from the HLS output, so drop it and let it rebuild
+    cleanup.schedule_file_deletion([progressive.faststart_path(video.id)])
+    segment_cache.invalidate_video(video.id)
+    hls_splice.invalidate_video(video.id)
+    media.forget_video(video.id)
+
     # Trigger video processing
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        with httpx.Client() as client:
+            response = client.post(
                 "http://video-processor:8002/process-video",
                 json={
                     "video_path": video.file_path,
@@ -1465,7 +1315,7 @@ async def reprocess_video(video_id: int, db: Session = Depends(get_db), current_
         raise HTTPException(status_code=500, detail=f"Video processor error: {e.response.status_code}")
 
 @app.post("/videos/reprocess-all")
-async def reprocess_all_videos(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def reprocess_all_videos(db: Session = Depends(get_db), current_user: auth_cache.Principal = Depends(get_current_user)):
     """Reprocess all videos that don't have thumbnails or HLS"""
     videos = db.query(models.Video).filter(
         (models.Video.thumbnail_path == None) | (models.Video.hls_path == None)
@@ -1479,8 +1329,8 @@ async def reprocess_all_videos(db: Session = Depends(get_db), current_user: mode
 
     for video in videos:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            with httpx.Client() as client:
+                response = client.post(
                     "http://video-processor:8002/process-video",
                     json={
                         "video_path": video.file_path,
@@ -1499,15 +1349,16 @@ async def reprocess_all_videos(db: Session = Depends(get_db), current_user: mode
 
 # Channel/Profile endpoints
 @app.get("/users/{user_id}/profile", response_model=schemas.UserProfile)
-async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
+def get_user_profile(user_id: int, db: Session = Depends(get_db)):
     """Get a user's public channel profile"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    subscriber_count = len(user.subscribers)
-    video_count = len(user.videos)
+    return channel_profile(user, subscriptions.channel_counts(db, [user.id])[user.id])
 
+def channel_profile(user: models.User, counts) -> schemas.UserProfile:
+    subscriber_count, video_count = counts
     return schemas.UserProfile(
         id=user.id,
         username=user.username,
@@ -1515,33 +1366,28 @@ async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
         channel_description=user.channel_description,
         avatar_url=user.avatar_url,
         banner_url=user.banner_url,
+        avatar_srcset=user.avatar_srcset,
+        banner_srcset=user.banner_srcset,
         subscriber_count=subscriber_count,
         video_count=video_count
     )
 
-@app.get("/users/{user_id}/videos", response_model=List[schemas.Video])
-async def get_user_videos(user_id: int, db: Session = Depends(get_db)):
+@app.get("/users/{user_id}/videos", response_model=List[schemas.VideoCard])
+def get_user_videos(user_id: int, db: Session = Depends(get_db)):
     """Get all videos uploaded by a specific user"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
+    if not db.query(models.User.id).filter(models.User.id == user_id).first():
         raise HTTPException(status_code=404, detail="User not found")
 
-    videos = db.query(models.Video).filter(models.Video.owner_id == user_id).all()
-
-    # Populate owner info for each video
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
-
-    return videos
+    rows = feeds.card_query(db).filter(models.Video.owner_id == user_id).all()
+    return feeds.card_response(rows)
 
 @app.patch("/users/me/profile", response_model=schemas.User)
-async def update_my_profile(
+def update_my_profile(
     channel_name: Optional[str] = Form(None),
     channel_description: Optional[str] = Form(None),
     avatar: Optional[UploadFile] = File(None),
-    current_user: models.User = Depends(get_current_user),
+    banner: Optional[UploadFile] = File(None),
+    current_user: models.User = Depends(get_current_user_record),
     db: Session = Depends(get_db)
 ):
     """Update the current user's channel profile"""
@@ -1569,194 +1415,270 @@ async def update_my_profile(
             shutil.copyfileobj(avatar.file, buffer)
 
         current_user.avatar_url = f"/avatars/{avatar_filename}"
+        current_user.avatar_variants = None
+
+    # Handle banner upload
+    if banner:
+        AVATARS_DIR = "/app/avatars"
+        os.makedirs(AVATARS_DIR, exist_ok=True)
+
+        # Delete old banner if exists
+        if current_user.banner_url:
+            old_banner_full_path = os.path.join(AVATARS_DIR, current_user.banner_url.replace("/avatars/", ""))
+            if os.path.exists(old_banner_full_path):
+                os.remove(old_banner_full_path)
+
+        banner_filename = f"user_{current_user.id}_banner_{banner.filename}"
+        with open(os.path.join(AVATARS_DIR, banner_filename), "wb") as buffer:
+            shutil.copyfileobj(banner.file, buffer)
+
+        current_user.banner_url = f"/avatars/{banner_filename}"
+        current_user.banner_variants = None
 
     db.commit()
     db.refresh(current_user)
+    auth_cache.invalidate(current_user.id)
+
+    # Resized avatar/banner derivatives are generated in the background
+    if avatar:
+        thumbnails.enqueue_user_image(current_user.id, "avatar")
+    if banner:
+        thumbnails.enqueue_user_image(current_user.id, "banner")
+
     return current_user
 
 # Subscription endpoints
 @app.post("/users/{user_id}/subscribe")
-async def subscribe_to_user(
+def subscribe_to_user(
     user_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Subscribe to a user's channel"""
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot subscribe to yourself")
 
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
+    target_user = db.query(models.User.id, models.User.username).filter(models.User.id == user_id).first()
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Check if already subscribed
-    if target_user in current_user.subscriptions:
+    if not subscriptions.subscribe(db, current_user.id, user_id):
         raise HTTPException(status_code=400, detail="Already subscribed to this user")
 
-    current_user.subscriptions.append(target_user)
-    db.commit()
-
     return {"message": f"Successfully subscribed to {target_user.username}"}
 
 @app.delete("/users/{user_id}/unsubscribe")
-async def unsubscribe_from_user(
+def unsubscribe_from_user(
     user_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Unsubscribe from a user's channel"""
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
+    target_user = db.query(models.User.id, models.User.username).filter(models.User.id == user_id).first()
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Check if subscribed
-    if target_user not in current_user.subscriptions:
+    if not subscriptions.unsubscribe(db, current_user.id, user_id):
         raise HTTPException(status_code=400, detail="Not subscribed to this user")
 
-    current_user.subscriptions.remove(target_user)
-    db.commit()
-
     return {"message": f"Successfully unsubscribed from {target_user.username}"}
 
 @app.get("/users/{user_id}/is-subscribed")
-async def check_subscription(
+def check_subscription(
     user_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Check if current user is subscribed to a specific user"""
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not target_user:
+    if not db.query(models.User.id).filter(models.User.id == user_id).first():
         raise HTTPException(status_code=404, detail="User not found")
 
-    is_subscribed = target_user in current_user.subscriptions
-    return {"is_subscribed": is_subscribed}
+    return {"is_subscribed": subscriptions.is_subscribed(db, current_user.id, user_id)}
 
 @app.get("/users/me/subscriptions", response_model=List[schemas.UserProfile])
-async def get_my_subscriptions(
-    current_user: models.User = Depends(get_current_user),
+def get_my_subscriptions(
+    current_user: auth_cache.Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get list of channels the current user is subscribed to"""
-    subscriptions = []
-    for user in current_user.subscriptions:
-        subscriptions.append(schemas.UserProfile(
-            id=user.id,
-            username=user.username,
-            channel_name=user.channel_name,
-            channel_description=user.channel_description,
-            avatar_url=user.avatar_url,
-            banner_url=user.banner_url,
-            subscriber_count=len(user.subscribers),
-            video_count=len(user.videos)
-        ))
-    return subscriptions
+    channels = subscriptions.subscribed_channels(db, current_user.id)
+    counts = subscriptions.channel_counts(db, [channel.id for channel in channels])
+    return [channel_profile(channel, counts[channel.id]) for channel in channels]
 
 # View tracking
 @app.post("/videos/{video_id}/view")
-async def increment_video_view(video_id: int, db: Session = Depends(get_db)):
-    """Increment view count for a video"""
+def increment_video_view(
+    video_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
+):
+    """Increment view count for a video and record the viewer in the unique viewer HLLs"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    video.views += 1
-    db.commit()
+    # Identify the viewer by user id, or by IP + user agent for anonymous viewers
+    client_ip = viewers.client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    viewer = viewers.viewer_key(
+        current_user.id if current_user else None,
+        client_ip,
+        request.headers.get("user-agent")
+    )
 
-    return {"views": video.views}
+    # Only count the raw view if this viewer hasn't been seen this hour (stops replay inflation)
+    try:
+        is_new_viewer = viewers.record_view(video_id, viewer)
+    except Exception as e:
+        print(f"Error recording unique viewer for video {video_id}: {e}")
+        is_new_viewer = True
 
-# Like/Dislike system
-@app.post("/videos/{video_id}/like")
-async def like_video(
-    video_id: int,
+    if is_new_viewer:
+        video.views = (video.views or 0) + 1
+        db.commit()
+
+    return {"views": video.views, "unique_viewers": video.unique_viewers or 0}
+
+MAX_WATCH_EVENTS = 200
+
+@app.post("/watch-events")
+def record_watch_events(
+    batch: schemas.WatchEventBatch,
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Accept a batch of player heartbeats; they are coalesced per session and written to history in the background"""
+    if len(batch.events) > MAX_WATCH_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_WATCH_EVENTS} events per batch")
+    try:
+        accepted = watch_history.record_heartbeats(current_user.id, batch.events)
+    except Exception as e:
+        print(f"Error recording watch events for user {current_user.id}: {e}")
+        raise HTTPException(status_code=503, detail="Watch history temporarily unavailable")
+    return {"accepted": accepted}
+
+@app.get("/users/me/stats")
+def get_my_stats(
+    period: str = "week",
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
-    """Like a video (or remove like if already liked)"""
+    """Viewing statistics for the current user over a period (day, week, month, all), read from the rollups"""
+    if period not in watch_stats.PERIOD_DAYS and period != "all":
+        raise HTTPException(status_code=400, detail="period must be one of day, week, month, all")
+    return watch_stats.user_stats(db, current_user.id, period)
+
+TV_CHANNEL_MAX_PEEK = 30
+
+@app.get("/users/me/tv-channel")
+def get_tv_channel(
+    limit: int = 10,
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """The upcoming items in the current user's TV channel, without advancing it"""
+    limit = max(1, min(limit, TV_CHANNEL_MAX_PEEK))
+    try:
+        items = tv_channel.peek(current_user.id, limit)
+        if not items:
+            tv_channel.fill(current_user.id)
+            items = tv_channel.peek(current_user.id, limit)
+    except Exception as e:
+        print(f"Error reading TV channel for user {current_user.id}: {e}")
+        raise HTTPException(status_code=503, detail="TV channel temporarily unavailable")
+    return {"items": items}
+
+@app.post("/users/me/tv-channel/next")
+def next_tv_channel_item(current_user: auth_cache.Principal = Depends(get_current_user)):
+    """Advance the TV channel: the video to play now plus the next few, with playlist and first-segment URLs to preload"""
+    try:
+        video, up_next = tv_channel.next_item(current_user.id)
+        if video is None:
+            tv_channel.fill(current_user.id)
+            video, up_next = tv_channel.next_item(current_user.id)
+    except Exception as e:
+        print(f"Error advancing TV channel for user {current_user.id}: {e}")
+        raise HTTPException(status_code=503, detail="TV channel temporarily unavailable")
+    if video is None:
+        raise HTTPException(status_code=404, detail="Nothing left to play")
+    return {"video": video, "up_next": up_next}
+
+@app.post("/users/me/tv-channel/reset")
+def reset_tv_channel(current_user: auth_cache.Principal = Depends(get_current_user)):
+    """Drop the queued items (e.g. after the user's interests changed); the next request rebuilds it"""
+    tv_channel.reset(current_user.id)
+    return {"message": "TV channel reset"}
+
+@app.get("/videos/{video_id}/resume")
+def get_resume_position(
+    video_id: int,
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Where the current user left off in a video (null if finished or never started)"""
+    try:
+        position = watch_history.resume_position(current_user.id, video_id)
+    except Exception as e:
+        print(f"Error reading resume position for user {current_user.id}: {e}")
+        position = None
+    return {"video_id": video_id, "position": position}
+
+@app.get("/videos/{video_id}/unique-viewers")
+def get_unique_viewers(video_id: int, window: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get estimated unique viewers for a video (window: hour, day, week, all; default: every window)"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    # Check if user already liked/disliked this video
-    existing = db.query(models.VideoLike).filter(
-        models.VideoLike.video_id == video_id,
-        models.VideoLike.user_id == current_user.id
-    ).first()
+    if window is not None and window not in viewers.WINDOWS:
+        raise HTTPException(status_code=400, detail="window must be one of: hour, day, week, all")
 
-    if existing:
-        if existing.is_like:
-            # Remove like
-            db.delete(existing)
-            video.likes -= 1
-            db.commit()
-            return {"action": "removed", "likes": video.likes, "dislikes": video.dislikes}
-        else:
-            # Change from dislike to like
-            existing.is_like = True
-            video.dislikes -= 1
-            video.likes += 1
-            db.commit()
-            return {"action": "liked", "likes": video.likes, "dislikes": video.dislikes}
-    else:
-        # Add new like
-        new_like = models.VideoLike(
-            user_id=current_user.id,
-            video_id=video_id,
-            is_like=True
-        )
-        db.add(new_like)
-        video.likes += 1
-        db.commit()
-        return {"action": "liked", "likes": video.likes, "dislikes": video.dislikes}
+    try:
+        if window:
+            return {"video_id": video_id, "window": window, "unique_viewers": viewers.count_unique_viewers(video_id, window)}
+        return {"video_id": video_id, "unique_viewers": viewers.count_unique_viewers_all_windows(video_id)}
+    except Exception as e:
+        print(f"Error reading unique viewers for video {video_id}: {e}")
+        # Only the all-time estimate is persisted; the rolling windows are unknown until Redis is back
+        counts = {name: None for name in viewers.WINDOWS}
+        counts["all"] = video.unique_viewers or 0
+        if window:
+            return {"video_id": video_id, "window": window, "unique_viewers": counts[window]}
+        return {"video_id": video_id, "unique_viewers": counts}
+
+# Like/Dislike system
+@app.post("/videos/{video_id}/like")
+def like_video(
+    video_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Like a video (or remove like if already liked)"""
+    result = reactions.toggle_reaction(db, current_user.id, video_id, is_like=True)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return result
 
 @app.post("/videos/{video_id}/dislike")
-async def dislike_video(
+def dislike_video(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Dislike a video (or remove dislike if already disliked)"""
-    video = db.query(models.Video).filter(models.Video.id == video_id).first()
-    if not video:
+    result = reactions.toggle_reaction(db, current_user.id, video_id, is_like=False)
+    if result is None:
         raise HTTPException(status_code=404, detail="Video not found")
+    return result
 
-    # Check if user already liked/disliked this video
-    existing = db.query(models.VideoLike).filter(
-        models.VideoLike.video_id == video_id,
-        models.VideoLike.user_id == current_user.id
-    ).first()
-
-    if existing:
-        if not existing.is_like:
-            # Remove dislike
-            db.delete(existing)
-            video.dislikes -= 1
-            db.commit()
-            return {"action": "removed", "likes": video.likes, "dislikes": video.dislikes}
-        else:
-            # Change from like to dislike
-            existing.is_like = False
-            video.likes -= 1
-            video.dislikes += 1
-            db.commit()
-            return {"action": "disliked", "likes": video.likes, "dislikes": video.dislikes}
-    else:
-        # Add new dislike
-        new_dislike = models.VideoLike(
-            user_id=current_user.id,
-            video_id=video_id,
-            is_like=False
-        )
-        db.add(new_dislike)
-        video.dislikes += 1
-        db.commit()
-        return {"action": "disliked", "likes": video.likes, "dislikes": video.dislikes}
+@app.post("/admin/reconcile-reactions")
+def reconcile_reactions(db: Session = Depends(get_db)):
+    """Recompute likes/dislikes counters from video_likes"""
+    fixed = reactions.reconcile_reaction_counts(db)
+    return {"status": "success", "fixed": fixed}
 
 @app.get("/videos/{video_id}/like-status")
-async def get_like_status(
+def get_like_status(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get current user's like/dislike status for a video"""
     if not current_user:
@@ -1771,179 +1693,172 @@ async def get_like_status(
         return {"status": "liked" if existing.is_like else "disliked"}
     return {"status": "none"}
 
+VIEWER_STATE_MAX_VIDEOS = 50
+
+@app.post("/videos/viewer-state", response_model=List[schemas.VideoViewerState])
+def get_viewer_state(
+    request: schemas.ViewerStateRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
+):
+    """Get the current user's like, subscription and playlist state for a page of videos in one call"""
+    video_ids = list(dict.fromkeys(request.video_ids))
+    if len(video_ids) > VIEWER_STATE_MAX_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"At most {VIEWER_STATE_MAX_VIDEOS} videos per request")
+    if not video_ids:
+        return []
+
+    videos = db.query(
+        models.Video.id, models.Video.owner_id, models.Video.processing_status
+    ).filter(models.Video.id.in_(video_ids)).all()
+
+    states = {
+        video.id: schemas.VideoViewerState(
+            video_id=video.id,
+            owner_id=video.owner_id,
+            processing_status=video.processing_status
+        )
+        for video in videos
+    }
+
+    if current_user and states:
+        # One query per relation type, regardless of page size
+        reactions_rows = db.query(models.VideoLike.video_id, models.VideoLike.is_like).filter(
+            models.VideoLike.user_id == current_user.id,
+            models.VideoLike.video_id.in_(states.keys())
+        ).all()
+        for row in reactions_rows:
+            states[row.video_id].like_status = "liked" if row.is_like else "disliked"
+
+        owner_ids = {state.owner_id for state in states.values()}
+        subscribed_ids = {
+            row.subscribed_to_id for row in db.query(models.subscriptions.c.subscribed_to_id).filter(
+                models.subscriptions.c.subscriber_id == current_user.id,
+                models.subscriptions.c.subscribed_to_id.in_(owner_ids)
+            )
+        }
+        for state in states.values():
+            state.is_subscribed = state.owner_id in subscribed_ids
+
+        playlist_rows = db.query(
+            models.playlist_videos.c.video_id, models.playlist_videos.c.playlist_id
+        ).join(
+            models.Playlist, models.Playlist.id == models.playlist_videos.c.playlist_id
+        ).filter(
+            models.Playlist.owner_id == current_user.id,
+            models.playlist_videos.c.video_id.in_(states.keys())
+        ).all()
+        for row in playlist_rows:
+            states[row.video_id].playlist_ids.append(row.playlist_id)
+
+    # Preserve the requested order, skipping videos that don't exist
+    return [states[video_id] for video_id in video_ids if video_id in states]
+
 # Recommendation and feed endpoints
-@app.get("/videos/trending", response_model=List[schemas.Video])
-async def get_trending_videos(
+@app.get("/videos/trending", response_model=List[schemas.VideoCard])
+def get_trending_videos(
+    request: Request,
     time_period: Optional[str] = None,  # "week", "month", or None (all time)
     page: int = 1,
     page_size: int = 20,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get trending videos with weighted algorithm (views + likes + recency)"""
-    from datetime import datetime, timedelta
-    from sqlalchemy import case
-
-    # Base query
-    query = db.query(models.Video).filter(
-        models.Video.processing_status == "completed"
-    )
-
-    # Apply time filter if specified
-    if time_period == "week":
-        cutoff_date = datetime.utcnow() - timedelta(days=7)
-        query = query.filter(models.Video.upload_date >= cutoff_date)
-    elif time_period == "month":
-        cutoff_date = datetime.utcnow() - timedelta(days=30)
-        query = query.filter(models.Video.upload_date >= cutoff_date)
+    time_period = time_period if time_period in TRENDING_PERIODS else None
 
-    # Calculate trending score:
-    # Score = views * 1 + likes * 5 + (like_ratio * 10) - (days_old * 0.1)
-    # Like ratio = likes / (likes + dislikes) if total > 0, else 0.5
-    # This weights: views (1x), likes (5x), engagement quality (10x), and recency
-    now = func.now()
-    days_old = func.extract('epoch', now - models.Video.upload_date) / 86400.0
-    total_reactions = models.Video.likes + models.Video.dislikes
-    like_ratio = case(
-        (total_reactions > 0, models.Video.likes * 1.0 / total_reactions),
-        else_=0.5
-    )
+    def compute(db: Session):
+        query = trending_filter(feeds.card_query(db), time_period)
+        rows = query.order_by(feeds.trending_score_expression().desc()).offset((page - 1) * page_size).limit(page_size).all()
+        return [feeds.card(row) for row in rows]
 
-    trending_score = (
-        models.Video.views * 1.0 +
-        models.Video.likes * 5.0 +
-        like_ratio * 10.0 -
-        days_old * 0.1
+    return response_cache.serve(
+        request, db, "videos_trending", {"time_period": time_period, "page": page, "page_size": page_size}, compute
     )
 
-    offset = (page - 1) * page_size
-    videos = query.order_by(trending_score.desc()).offset(offset).limit(page_size).all()
-
-    # Populate owner info
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
-
-    return videos
-
 @app.get("/videos/trending/count")
-async def get_trending_count(
+def get_trending_count(
+    request: Request,
     time_period: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Get count of trending videos for pagination"""
-    from datetime import datetime, timedelta
+    time_period = time_period if time_period in TRENDING_PERIODS else None
 
-    query = db.query(models.Video).filter(
-        models.Video.processing_status == "completed"
-    )
+    def compute(db: Session):
+        return {"total": trending_filter(db.query(models.Video), time_period).count()}
 
-    if time_period == "week":
-        cutoff_date = datetime.utcnow() - timedelta(days=7)
-        query = query.filter(models.Video.upload_date >= cutoff_date)
-    elif time_period == "month":
-        cutoff_date = datetime.utcnow() - timedelta(days=30)
+    return response_cache.serve(request, db, "videos_trending_count", {"time_period": time_period}, compute)
+
+TRENDING_PERIODS = {"week": 7, "month": 30}  # time_period -> days
+
+def trending_filter(query, time_period: Optional[str]):
+    """Completed videos, limited to the time period if one is given"""
+    query = query.filter(models.Video.processing_status == "completed")
+    if time_period in TRENDING_PERIODS:
+        cutoff_date = datetime.utcnow() - timedelta(days=TRENDING_PERIODS[time_period])
         query = query.filter(models.Video.upload_date >= cutoff_date)
+    return query
 
-    count = query.count()
-    return {"total": count}
+SUBSCRIPTIONS_FEED_MAX_LIMIT = 100
 
-@app.get("/videos/subscriptions-feed", response_model=List[schemas.Video])
-async def get_subscriptions_feed(
+@app.get("/videos/subscriptions-feed", response_model=List[schemas.VideoCard])
+def get_subscriptions_feed(
+    cursor: Optional[str] = None,
+    limit: int = 24,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
-    """Get videos from subscribed channels"""
-    # Get IDs of users current user is subscribed to
-    subscribed_user_ids = [user.id for user in current_user.subscriptions]
-
-    if not subscribed_user_ids:
-        return []
+    """Get videos from subscribed channels, newest first.
 
-    # Get videos from subscribed users
-    videos = db.query(models.Video).filter(
-        models.Video.owner_id.in_(subscribed_user_ids),
-        models.Video.processing_status == "completed"
-    ).order_by(models.Video.upload_date.desc()).all()
-
-    # Populate owner info
-    for video in videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
-
-    return videos
+    Pass the X-Next-Cursor header of a page as ?cursor= to get the next one;
+    the header is absent on the last page.
+    """
+    limit = min(max(limit, 1), SUBSCRIPTIONS_FEED_MAX_LIMIT)
+    try:
+        rows, next_cursor = feeds.subscription_page(db, current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return feeds.card_response(rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
 
-@app.get("/videos/{video_id}/similar", response_model=List[schemas.Video])
-async def get_similar_videos(
+@app.get("/videos/{video_id}/similar", response_model=List[schemas.VideoCard])
+def get_similar_videos(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get similar videos based on shared tags and same channel"""
-    from sqlalchemy import and_, or_
-
     # Get the current video
     current_video = db.query(models.Video).filter(models.Video.id == video_id).first()
     if not current_video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    # Get all completed videos except the current one
-    all_videos = db.query(models.Video).filter(
-        and_(
-            models.Video.processing_status == "completed",
-            models.Video.id != video_id
-        )
-    ).all()
-
-    # Score videos by similarity
-    scored_videos = []
-    for video in all_videos:
-        score = 0
-
-        # Same channel bonus (very high weight)
-        if video.owner_id == current_video.owner_id:
-            score += 50
-
-        # Shared tags (high weight)
-        if current_video.tags and video.tags:
-            shared_tags = set(current_video.tags) & set(video.tags)
-            score += len(shared_tags) * 10
-
-        # Recent videos get slight boost
-        days_old = (func.now() - video.upload_date).total_seconds() / 86400.0
-        if days_old < 7:
-            score += 5
-        elif days_old < 30:
-            score += 2
-
-        # Popular videos get boost
-        score += video.likes * 0.5
-        score += video.views * 0.01
-
-        if score > 0:
-            scored_videos.append((score, video))
-
-    # Sort by score and get top 10
-    scored_videos.sort(key=lambda x: x[0], reverse=True)
-    similar_videos = [video for score, video in scored_videos[:10]]
+    # Cached briefly and recomputed single-flight
+    similar_ids = query_cache.cached(
+        f"similar:{video_id}", SIMILAR_VIDEOS_TTL,
+        feeds.similar_video_ids, db, current_video.id, current_video.owner_id, current_video.tags
+    )
+    return feeds.card_response(feeds.cards_by_ids(db, similar_ids))
 
-    # Populate owner info
-    for video in similar_videos:
-        if video.owner:
-            video.owner.subscriber_count = len(video.owner.subscribers)
-            video.owner.video_count = len(video.owner.videos)
+POPULAR_TAGS_TTL = 300  # Seconds popular tags / similar videos are served from cache
+SIMILAR_VIDEOS_TTL = 300
 
-    return similar_videos
+query_cache = singleflight.group("query_cache")
 
 @app.get("/videos/popular-tags")
-async def get_popular_tags(
+def get_popular_tags(
+    request: Request,
     limit: int = 10,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get most popular tags based on video count"""
+    return response_cache.serve(
+        request, db, "videos_popular_tags", {"limit": limit},
+        lambda db: compute_tag_counts(db)[:limit], ttl=POPULAR_TAGS_TTL
+    )
+
+def compute_tag_counts(db: Session) -> List[dict]:
     # Get all videos with tags
     videos = db.query(models.Video).filter(
         and_(
@@ -1961,15 +1876,15 @@ async def get_popular_tags(
                 if tag:
                     tag_counts[tag] = tag_counts.get(tag, 0) + 1
 
-    # Sort by count and return top tags
+    # Sort by count
     sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
-    return [{"tag": tag, "count": count} for tag, count in sorted_tags[:limit]]
+    return [{"tag": tag, "count": count} for tag, count in sorted_tags]
 
 @app.get("/videos/{video_id}", response_model=schemas.Video)
-async def get_video(
+def get_video(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user_optional)
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
 ):
     """Get a specific video by ID"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
@@ -1977,18 +1892,18 @@ async def get_video(
         raise HTTPException(status_code=404, detail="Video not found")
 
     # Populate owner info
-    if video.owner:
-        video.owner.subscriber_count = len(video.owner.subscribers)
-        video.owner.video_count = len(video.owner.videos)
+    subscriptions.attach_owner_counts(db, [video])
 
     return video
 
 # Playlist endpoints
+PLAYLIST_MAX_PAGE_SIZE = 500
+
 @app.post("/playlists", response_model=schemas.Playlist)
-async def create_playlist(
+def create_playlist(
     playlist: schemas.PlaylistCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Create a new playlist"""
     db_playlist = models.Playlist(
@@ -2004,12 +1919,12 @@ async def create_playlist(
     return db_playlist
 
 @app.get("/playlists", response_model=List[schemas.Playlist])
-async def get_playlists(
+def get_playlists(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Get all playlists (public + user's private ones)"""
-    playlists = db.query(models.Playlist).filter(
+    user_playlists = db.query(models.Playlist).filter(
         or_(
             models.Playlist.is_public == True,
             models.Playlist.owner_id == current_user.id
@@ -2017,38 +1932,39 @@ async def get_playlists(
     ).all()
 
     # Add video count to each playlist
-    for playlist in playlists:
-        playlist.video_count = db.query(models.playlist_videos).filter(
-            models.playlist_videos.c.playlist_id == playlist.id
-        ).count()
+    counts = playlists.video_counts(db, [playlist.id for playlist in user_playlists])
+    for playlist in user_playlists:
+        playlist.video_count = counts[playlist.id]
 
-    return playlists
+    return user_playlists
 
 @app.get("/playlists/my-playlists", response_model=List[schemas.Playlist])
-async def get_my_playlists(
+def get_my_playlists(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Get current user's playlists"""
-    playlists = db.query(models.Playlist).filter(
+    user_playlists = db.query(models.Playlist).filter(
         models.Playlist.owner_id == current_user.id
     ).all()
 
     # Add video count to each playlist
-    for playlist in playlists:
-        playlist.video_count = db.query(models.playlist_videos).filter(
-            models.playlist_videos.c.playlist_id == playlist.id
-        ).count()
+    counts = playlists.video_counts(db, [playlist.id for playlist in user_playlists])
+    for playlist in user_playlists:
+        playlist.video_count = counts[playlist.id]
 
-    return playlists
+    return user_playlists
 
 @app.get("/playlists/{playlist_id}", response_model=schemas.PlaylistWithVideos)
-async def get_playlist(
+def get_playlist(
     playlist_id: int,
+    page: int = 1,
+    page_size: int = 100,
+    offset: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
-    """Get a specific playlist with its videos"""
+    """Get a specific playlist with a page of its videos (as cards, in playlist order)"""
     playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
@@ -2057,31 +1973,74 @@ async def get_playlist(
     if not playlist.is_public and playlist.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    # Get playlist videos in order
-    playlist_video_records = db.query(models.playlist_videos).filter(
-        models.playlist_videos.c.playlist_id == playlist_id
-    ).order_by(models.playlist_videos.c.position).all()
-
-    video_ids = [record.video_id for record in playlist_video_records]
-    videos = []
-    for video_id in video_ids:
-        video = db.query(models.Video).filter(models.Video.id == video_id).first()
-        if video and video.processing_status == "completed":
-            if video.owner:
-                video.owner.subscriber_count = len(video.owner.subscribers)
-                video.owner.video_count = len(video.owner.videos)
-            videos.append(video)
-
-    playlist.videos = videos
-    playlist.video_count = len(videos)
+    page_size = min(max(page_size, 1), PLAYLIST_MAX_PAGE_SIZE)
+    # An explicit offset wins over page: a client that removed videos locally continues
+    # from what it has loaded, so no video slides back past the page boundary unseen
+    if offset is None:
+        offset = (max(page, 1) - 1) * page_size
+    videos, total = playlists.card_page(db, playlist_id, max(offset, 0), page_size)
+    playlist.video_count = total
+    return ORJSONResponse({**schemas.Playlist.model_validate(playlist).model_dump(), "videos": videos})
+
+SPLICE_MAX_VIDEOS = 50
+SPLICE_LIVE_MAX_VIDEOS = 2000
+
+def get_streamable_playlist(db: Session, playlist_id: int, current_user: Optional[auth_cache.Principal]) -> models.Playlist:
+    playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    if not playlist.is_public and (current_user is None or playlist.owner_id != current_user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
     return playlist
 
+def hls_playlist_response(body: str, headers: Optional[dict] = None) -> Response:
+    return Response(
+        content=body, media_type=media.MEDIA_TYPES[".m3u8"],
+        headers={"Cache-Control": media.NO_CACHE, **(headers or {})}
+    )
+
+@app.get("/playlists/{playlist_id}/stream.m3u8")
+def stream_playlist(
+    playlist_id: int,
+    start: int = 0,
+    count: int = 20,
+    db: Session = Depends(get_db),
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
+):
+    """Videos start..start+count of a playlist spliced into one VOD HLS playlist (discontinuity between videos).
+
+    X-Next-Start gives the start of the following window, X-Video-Ids the videos in this one (one per discontinuity).
+    """
+    get_streamable_playlist(db, playlist_id, current_user)
+    start, count = max(start, 0), min(max(count, 1), SPLICE_MAX_VIDEOS)
+    rows = playlists.stream_videos(db, playlist_id, start, count + 1)
+    spliced = hls_splice.parsed_playlists(rows[:count])
+    if not spliced:
+        raise HTTPException(status_code=404, detail="No playable videos in this range")
+    headers = {"X-Video-Ids": ",".join(str(playlist.video_id) for playlist in spliced)}
+    if len(rows) > count:
+        headers["X-Next-Start"] = str(start + count)
+    return hls_playlist_response(hls_splice.vod_playlist(spliced), headers)
+
+@app.get("/playlists/{playlist_id}/live.m3u8")
+def stream_playlist_live(
+    playlist_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[auth_cache.Principal] = Depends(get_current_user_optional)
+):
+    """The playlist looping forever as a live channel, on a schedule anchored at the playlist's creation time"""
+    playlist = get_streamable_playlist(db, playlist_id, current_user)
+    spliced = hls_splice.parsed_playlists(playlists.stream_videos(db, playlist_id, 0, SPLICE_LIVE_MAX_VIDEOS))
+    if not spliced:
+        raise HTTPException(status_code=404, detail="No playable videos in this playlist")
+    return hls_playlist_response(hls_splice.live_playlist(spliced, playlist.created_at.timestamp()))
+
 @app.patch("/playlists/{playlist_id}", response_model=schemas.Playlist)
-async def update_playlist(
+def update_playlist(
     playlist_id: int,
     playlist_update: schemas.PlaylistUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Update playlist metadata"""
     playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
@@ -2101,17 +2060,15 @@ async def update_playlist(
     db.commit()
     db.refresh(playlist)
 
-    playlist.video_count = db.query(models.playlist_videos).filter(
-        models.playlist_videos.c.playlist_id == playlist.id
-    ).count()
+    playlist.video_count = playlists.video_counts(db, [playlist.id])[playlist.id]
 
     return playlist
 
 @app.delete("/playlists/{playlist_id}")
-async def delete_playlist(
+def delete_playlist(
     playlist_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Delete a playlist"""
     playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
@@ -2130,103 +2087,89 @@ async def delete_playlist(
     db.commit()
     return {"message": "Playlist deleted successfully"}
 
-@app.post("/playlists/{playlist_id}/videos/{video_id}")
-async def add_video_to_playlist(
-    playlist_id: int,
-    video_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    """Add a video to a playlist"""
+def get_owned_playlist(db: Session, playlist_id: int, user_id: int) -> models.Playlist:
     playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
-    if playlist.owner_id != current_user.id:
+    if playlist.owner_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
+    return playlist
 
-    video = db.query(models.Video).filter(models.Video.id == video_id).first()
-    if not video:
-        raise HTTPException(status_code=404, detail="Video not found")
+@app.post("/playlists/{playlist_id}/videos")
+def add_videos_to_playlist(
+    playlist_id: int,
+    body: schemas.PlaylistVideosAdd,
+    db: Session = Depends(get_db),
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Append several videos in order; unknown videos and ones already in the playlist are skipped"""
+    get_owned_playlist(db, playlist_id, current_user.id)
+    if len(body.video_ids) > playlists.MAX_BULK_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"At most {playlists.MAX_BULK_VIDEOS} videos per request")
 
-    # Check if video already in playlist
-    existing = db.query(models.playlist_videos).filter(
-        and_(
-            models.playlist_videos.c.playlist_id == playlist_id,
-            models.playlist_videos.c.video_id == video_id
-        )
-    ).first()
+    added = playlists.add_videos(db, playlist_id, body.video_ids)
+    return {"message": f"Added {len(added)} videos to playlist", "added": added}
 
-    if existing:
-        raise HTTPException(status_code=400, detail="Video already in playlist")
+@app.post("/playlists/{playlist_id}/videos/move")
+def move_playlist_videos(
+    playlist_id: int,
+    body: schemas.PlaylistVideosMove,
+    db: Session = Depends(get_db),
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Move videos (kept in the given order) to right after after_video_id, or to the top"""
+    get_owned_playlist(db, playlist_id, current_user.id)
+    if len(body.video_ids) > playlists.MAX_BULK_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"At most {playlists.MAX_BULK_VIDEOS} videos per request")
 
-    # Get next position
-    max_position = db.query(func.max(models.playlist_videos.c.position)).filter(
-        models.playlist_videos.c.playlist_id == playlist_id
-    ).scalar()
-    next_position = (max_position or -1) + 1
-
-    # Insert into playlist_videos
-    db.execute(
-        models.playlist_videos.insert().values(
-            playlist_id=playlist_id,
-            video_id=video_id,
-            position=next_position
-        )
-    )
-    db.commit()
+    try:
+        moved = playlists.move_videos(db, playlist_id, body.video_ids, body.after_video_id)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Moved {moved} videos"}
+
+# After /videos/move so "move" isn't taken for a video id
+@app.post("/playlists/{playlist_id}/videos/{video_id}")
+def add_video_to_playlist(
+    playlist_id: int,
+    video_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth_cache.Principal = Depends(get_current_user)
+):
+    """Add a video to the end of a playlist"""
+    get_owned_playlist(db, playlist_id, current_user.id)
+
+    if not db.query(models.Video.id).filter(models.Video.id == video_id).first():
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    if not playlists.add_videos(db, playlist_id, [video_id]):
+        raise HTTPException(status_code=400, detail="Video already in playlist")
 
     return {"message": "Video added to playlist"}
 
 @app.delete("/playlists/{playlist_id}/videos/{video_id}")
-async def remove_video_from_playlist(
+def remove_video_from_playlist(
     playlist_id: int,
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Remove a video from a playlist"""
-    playlist = db.query(models.Playlist).filter(models.Playlist.id == playlist_id).first()
-    if not playlist:
-        raise HTTPException(status_code=404, detail="Playlist not found")
-
-    if playlist.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    # Delete the association
-    result = db.query(models.playlist_videos).filter(
-        and_(
-            models.playlist_videos.c.playlist_id == playlist_id,
-            models.playlist_videos.c.video_id == video_id
-        )
-    ).delete(synchronize_session=False)
+    get_owned_playlist(db, playlist_id, current_user.id)
 
-    if result == 0:
+    # Positions are sparse, so the remaining videos keep theirs
+    if not playlists.remove_video(db, playlist_id, video_id):
         raise HTTPException(status_code=404, detail="Video not in playlist")
 
-    # Reorder remaining videos
-    remaining_videos = db.query(models.playlist_videos).filter(
-        models.playlist_videos.c.playlist_id == playlist_id
-    ).order_by(models.playlist_videos.c.position).all()
-
-    for idx, record in enumerate(remaining_videos):
-        db.execute(
-            models.playlist_videos.update().where(
-                and_(
-                    models.playlist_videos.c.playlist_id == playlist_id,
-                    models.playlist_videos.c.video_id == record.video_id
-                )
-            ).values(position=idx)
-        )
-
-    db.commit()
     return {"message": "Video removed from playlist"}
 
 @app.post("/videos/{video_id}/retry-processing")
-async def retry_video_processing(
+def retry_video_processing(
     video_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: auth_cache.Principal = Depends(get_current_user)
 ):
     """Manually retry processing for a failed or stuck video"""
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
@@ -2244,8 +2187,8 @@ async def retry_video_processing(
     db.commit()
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        with httpx.Client() as client:
+            response = client.post(
                 "http://video-processor:8002/process-video",
                 json={
                     "video_path": video.file_path,
@@ -0,0 +1,361 @@
+"""Cache-aware static media serving.
+
+All file-backed media (HLS playlists and segments, processed thumbnails,
+avatars, the /thumbnails tree) is served through ``serve_file``, which:
+
+- derives strong validators (ETag, Last-Modified) from a single ``stat`` call,
+- answers ``If-None-Match`` / ``If-Modified-Since`` with 304 without opening the file,
+- serves single and multi-part ``Range`` requests (honouring ``If-Range``),
+- attaches a ``Cache-Control`` policy chosen by the caller,
+- counts hits, misses and bytes so the cache hit ratio is measurable.
+
+Async handlers use ``serve_file_async``. It runs the ``stat`` and every file
+read on a ``MEDIA_THREADS`` limiter of its own, so media never queues behind
+DB-bound handlers in the default threadpool (sized to the DB pool).
+
+MIME types come from a fixed extension map rather than ``mimetypes`` lookups.
+
+Large progressive downloads can be offloaded to a fronting nginx with
+``X-Accel-Redirect`` (set ``MEDIA_ACCEL_REDIRECT_PREFIX``), which then serves
+them with sendfile and handles ranges itself.
+"""
+import functools
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from stat import S_ISREG
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import anyio
+import anyio.to_thread
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Cache-Control policies
+IMMUTABLE = "public, max-age=31536000, immutable"  # Content-addressed images
+STABLE = "public, max-age=86400"  # Files that rarely change but keep their name (YouTube thumbnails)
+REVALIDATE = "public, max-age=300, must-revalidate"  # Replaceable files (avatars, processed thumbnails)
+VOD_MEDIA = "public, max-age=3600, must-revalidate"  # Processed HLS; reprocessing rewrites it under the same names
+LIVE_SEGMENT = "public, max-age=60"  # Live segments: never rewritten, but rotated away quickly
+NO_CACHE = "no-cache"  # Live and in-progress playlists
+
+MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+}
+
+MEDIA_ROOT = "/app"
+# e.g. "/internal" with an nginx `location /internal/ { internal; alias /app/; }`
+ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX")
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16  # Refuse pathological multi-range requests
+MEDIA_THREADS = int(os.getenv("MEDIA_THREADS", "64"))
+
+_media_limiter = anyio.CapacityLimiter(MEDIA_THREADS)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "not_modified": 0,
+    "full": 0,
+    "partial": 0,
+    "bytes_sent": 0,
+    "bytes_saved": 0,
+}
+
+# Playlist path -> (mtime_ns, size, finished); avoids re-reading unchanged playlists
+PLAYLIST_STATE_MAX_ENTRIES = 4096
+PROCESSED_DIR = "/app/processed_videos"
+_playlist_lock = threading.Lock()
+_playlist_state: "OrderedDict[str, Tuple[int, int, bool]]" = OrderedDict()
+
+
+def media_type_for(path: str, default: str = "application/octet-stream") -> str:
+    return MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), default)
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+
+
+def media_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    served = stats["not_modified"] + stats["full"] + stats["partial"]
+    stats["hit_ratio"] = round(stats["not_modified"] / served, 4) if served else 0.0
+    return stats
+
+
+def safe_join(base_dir: str, relative_path: str) -> str:
+    """Resolve relative_path under base_dir, refusing anything that escapes it"""
+    base = os.path.realpath(base_dir)
+    path = os.path.realpath(os.path.join(base, relative_path))
+    if path != base and not path.startswith(base + os.sep):
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
+
+
+def playlist_finished(path: str, stat: os.stat_result) -> bool:
+    """True once an HLS playlist carries #EXT-X-ENDLIST (cached per mtime/size)"""
+    with _playlist_lock:
+        cached = _playlist_state.get(path)
+        if cached is not None:
+            _playlist_state.move_to_end(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, stat.st_size - 64))
+            finished = b"#EXT-X-ENDLIST" in f.read()
+    except OSError:
+        finished = False
+    with _playlist_lock:
+        _playlist_state[path] = (stat.st_mtime_ns, stat.st_size, finished)
+        _playlist_state.move_to_end(path)
+        while len(_playlist_state) > PLAYLIST_STATE_MAX_ENTRIES:
+            _playlist_state.popitem(last=False)
+    return finished
+
+
+def forget_video(video_id: int):
+    """Drop a processed video's playlist states (reprocess, delete)"""
+    prefix = os.path.join(PROCESSED_DIR, str(video_id)) + os.sep
+    with _playlist_lock:
+        for path in [path for path in _playlist_state if path.startswith(prefix)]:
+            del _playlist_state[path]
+
+
+def etag_for(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_ranges(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a bytes Range header into inclusive (start, end) pairs.
+
+    Returns None if the header is malformed (serve the whole file) and an empty
+    list if no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start_text, sep, end_text = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_text:
+                start = int(start_text)
+                end = int(end_text) if end_text else size - 1
+            else:
+                # Suffix range: the last N bytes
+                length = int(end_text)
+                if length == 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+        except ValueError:
+            return None
+        if start > end or start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def _read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def run_sync(func, *args):
+    """Run blocking file work on the media threads"""
+    return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=_media_limiter)
+
+
+async def _on_media_threads(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, chunks, None, limiter=_media_limiter)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def serve_file(
+    request: Request,
+    path: str,
+    cache_control: str,
+    media_type: Optional[str] = None,
+    not_found: str = "File not found",
+    offload: bool = False,
+    filename: Optional[str] = None,
+    media_threads: bool = False,
+) -> Response:
+    """Serve a file with validators, conditional GET, Range support and a cache policy.
+
+    With media_threads the body is read on the media threads rather than Starlette's default pool.
+    """
+    def body(chunks: Iterator[bytes]):
+        return _on_media_threads(chunks) if media_threads else chunks
+
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail=not_found)
+    if not S_ISREG(stat.st_mode):
+        raise HTTPException(status_code=404, detail=not_found)
+
+    media_type = media_type or media_type_for(path)
+    etag = etag_for(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    _record(requests=1)
+
+    if _not_modified(request, etag, stat.st_mtime):
+        _record(not_modified=1, bytes_saved=stat.st_size)
+        return Response(status_code=304, headers=headers)
+
+    if offload and ACCEL_REDIRECT_PREFIX and path.startswith(MEDIA_ROOT + os.sep):
+        # nginx streams the file (sendfile, ranges) and keeps our cache headers
+        headers["X-Accel-Redirect"] = ACCEL_REDIRECT_PREFIX.rstrip("/") + path[len(MEDIA_ROOT):]
+        return Response(status_code=200, media_type=media_type, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        ranges = _parse_ranges(range_header, stat.st_size)
+        if ranges == []:
+            headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+        if ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            headers["Content-Length"] = str(length)
+            _record(partial=1, bytes_sent=length)
+            return StreamingResponse(
+                body(_read_range(path, start, end)), status_code=206, media_type=media_type, headers=headers
+            )
+        if ranges:
+            boundary = uuid.uuid4().hex
+            parts = []
+            total = 0
+            for start, end in ranges:
+                part_header = (
+                    f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{stat.st_size}\r\n\r\n"
+                ).encode("ascii")
+                parts.append((part_header, start, end))
+                total += len(part_header) + (end - start + 1) + 2
+            closing = f"--{boundary}--\r\n".encode("ascii")
+            total += len(closing)
+
+            def multipart_body() -> Iterator[bytes]:
+                for part_header, start, end in parts:
+                    yield part_header
+                    yield from _read_range(path, start, end)
+                    yield b"\r\n"
+                yield closing
+
+            headers["Content-Length"] = str(total)
+            _record(partial=1, bytes_sent=total)
+            return StreamingResponse(
+                body(multipart_body()),
+                status_code=206,
+                media_type=f"multipart/byteranges; boundary={boundary}",
+                headers=headers,
+            )
+
+    _record(full=1, bytes_sent=stat.st_size)
+    if media_threads:
+        headers["Content-Length"] = str(stat.st_size)
+        return StreamingResponse(
+            body(_read_range(path, 0, stat.st_size - 1)), media_type=media_type, headers=headers
+        )
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+
+async def serve_file_async(request: Request, path: str, cache_control: str, **kwargs) -> Response:
+    """serve_file for async handlers, with the stat and file reads on the media threads"""
+    return await run_sync(functools.partial(serve_file, request, path, cache_control, media_threads=True, **kwargs))
+
+
+def serve_cached(request: Request, cached, cache_control: str) -> Response:
+    """Serve an in-memory copy (see segment_cache) with the same validators as serve_file.
+
+    Multi-range requests on these small objects get the whole body (a valid 200).
+    """
+    size = len(cached.body)
+    headers = {
+        "ETag": cached.etag,
+        "Last-Modified": cached.last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    _record(requests=1)
+
+    if _not_modified(request, cached.etag, cached.mtime_ns / 1e9):
+        _record(not_modified=1, bytes_saved=size)
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == cached.etag):
+        ranges = _parse_ranges(range_header, size)
+        if ranges == []:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            _record(partial=1, bytes_sent=end - start + 1)
+            return Response(
+                cached.body[start:end + 1], status_code=206, media_type=cached.media_type, headers=headers
+            )
+
+    _record(full=1, bytes_sent=size)
+    return Response(cached.body, media_type=cached.media_type, headers=headers)
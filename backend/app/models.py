@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Table, ARRAY
+from sqlalchemy import Column, Integer, BigInteger, Identity, Numeric, String, Date, DateTime, ForeignKey, Boolean, Table, ARRAY, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -10,7 +10,9 @@ subscriptions = Table(
     Base.metadata,
     Column('subscriber_id', Integer, ForeignKey('users.id'), primary_key=True),
     Column('subscribed_to_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('subscribed_at', DateTime(timezone=True), server_default=func.now())
+    Column('subscribed_at', DateTime(timezone=True), server_default=func.now()),
+    # The primary key covers subscriber -> channel; follower lookups and counts need the reverse
+    Index('ix_subscriptions_subscribed_to', 'subscribed_to_id', 'subscriber_id')
 )
 
 class User(Base):
@@ -21,12 +23,16 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    is_bot = Column(Boolean, nullable=False, default=False)  # Automated content account (cleanup, imports)
+    token_version = Column(Integer, nullable=False, default=0)  # Bumped to revoke all issued tokens
 
     # Channel info
     channel_name = Column(String, nullable=True)
     channel_description = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
     banner_url = Column(String, nullable=True)
+    avatar_variants = Column(JSON(none_as_null=True), nullable=True)  # Resized derivatives, see thumbnails.py
+    banner_variants = Column(JSON(none_as_null=True), nullable=True)
 
     videos = relationship("Video", back_populates="owner")
 
@@ -39,6 +45,14 @@ class User(Base):
         backref="subscribers"
     )
 
+    @property
+    def avatar_srcset(self):
+        return (self.avatar_variants or {}).get("srcset")
+
+    @property
+    def banner_srcset(self):
+        return (self.banner_variants or {}).get("srcset")
+
 class Video(Base):
     __tablename__ = "videos"
 
@@ -48,23 +62,54 @@ class Video(Base):
     file_path = Column(String, nullable=True)  # Nullable for live streams and YouTube videos
     stream_url = Column(String, nullable=True)  # RTSP/HLS stream URL
     is_live_stream = Column(Boolean, default=False)  # True if this is a live stream
-    youtube_url = Column(String, nullable=True)  # YouTube video URL/ID
+    live_low_latency = Column(Boolean, default=False)  # Serve the live stream as LL-HLS
+    youtube_url = Column(String, nullable=True, unique=True)  # YouTube video URL/ID
     thumbnail_path = Column(String, nullable=True)
+    thumbnail_variants = Column(JSON(none_as_null=True), nullable=True)  # Resized derivatives, see thumbnails.py
     hls_path = Column(String, nullable=True)
     duration = Column(Integer, nullable=True)  # Duration in seconds
     processing_status = Column(String, default="uploading")  # uploading, processing, completed, failed
     views = Column(Integer, default=0)
+    unique_viewers = Column(Integer, default=0)  # HyperLogLog estimate, persisted periodically
     likes = Column(Integer, default=0)
     dislikes = Column(Integer, default=0)
     tags = Column(ARRAY(String), nullable=True, default=[])  # Array of tags for categorization
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
+    last_checked_at = Column(DateTime(timezone=True), nullable=True)  # Last YouTube availability check
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="videos")
     video_likes = relationship("VideoLike", back_populates="video", cascade="all, delete-orphan")
 
+    @property
+    def thumbnail_srcset(self):
+        return (self.thumbnail_variants or {}).get("srcset")
+
+    @property
+    def thumbnail_placeholder(self):
+        return (self.thumbnail_variants or {}).get("placeholder")
+
+    __table_args__ = (
+        # Availability checker scans YouTube videos oldest-checked first
+        Index(
+            "ix_videos_youtube_last_checked",
+            last_checked_at.asc().nullsfirst(), id,
+            postgresql_where=youtube_url.isnot(None)
+        ),
+        # Subscriptions feed reads each followed channel's newest completed videos
+        Index(
+            "ix_videos_owner_completed_recent",
+            owner_id, upload_date.desc(), id.desc(),
+            postgresql_where=processing_status == "completed"
+        ),
+    )
+
 class VideoLike(Base):
     __tablename__ = "video_likes"
+    __table_args__ = (
+        # One reaction per user per video; reaction toggles upsert against this
+        UniqueConstraint("user_id", "video_id", name="uq_video_likes_user_video"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -81,8 +126,10 @@ playlist_videos = Table(
     Base.metadata,
     Column('playlist_id', Integer, ForeignKey('playlists.id'), primary_key=True),
     Column('video_id', Integer, ForeignKey('videos.id'), primary_key=True),
-    Column('position', Integer, nullable=False),  # Order of videos in playlist
-    Column('added_at', DateTime(timezone=True), server_default=func.now())
+    Column('position', Integer, nullable=False),  # Sparse order of videos in playlist, see playlists.py
+    Column('added_at', DateTime(timezone=True), server_default=func.now()),
+    # Playlist pages are read in position order
+    Index('ix_playlist_videos_position', 'playlist_id', 'position')
 )
 
 class Playlist(Base):
@@ -98,3 +145,41 @@ class Playlist(Base):
 
     owner = relationship("User")
     videos = relationship("Video", secondary=playlist_videos, order_by=playlist_videos.c.position)
+
+class WatchHistory(Base):
+    """One row per playback session, written in batches by watch_history.py"""
+    __tablename__ = "watch_history"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    watched_at = Column(DateTime(timezone=True), primary_key=True)  # Session start; the partition key
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), nullable=False)
+    session_id = Column(String(64), nullable=False)
+    watch_duration = Column(Integer, nullable=False)  # Seconds actually watched
+    video_duration = Column(Integer, nullable=True)  # Total video duration at time of watch
+    completion_percentage = Column(Numeric(5, 2), nullable=True)  # 0.00 to 100.00
+    last_position = Column(Integer, nullable=True)
+    watch_source = Column(String(50), nullable=True)  # 'trending', 'search', 'channel', 'playlist', ...
+
+    __table_args__ = (
+        # Flushes upsert on this; it must include the partition key
+        UniqueConstraint("user_id", "video_id", "session_id", "watched_at", name="uq_watch_history_session"),
+        Index("ix_watch_history_user_watched", user_id, watched_at.desc()),
+        Index("ix_watch_history_video_watched", video_id, watched_at),
+        # Monthly partitions are created and dropped by watch_history.py
+        {"postgresql_partition_by": "RANGE (watched_at)"},
+    )
+
+class UserWatchRollup(Base):
+    """Per-user viewing counters by day (or all time) and dimension, maintained by watch_stats.py"""
+    __tablename__ = "user_watch_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(Date, primary_key=True)  # UTC day, or watch_stats.ALL_TIME_BUCKET
+    dimension = Column(String(16), primary_key=True)  # total, hour, creator, tag
+    item = Column(String, primary_key=True)  # '' for total, hour '00'-'23', creator id, tag
+    sessions = Column(Integer, nullable=False, default=0)
+    videos = Column(Integer, nullable=False, default=0)  # Distinct videos: per day, or ever for all time
+    seconds = Column(BigInteger, nullable=False, default=0)
+    completions = Column(Integer, nullable=False, default=0)
+    completion_sum = Column(Numeric(14, 2), nullable=False, default=0)  # Sum of completion percentages
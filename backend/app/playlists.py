@@ -0,0 +1,174 @@
+"""Playlist contents: sparse ordering, bulk edits and paged hydration.
+
+``playlist_videos.position`` values are spaced ``POSITION_GAP`` apart, so
+most edits write only the rows that actually change:
+
+- append: max(position) + gap
+- remove: delete the row; the rest keep their positions
+- move: place the moved rows evenly between their new neighbours
+
+Only when a move finds no integer room between two neighbours does the
+playlist get renumbered (one UPDATE). After that there is a full gap
+everywhere again.
+
+Edits lock the playlist row first, so concurrent adds/moves on the same
+playlist don't compute positions from the same snapshot.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from . import feeds, models
+
+POSITION_GAP = 1024
+MAX_BULK_VIDEOS = 500
+
+pv = models.playlist_videos
+
+APPEND_VIDEOS_SQL = text("""
+INSERT INTO playlist_videos (playlist_id, video_id, position)
+SELECT :playlist_id, v.id, :base + :gap * ids.ord
+FROM unnest(CAST(:video_ids AS integer[])) WITH ORDINALITY AS ids(video_id, ord)
+JOIN videos v ON v.id = ids.video_id
+ON CONFLICT (playlist_id, video_id) DO NOTHING
+RETURNING video_id
+""")
+
+RENUMBER_SQL = text("""
+UPDATE playlist_videos SET position = ordered.rn * :gap
+FROM (
+    SELECT video_id, row_number() OVER (ORDER BY position, added_at, video_id) AS rn
+    FROM playlist_videos WHERE playlist_id = :playlist_id
+) AS ordered
+WHERE playlist_videos.playlist_id = :playlist_id AND playlist_videos.video_id = ordered.video_id
+""")
+
+
+def _lock(db: Session, playlist_id: int):
+    db.execute(select(models.Playlist.id).where(models.Playlist.id == playlist_id).with_for_update())
+
+
+def video_counts(db: Session, playlist_ids: Iterable[int]) -> Dict[int, int]:
+    """playlist id -> number of entries, in one grouped query"""
+    playlist_ids = list(set(playlist_ids))
+    if not playlist_ids:
+        return {}
+    counts = dict(db.execute(
+        select(pv.c.playlist_id, func.count()).where(pv.c.playlist_id.in_(playlist_ids)).group_by(pv.c.playlist_id)
+    ).all())
+    return {playlist_id: counts.get(playlist_id, 0) for playlist_id in playlist_ids}
+
+
+def add_videos(db: Session, playlist_id: int, video_ids: List[int]) -> List[int]:
+    """Append video_ids in order, skipping unknown videos and ones already in the playlist.
+
+    Returns the ids actually added.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        return []
+    _lock(db, playlist_id)
+    base = db.query(func.max(pv.c.position)).filter(pv.c.playlist_id == playlist_id).scalar() or 0
+    added = {row.video_id for row in db.execute(APPEND_VIDEOS_SQL, {
+        "playlist_id": playlist_id, "video_ids": video_ids, "base": base, "gap": POSITION_GAP,
+    })}
+    db.commit()
+    return [video_id for video_id in video_ids if video_id in added]
+
+
+def remove_video(db: Session, playlist_id: int, video_id: int) -> bool:
+    result = db.execute(pv.delete().where(pv.c.playlist_id == playlist_id, pv.c.video_id == video_id))
+    db.commit()
+    return result.rowcount > 0
+
+
+def _neighbours(db: Session, playlist_id: int, moving: List[int], after_video_id: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    """Positions just before and after the insertion point, ignoring the rows being moved"""
+    others = [pv.c.playlist_id == playlist_id, pv.c.video_id.notin_(moving)]
+    if after_video_id is None:
+        low = None
+    else:
+        low = db.query(pv.c.position).filter(pv.c.playlist_id == playlist_id, pv.c.video_id == after_video_id).scalar()
+        if low is None:
+            raise ValueError("after_video_id is not in the playlist")
+    high_query = db.query(func.min(pv.c.position)).filter(*others)
+    if low is not None:
+        high_query = high_query.filter(pv.c.position > low)
+    return low, high_query.scalar()
+
+
+def move_videos(db: Session, playlist_id: int, video_ids: List[int], after_video_id: Optional[int]) -> int:
+    """Move video_ids (kept in the given order) to right after after_video_id, or to the top if None.
+
+    Raises ValueError if a video isn't in the playlist or after_video_id is one of the moved videos.
+    Returns how many rows were moved.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        return 0
+    if after_video_id in video_ids:
+        raise ValueError("after_video_id cannot be one of the moved videos")
+    _lock(db, playlist_id)
+    present = {row.video_id for row in db.query(pv.c.video_id).filter(
+        pv.c.playlist_id == playlist_id, pv.c.video_id.in_(video_ids)
+    )}
+    missing = [video_id for video_id in video_ids if video_id not in present]
+    if missing:
+        raise ValueError(f"Videos not in playlist: {missing}")
+
+    slots = len(video_ids) + 1
+    for _ in range(2):
+        low, high = _neighbours(db, playlist_id, video_ids, after_video_id)
+        if low is None and high is None:
+            low, high = 0, POSITION_GAP * slots
+        elif low is None:
+            low = high - POSITION_GAP * slots
+        elif high is None:
+            high = low + POSITION_GAP * slots
+        step = (high - low) // slots
+        if step >= 1:
+            break
+        # No room between the neighbours; spread the playlist out and try again
+        db.execute(RENUMBER_SQL, {"playlist_id": playlist_id, "gap": POSITION_GAP})
+
+    for index, video_id in enumerate(video_ids, start=1):
+        db.execute(pv.update().where(
+            pv.c.playlist_id == playlist_id, pv.c.video_id == video_id
+        ).values(position=low + step * index))
+    db.commit()
+    return len(video_ids)
+
+
+def card_page(db: Session, playlist_id: int, offset: int, limit: int) -> Tuple[list, int]:
+    """One page of completed videos as cards, in playlist order, plus the total number of completed videos.
+
+    The page and the total come from one query (the count is a window over the
+    same join), served by ix_playlist_videos_position.
+    """
+    rows = feeds.card_query(db).add_columns(func.count().over().label("total")).join(
+        pv, pv.c.video_id == models.Video.id
+    ).filter(
+        pv.c.playlist_id == playlist_id,
+        models.Video.processing_status == "completed"
+    ).order_by(pv.c.position, pv.c.added_at, pv.c.video_id).offset(offset).limit(limit).all()
+    if rows:
+        return [feeds.card(row) for row in rows], rows[0].total
+    if offset == 0:
+        return [], 0
+    # Past the end: the window count has nothing to ride on
+    total = db.query(func.count()).select_from(pv).join(models.Video, models.Video.id == pv.c.video_id).filter(
+        pv.c.playlist_id == playlist_id, models.Video.processing_status == "completed"
+    ).scalar()
+    return [], total
+
+
+def stream_videos(db: Session, playlist_id: int, offset: int, limit: int) -> list:
+    """(id, hls_path) of completed videos in playlist order, for splicing into one HLS stream"""
+    return db.query(models.Video.id, models.Video.hls_path).join(
+        pv, pv.c.video_id == models.Video.id
+    ).filter(
+        pv.c.playlist_id == playlist_id,
+        models.Video.processing_status == "completed",
+        models.Video.hls_path.isnot(None)
+    ).order_by(pv.c.position, pv.c.added_at, pv.c.video_id).offset(offset).limit(limit).all()
@@ -0,0 +1,117 @@
+"""Direct progressive (non-HLS) playback for external players.
+
+Players like VLC or Fire TV apps get a signed, expiring URL per rendition
+instead of a bearer token, and the file is served by the media layer with
+byte-range support, so seeking costs one small ranged request.
+
+Renditions:
+- ``original``: the uploaded file, while it is still on disk
+- ``faststart``: an MP4 remuxed from the HLS output with the moov atom up front,
+  so players can start and seek without reading the end of the file first.
+  It is built once, on first request, on the ingest pool. A Redis ``SET NX``
+  lock keeps other workers from starting the same build, and each build
+  writes its own tmp file before the atomic rename.
+"""
+import os
+import subprocess
+import threading
+import uuid
+from typing import Optional
+
+import redis
+
+from . import ingest, models, security
+from .redis_client import redis_client
+
+PROCESSED_DIR = "/app/processed_videos"
+RENDITIONS = ("original", "faststart")
+REMUX_TIMEOUT = 3600
+
+_building = set()
+_building_lock = threading.Lock()
+
+
+def faststart_path(video_id: int) -> str:
+    return os.path.join(PROCESSED_DIR, str(video_id), "faststart.mp4")
+
+
+def _hls_source(video: models.Video) -> Optional[str]:
+    if not video.hls_path or not video.hls_path.startswith("/processed/"):
+        return None
+    path = os.path.join(PROCESSED_DIR, video.hls_path[len("/processed/"):])
+    return path if os.path.exists(path) else None
+
+
+def rendition_path(video: models.Video, rendition: str) -> Optional[str]:
+    """Local path of a rendition if it exists on disk"""
+    if rendition == "original":
+        if video.file_path and os.path.exists(video.file_path):
+            return video.file_path
+        return None
+    path = faststart_path(video.id)
+    return path if os.path.exists(path) else None
+
+
+def _lock_key(video_id: int) -> str:
+    return f"progressive:building:{video_id}"
+
+
+def build_faststart(video_id: int, source_path: str) -> dict:
+    """Remux HLS output into a single faststart MP4 (no re-encode)"""
+    output_path = faststart_path(video_id)
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp.mp4"
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", source_path,
+        "-c", "copy",
+        "-bsf:a", "aac_adtstoasc",  # ADTS (MPEG-TS) -> MP4 AAC framing
+        "-movflags", "+faststart",
+        tmp_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=REMUX_TIMEOUT)
+        os.replace(tmp_path, output_path)  # Never expose a half-written file
+    except (subprocess.SubprocessError, OSError) as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"Faststart remux failed for video {video_id}: {e}")
+    finally:
+        with _building_lock:
+            _building.discard(video_id)
+        try:
+            redis_client.delete(_lock_key(video_id))
+        except redis.RedisError:
+            pass
+    return {"video_id": video_id, "size": os.path.getsize(output_path)}
+
+
+def ensure_faststart(video: models.Video) -> bool:
+    """Queue a faststart build if needed. Returns False if there is nothing to build from."""
+    source_path = _hls_source(video)
+    if source_path is None:
+        return False
+    with _building_lock:
+        if video.id in _building:
+            return True
+        _building.add(video.id)
+    try:
+        # Outlives the remux timeout, so the lock can't lapse while a build runs
+        claimed = redis_client.set(_lock_key(video.id), "1", nx=True, ex=REMUX_TIMEOUT + 60)
+    except redis.RedisError:
+        claimed = True  # No coordination available; the unique tmp name still keeps builds apart
+    if not claimed:
+        with _building_lock:
+            _building.discard(video.id)
+        return True  # Another worker is building it
+    ingest.submit_job("faststart", build_faststart, video.id, source_path)
+    return True
+
+
+def resource(video_id: int, rendition: str) -> str:
+    return f"/videos/{video_id}/file/{rendition}"
+
+
+def signed_url(video_id: int, rendition: str) -> dict:
+    path = resource(video_id, rendition)
+    expires, signature = security.sign_media_url(path)
+    return {"url": f"{path}?expires={expires}&sig={signature}", "expires": expires}
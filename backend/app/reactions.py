@@ -0,0 +1,89 @@
+"""Like/dislike toggling and counter reconciliation.
+
+A reaction toggle is a single SQL statement: the row change (insert, flip or
+delete) and the matching delta on ``videos.likes``/``videos.dislikes`` are
+computed in one CTE, relying on the unique index on ``(user_id, video_id)``.
+"""
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+TOGGLE_REACTION_SQL = text("""
+WITH target AS (
+    SELECT id FROM videos WHERE id = :video_id
+),
+prev AS (
+    SELECT is_like FROM video_likes WHERE user_id = :user_id AND video_id = :video_id
+),
+removed AS (
+    -- Clicking the same reaction again removes it
+    DELETE FROM video_likes
+    WHERE user_id = :user_id AND video_id = :video_id AND is_like = :is_like
+    RETURNING is_like
+),
+upserted AS (
+    -- Otherwise insert the reaction, or flip an existing opposite reaction
+    INSERT INTO video_likes (user_id, video_id, is_like)
+    SELECT :user_id, target.id, :is_like FROM target
+    WHERE NOT EXISTS (SELECT 1 FROM prev WHERE prev.is_like = :is_like)
+    ON CONFLICT (user_id, video_id) DO UPDATE SET is_like = EXCLUDED.is_like
+    WHERE video_likes.is_like IS DISTINCT FROM EXCLUDED.is_like
+    RETURNING (xmax = 0) AS inserted
+),
+delta AS (
+    SELECT
+        (SELECT count(*) FROM upserted) - (SELECT count(*) FROM removed) AS same_delta,
+        -(SELECT count(*) FROM upserted WHERE NOT inserted) AS other_delta,
+        (SELECT count(*) FROM removed) > 0 AS was_removed
+)
+UPDATE videos SET
+    likes = COALESCE(likes, 0) + CASE WHEN :is_like THEN delta.same_delta ELSE delta.other_delta END,
+    dislikes = COALESCE(dislikes, 0) + CASE WHEN :is_like THEN delta.other_delta ELSE delta.same_delta END
+FROM delta
+WHERE videos.id = :video_id
+RETURNING videos.likes, videos.dislikes, delta.was_removed
+""")
+
+RECONCILE_COUNTS_SQL = text("""
+UPDATE videos SET likes = counts.likes, dislikes = counts.dislikes
+FROM (
+    SELECT
+        v.id AS video_id,
+        count(vl.id) FILTER (WHERE vl.is_like) AS likes,
+        count(vl.id) FILTER (WHERE NOT vl.is_like) AS dislikes
+    FROM videos v
+    LEFT JOIN video_likes vl ON vl.video_id = v.id
+    GROUP BY v.id
+) AS counts
+WHERE videos.id = counts.video_id
+  AND (videos.likes IS DISTINCT FROM counts.likes OR videos.dislikes IS DISTINCT FROM counts.dislikes)
+""")
+
+
+def toggle_reaction(db: Session, user_id: int, video_id: int, is_like: bool) -> Optional[dict]:
+    """Toggle a like (is_like=True) or dislike (is_like=False) in one round trip.
+
+    Returns None if the video does not exist.
+    """
+    row = db.execute(TOGGLE_REACTION_SQL, {
+        "user_id": user_id,
+        "video_id": video_id,
+        "is_like": is_like,
+    }).first()
+    db.commit()
+    if row is None:
+        return None
+
+    if row.was_removed:
+        action = "removed"
+    else:
+        action = "liked" if is_like else "disliked"
+    return {"action": action, "likes": row.likes, "dislikes": row.dislikes}
+
+
+def reconcile_reaction_counts(db: Session) -> int:
+    """Recompute likes/dislikes counters from video_likes in bulk. Returns rows fixed."""
+    result = db.execute(RECONCILE_COUNTS_SQL)
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,13 @@
+import os
+
+import redis
+
+# Shared Redis connection (same instance the video processor uses for progress tracking)
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+redis_client = redis.Redis.from_url(
+    REDIS_URL,
+    decode_responses=True,
+    socket_timeout=2,
+    socket_connect_timeout=2,
+)
@@ -0,0 +1,266 @@
+"""Shared response cache for the public feed endpoints.
+
+``/videos``, ``/videos/count``, ``/videos/trending``, ``/videos/search`` and
+``/videos/popular-tags`` return the same JSON to every visitor. ``serve``
+caches their encoded bodies under a normalized key (route plus the handler's
+resolved parameters), in Redis for all workers with a small per-worker LRU in
+front, so a warm home page never reaches Postgres.
+
+- Entries are fresh for ``ttl`` seconds. After that they are served stale for
+  up to ``RESPONSE_CACHE_STALE`` more seconds while one background refresh
+  recomputes them (stale-while-revalidate). Past that, the caller recomputes,
+  single-flight per key.
+- Responses carry an ETag over the body, and a matching If-None-Match gets a 304.
+- Domain events (upload completed, video added/updated/deleted, import batch
+  committed) call ``invalidate``. That bumps a generation number which is part
+  of every key, and the new generation is broadcast over Redis pub/sub, so
+  every worker stops serving older entries at once.
+
+Results don't depend on who is asking, so logged-in requests share the same
+entries.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from . import singleflight
+from .database import SessionLocal
+from .redis_client import REDIS_URL, redis_client
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_STALE = int(os.getenv("RESPONSE_CACHE_STALE", "300"))
+RESPONSE_CACHE_LOCAL_ENTRIES = int(os.getenv("RESPONSE_CACHE_LOCAL_ENTRIES", "512"))
+CACHE_CONTROL = "public, max-age=5, stale-while-revalidate=30"
+GENERATION_KEY = "respcache:generation"
+CHANNEL = "respcache:invalidate"
+
+
+class Entry:
+    __slots__ = ("body", "etag", "created", "generation")
+
+    def __init__(self, body: bytes, etag: str, created: float, generation: int):
+        self.body = body
+        self.etag = etag
+        self.created = created
+        self.generation = generation
+
+
+_lock = threading.Lock()
+_local: "OrderedDict[str, Entry]" = OrderedDict()
+_generation: Optional[int] = None
+_refreshing = set()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "not_modified": 0, "refreshes": 0, "invalidations": 0}
+
+_flight = singleflight.group("response_cache")
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="response-cache")
+
+
+def _count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def current_generation() -> int:
+    global _generation
+    if _generation is None:
+        try:
+            _generation = int(redis_client.get(GENERATION_KEY) or 0)
+        except redis.RedisError:
+            _generation = 0
+    return _generation
+
+
+def cache_key(route: str, params: Dict[str, Any]) -> str:
+    return f"{route}?{urlencode(sorted((k, v) for k, v in params.items() if v is not None))}"
+
+
+def normalize_query(q: str) -> str:
+    """Search text as it is keyed and matched: ilike ignores case, and stray whitespace changes nothing"""
+    return " ".join(q.split()).lower()
+
+
+def _redis_key(generation: int, key: str) -> str:
+    return f"respcache:{generation}:{key}"
+
+
+def _remember(key: str, entry: Entry):
+    with _lock:
+        _local[key] = entry
+        _local.move_to_end(key)
+        while len(_local) > RESPONSE_CACHE_LOCAL_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _lookup(key: str, generation: int) -> Optional[Entry]:
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None and entry.generation == generation:
+            _local.move_to_end(key)
+            return entry
+    try:
+        data = redis_client.hgetall(_redis_key(generation, key))
+    except redis.RedisError:
+        return None
+    if not data:
+        return None
+    entry = Entry(data["body"].encode("utf-8"), data["etag"], float(data["created"]), generation)
+    _remember(key, entry)
+    return entry
+
+
+def _compute(key: str, generation: int, ttl: int, compute: Callable[[Session], Any], db: Optional[Session]) -> Entry:
+    # A caller that waited on the flight may find another worker already stored it
+    entry = _lookup(key, generation)
+    if entry is not None and time.time() - entry.created < ttl:
+        return entry
+
+    if db is None:
+        own = SessionLocal()
+        try:
+            data = compute(own)
+        finally:
+            own.close()
+    else:
+        data = compute(db)
+    body = orjson.dumps(data)
+    entry = Entry(body, f'"{hashlib.sha1(body).hexdigest()[:20]}"', time.time(), generation)
+    _count("refreshes")
+
+    try:
+        redis_client.hset(_redis_key(generation, key), mapping={
+            "body": body.decode("utf-8"), "etag": entry.etag, "created": entry.created,
+        })
+        redis_client.expire(_redis_key(generation, key), ttl + RESPONSE_CACHE_STALE)
+    except redis.RedisError:
+        pass
+    _remember(key, entry)
+    return entry
+
+
+def _refresh_in_background(key: str, generation: int, ttl: int, compute: Callable[[Session], Any]):
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _flight.do(key, _compute, key, generation, ttl, compute, None, distributed=True)
+        except Exception as e:
+            print(f"Response cache refresh failed for {key}: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    _refresh_executor.submit(run)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # The compression middleware weakens ETags on compressed bodies
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def serve(
+    request: Request,
+    db: Session,
+    route: str,
+    params: Dict[str, Any],
+    compute: Callable[[Session], Any],
+    ttl: int = RESPONSE_CACHE_TTL,
+    echo: Optional[Dict[str, Any]] = None,
+) -> Response:
+    """Return compute(db)'s JSON for (route, params), cached as described above.
+
+    ``echo`` fields are merged into the cached JSON object per request (and into its ETag),
+    for values like the query as typed that shouldn't split the entry.
+    """
+    key = cache_key(route, params)
+    generation = current_generation()
+    entry = _lookup(key, generation)
+    age = time.time() - entry.created if entry is not None else None
+
+    if entry is None or age >= ttl + RESPONSE_CACHE_STALE:
+        _count("misses")
+        status = "MISS"
+        entry = _flight.do(key, _compute, key, generation, ttl, compute, db, distributed=True)
+    elif age >= ttl:
+        _count("stale_hits")
+        status = "STALE"
+        _refresh_in_background(key, generation, ttl, compute)
+    else:
+        _count("hits")
+        status = "HIT"
+
+    body, etag = entry.body, entry.etag
+    if echo:
+        body = orjson.dumps({**orjson.loads(body), **echo})
+        etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "X-Cache": status}
+    if _not_modified(request, etag):
+        _count("not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def invalidate(event: str):
+    """A domain event changed what the feeds show; drop every cached response everywhere"""
+    try:
+        generation = int(redis_client.incr(GENERATION_KEY))
+        redis_client.publish(CHANNEL, f"{generation}:{event}")
+    except redis.RedisError:
+        generation = current_generation() + 1
+    _apply_generation(generation)
+    _count("invalidations")
+
+
+def _apply_generation(generation: int):
+    global _generation
+    with _lock:
+        if _generation is None or generation > _generation:
+            _generation = generation
+            _local.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        result = dict(_stats)
+        result["local_entries"] = len(_local)
+    result["generation"] = _generation
+    served = result["hits"] + result["stale_hits"] + result["misses"]
+    result["hit_ratio"] = round((result["hits"] + result["stale_hits"]) / served, 4) if served else 0.0
+    return result
+
+
+async def listen():
+    """Follow invalidations published by other workers"""
+    while True:
+        try:
+            client = aioredis.from_url(REDIS_URL, decode_responses=True)
+            pubsub = client.pubsub()
+            await pubsub.subscribe(CHANNEL)
+            # Catch up on anything published while we were disconnected
+            _apply_generation(int(await client.get(GENERATION_KEY) or 0))
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _apply_generation(int(message["data"].split(":", 1)[0]))
+        except Exception as e:
+            print(f"Response cache listener error, reconnecting: {e}")
+            await asyncio.sleep(2)
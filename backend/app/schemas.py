@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class UserBase(BaseModel):
     username: str
@@ -9,6 +9,9 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+# Derivative map: size name -> {"width": int, "webp": url, "jpeg": url, ("avif": url)}
+Srcset = Dict[str, Dict[str, object]]
+
 class User(UserBase):
     id: int
     is_active: bool = True
@@ -16,6 +19,8 @@ class User(UserBase):
     channel_description: Optional[str] = None
     avatar_url: Optional[str] = None
     banner_url: Optional[str] = None
+    avatar_srcset: Optional[Srcset] = None
+    banner_srcset: Optional[Srcset] = None
 
     class Config:
         from_attributes = True
@@ -27,6 +32,8 @@ class UserProfile(BaseModel):
     channel_description: Optional[str] = None
     avatar_url: Optional[str] = None
     banner_url: Optional[str] = None
+    avatar_srcset: Optional[Srcset] = None
+    banner_srcset: Optional[Srcset] = None
     subscriber_count: int = 0
     video_count: int = 0
 
@@ -46,12 +53,16 @@ class Video(VideoBase):
     file_path: Optional[str] = None  # Nullable for live streams and YouTube videos
     stream_url: Optional[str] = None
     is_live_stream: Optional[bool] = False
+    live_low_latency: Optional[bool] = False
     youtube_url: Optional[str] = None
     thumbnail_path: Optional[str] = None
+    thumbnail_srcset: Optional[Srcset] = None
+    thumbnail_placeholder: Optional[str] = None  # Tiny inline data URI for blur-up
     hls_path: Optional[str] = None
     duration: Optional[int] = None
     processing_status: Optional[str] = "uploading"
     views: int = 0
+    unique_viewers: Optional[int] = 0
     likes: int = 0
     dislikes: int = 0
     tags: Optional[List[str]] = []
@@ -62,6 +73,38 @@ class Video(VideoBase):
     class Config:
         from_attributes = True
 
+class OwnerCard(BaseModel):
+    id: int
+    username: str
+    channel_name: Optional[str] = None
+
+class VideoCard(BaseModel):
+    """What list endpoints return per video (see feeds.py); fetch /videos/{id} for the rest"""
+    id: int
+    title: str
+    thumbnail_path: Optional[str] = None
+    thumbnail_srcset: Optional[Srcset] = None
+    thumbnail_placeholder: Optional[str] = None
+    duration: Optional[int] = None
+    views: int = 0
+    upload_date: datetime
+    processing_status: Optional[str] = None
+    is_live_stream: bool = False
+    tags: List[str] = []
+    owner_id: int
+    owner: Optional[OwnerCard] = None
+
+class ViewerStateRequest(BaseModel):
+    video_ids: List[int]
+
+class VideoViewerState(BaseModel):
+    video_id: int
+    owner_id: int
+    processing_status: Optional[str] = None
+    like_status: str = "none"  # liked, disliked, none
+    is_subscribed: bool = False
+    playlist_ids: List[int] = []
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -99,7 +142,27 @@ class Playlist(PlaylistBase):
         from_attributes = True
 
 class PlaylistWithVideos(Playlist):
-    videos: List[Video] = []
+    """A page of the playlist's videos; video_count is the total across all pages"""
+    videos: List[VideoCard] = []
 
     class Config:
         from_attributes = True
+
+class PlaylistVideosAdd(BaseModel):
+    video_ids: List[int]
+
+class PlaylistVideosMove(BaseModel):
+    video_ids: List[int]
+    after_video_id: Optional[int] = None  # None moves them to the top
+
+class WatchHeartbeat(BaseModel):
+    video_id: int
+    session_id: str = Field(min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")  # One per playback
+    position: int = Field(ge=0)  # Seconds into the video
+    watched: int = Field(ge=0)  # Seconds actually watched so far in this session
+    video_duration: Optional[int] = None
+    source: Optional[str] = Field(default=None, max_length=50)
+    ended: bool = False
+
+class WatchEventBatch(BaseModel):
+    events: List[WatchHeartbeat]
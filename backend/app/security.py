@@ -1,3 +1,9 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -9,6 +15,15 @@ SECRET_KEY = "your-secret-key" # TODO: Change this to a strong, random key from
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43200  # 30 days (30 * 24 * 60 = 43200 minutes)
 
+# Signed media URLs for external players that can't send a bearer token
+MEDIA_URL_TTL = 24 * 3600
+MEDIA_URL_BUCKET = 3600  # Expiry is rounded up so repeated requests get the same (cacheable) URL
+
+# bcrypt is deliberately slow (~100ms+); it gets its own small pool so a burst of
+# logins can't occupy the request threadpool (and its DB connections)
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
 def verify_password(plain_password, hashed_password):
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
@@ -16,6 +31,14 @@ def get_password_hash(password):
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_executor, verify_password, plain_password, hashed_password
+    )
+
+async def get_password_hash_async(password) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -26,9 +49,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user, expires_delta: Optional[timedelta] = None):
+    """Token for a user: username, stable id and token version (see auth_cache)"""
+    return create_access_token(
+        data={"sub": user.username, "uid": user.id, "ver": user.token_version or 0},
+        expires_delta=expires_delta,
+    )
+
 def decode_access_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         return None
+
+def _media_signature(resource: str, expires: int) -> str:
+    message = f"{resource}:{expires}".encode("utf-8")
+    return hmac.new(SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+def sign_media_url(resource: str, ttl: int = MEDIA_URL_TTL):
+    """Return (expires, signature) for a media resource path"""
+    expires = int(time.time()) + ttl
+    expires += -expires % MEDIA_URL_BUCKET
+    return expires, _media_signature(resource, expires)
+
+def verify_media_signature(resource: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_media_signature(resource, expires), signature)
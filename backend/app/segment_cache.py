@@ -0,0 +1,206 @@
+"""In-memory hot object cache for processed HLS files.
+
+Popular videos' playlists and opening segments are requested over and over;
+on SD-card/USB storage every one of those is a random read. This keeps a
+bounded (``SEGMENT_CACHE_MB``) LRU of small objects in process memory and
+serves hits without touching the disk at all.
+
+Admission is selective so one long binge can't flush the hot set: finished
+playlists and the first ``SEGMENT_CACHE_FIRST_SEGMENTS`` segments of a video
+are admitted straight away, anything else only once it has been missed twice.
+Entries are dropped explicitly on reprocess/delete, and a periodic sweep
+re-stats cached files to catch anything rewritten behind our back.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Iterable, List, Optional
+
+from . import media
+
+SEGMENT_CACHE_MB = int(os.getenv("SEGMENT_CACHE_MB", "64"))
+MAX_OBJECT_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_OBJECT_KB", "4096")) * 1024
+FIRST_SEGMENTS = int(os.getenv("SEGMENT_CACHE_FIRST_SEGMENTS", "3"))
+MISS_HISTORY = 4096  # Paths remembered for second-hit admission
+
+PROCESSED_DIR = "/app/processed_videos"
+_SEGMENT_INDEX = re.compile(r"_(\d+)\.ts$")
+
+
+class CachedFile:
+    __slots__ = ("body", "etag", "last_modified", "mtime_ns", "media_type")
+
+    def __init__(self, body: bytes, stat: os.stat_result, media_type: str):
+        self.body = body
+        self.etag = media.etag_for(stat)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.mtime_ns = stat.st_mtime_ns
+        self.media_type = media_type
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+_misses: "OrderedDict[str, None]" = OrderedDict()
+_size = 0
+_stats = {"hits": 0, "misses": 0, "admissions": 0, "evictions": 0, "invalidations": 0}
+
+
+def _capacity() -> int:
+    return SEGMENT_CACHE_MB * 1024 * 1024
+
+
+def get(path: str) -> Optional[CachedFile]:
+    with _lock:
+        entry = _entries.get(path)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(path)
+        _stats["hits"] += 1
+        return entry
+
+
+def _is_opening_object(path: str) -> bool:
+    if path.endswith(".m3u8"):
+        return True
+    match = _SEGMENT_INDEX.search(path)
+    return bool(match) and int(match.group(1)) < FIRST_SEGMENTS
+
+
+def _store(path: str, entry: CachedFile):
+    global _size
+    with _lock:
+        previous = _entries.pop(path, None)
+        if previous is not None:
+            _size -= len(previous.body)
+        _entries[path] = entry
+        _size += len(entry.body)
+        _stats["admissions"] += 1
+        while _size > _capacity() and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _size -= len(evicted.body)
+            _stats["evictions"] += 1
+
+
+def _load(path: str) -> Optional[CachedFile]:
+    try:
+        stat = os.stat(path)
+        if stat.st_size > MAX_OBJECT_BYTES:
+            return None
+        # In-progress playlists change every few seconds; only cache finished ones
+        if path.endswith(".m3u8") and not media.playlist_finished(path, stat):
+            return None
+        with open(path, "rb") as f:
+            body = f.read()
+    except OSError:
+        return None
+    if len(body) != stat.st_size:
+        return None  # Being rewritten
+    return CachedFile(body, stat, media.media_type_for(path))
+
+
+def admit(path: str):
+    """Called after a miss was served from disk; caches the file if it qualifies"""
+    if not _is_opening_object(path):
+        with _lock:
+            if path not in _misses:
+                _misses[path] = None
+                if len(_misses) > MISS_HISTORY:
+                    _misses.popitem(last=False)
+                return
+            del _misses[path]
+    entry = _load(path)
+    if entry is not None:
+        _store(path, entry)
+
+
+def invalidate_video(video_id: int) -> int:
+    """Drop every cached file of a video (reprocess, delete)"""
+    global _size
+    prefix = os.path.join(PROCESSED_DIR, str(video_id)) + os.sep
+    with _lock:
+        paths = [path for path in _entries if path.startswith(prefix)]
+        for path in paths:
+            _size -= len(_entries.pop(path).body)
+        _stats["invalidations"] += len(paths)
+    return len(paths)
+
+
+def invalidate_videos(video_ids: Iterable[int]):
+    for video_id in video_ids:
+        invalidate_video(video_id)
+
+
+def revalidate() -> int:
+    """Drop entries whose file changed or disappeared since it was cached"""
+    global _size
+    with _lock:
+        snapshot = [(path, entry.mtime_ns) for path, entry in _entries.items()]
+    stale = []
+    for path, mtime_ns in snapshot:
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                stale.append(path)
+        except OSError:
+            stale.append(path)
+    with _lock:
+        for path in stale:
+            entry = _entries.pop(path, None)
+            if entry is not None:
+                _size -= len(entry.body)
+                _stats["invalidations"] += 1
+    return len(stale)
+
+
+def _playlist_segments(playlist_path: str) -> List[str]:
+    try:
+        with open(playlist_path, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    directory = os.path.dirname(playlist_path)
+    return [
+        os.path.join(directory, line.strip())
+        for line in lines
+        if line.strip() and not line.startswith("#")
+    ]
+
+
+def first_segment_url(hls_path: str) -> Optional[str]:
+    """Public URL of a processed video's first segment, for players to preload"""
+    if not hls_path or not hls_path.startswith("/processed/"):
+        return None
+    segments = _playlist_segments(os.path.join(PROCESSED_DIR, hls_path[len("/processed/"):]))
+    if not segments:
+        return None
+    return "/processed/" + os.path.relpath(segments[0], PROCESSED_DIR)
+
+
+def warm_video(video_id: int, hls_path: str) -> int:
+    """Load a video's playlist and opening segments into the cache. Returns objects loaded."""
+    if not hls_path or not hls_path.startswith("/processed/"):
+        return 0
+    playlist_path = os.path.join(PROCESSED_DIR, hls_path[len("/processed/"):])
+    loaded = 0
+    for path in [playlist_path] + _playlist_segments(playlist_path)[:FIRST_SEGMENTS]:
+        with _lock:
+            if path in _entries:
+                continue
+        entry = _load(path)
+        if entry is not None:
+            _store(path, entry)
+            loaded += 1
+    return loaded
+
+
+def stats() -> dict:
+    with _lock:
+        result = dict(_stats)
+        result["entries"] = len(_entries)
+    result["bytes"] = _size
+    result["capacity_bytes"] = _capacity()
+    lookups = result["hits"] + result["misses"]
+    result["hit_ratio"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    return result
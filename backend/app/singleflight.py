@@ -0,0 +1,203 @@
+"""Single-flight request coalescing.
+
+When several callers ask for the same expensive thing at once (a cold cache
+entry, a stream that isn't running yet, derivatives of one image), only the
+first one does the work; the rest wait for it and share its result or
+exception. Each ``Group`` works for threads (``do``) and for coroutines on the
+event loop (``do_async``).
+
+``distributed=True`` additionally takes a short Redis lock, so only one
+process in the cluster runs the work at a time. Callers in other processes
+then run it after the lock is released, so ``fn`` should be cheap the second
+time round (content-addressed output, a cache checked first, ...).
+
+``Group.cached`` adds a small TTL cache on top: a miss is recomputed once no
+matter how many requests hit it. The cache is an LRU of at most
+``CACHE_MAX_ENTRIES`` keys per group.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis
+
+from .redis_client import redis_client
+
+LOCK_TTL_MS = 60000
+LOCK_POLL_INTERVAL = 0.05
+CACHE_MAX_ENTRIES = 1024
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_groups: Dict[str, "Group"] = {}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0, "cache_hits": 0}
+        _groups[name] = self
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    # --- Distributed lock ---------------------------------------------------
+
+    def _acquire(self, key: str) -> str:
+        """Block until we hold the Redis lock for key; returns the token ("" if Redis is down)"""
+        token = uuid.uuid4().hex
+        lock_key = f"singleflight:{self.name}:{key}"
+        deadline = time.monotonic() + LOCK_TTL_MS / 1000
+        while True:
+            try:
+                if redis_client.set(lock_key, token, nx=True, px=LOCK_TTL_MS):
+                    return token
+            except redis.RedisError:
+                return ""  # Fall back to in-process coalescing only
+            if time.monotonic() > deadline:
+                return ""
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def _release(self, key: str, token: str):
+        if not token:
+            return
+        try:
+            redis_client.eval(_RELEASE_SCRIPT, 1, f"singleflight:{self.name}:{key}", token)
+        except redis.RedisError:
+            pass
+
+    def _execute(self, key: str, fn: Callable, args: tuple, distributed: bool):
+        self._count("executions")
+        token = self._acquire(key) if distributed else ""
+        try:
+            return fn(*args)
+        finally:
+            self._release(key, token)
+
+    # --- Threads ------------------------------------------------------------
+
+    def do(self, key: str, fn: Callable, *args: Any, distributed: bool = False) -> Any:
+        """Run fn(*args) once per key among concurrent callers and share the outcome"""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = self._execute(key, fn, args, distributed)
+            except BaseException as e:
+                call.error = e
+                self._count("errors")
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    # --- Event loop ---------------------------------------------------------
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Coroutine variant: concurrent awaiters of the same key share one fn() run"""
+        self.stats["calls"] += 1
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            # shield: a cancelled follower must not cancel the leader's work
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        self.stats["executions"] += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+        finally:
+            self._async_calls.pop(key, None)
+        # Retrieving the outcome here also marks a failure as seen when nobody else waited
+        return future.result()
+
+    # --- Cached recomputation -----------------------------------------------
+
+    def _cached_value(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return False, None
+            self._cache.move_to_end(key)
+            return True, entry[1]
+
+    def cached(self, key: str, ttl: float, fn: Callable, *args: Any) -> Any:
+        """Return a cached fn(*args) result, recomputing it single-flight once it expires"""
+        hit, value = self._cached_value(key)
+        if hit:
+            self._count("cache_hits")
+            return value
+
+        def compute():
+            # A caller that waited on the lock may find the entry already refreshed
+            hit, value = self._cached_value(key)
+            if hit:
+                return value
+            value = fn(*args)
+            with self._lock:
+                self._cache[key] = (time.monotonic() + ttl, value)
+                self._cache.move_to_end(key)
+                while len(self._cache) > CACHE_MAX_ENTRIES:
+                    self._cache.popitem(last=False)
+            return value
+
+        return self.do(key, compute)
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+
+def group(name: str) -> Group:
+    """Get or create the named coalescing group"""
+    return _groups.get(name) or Group(name)
+
+
+def all_stats() -> Dict[str, dict]:
+    return {name: dict(g.stats) for name, g in _groups.items()}
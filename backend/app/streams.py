@@ -0,0 +1,385 @@
+"""Live stream supervisor (RTSP -> HLS).
+
+Exactly one ffmpeg runs per live stream across all backend workers:
+
+- Ownership is a Redis key (``stream:owner:{id}``) claimed with ``SET NX`` and
+  renewed by the owning worker's supervisor loop. If that worker dies the key
+  expires and the next viewer request lets another worker take over.
+- Viewers are counted by heartbeat: each playlist request refreshes the viewer
+  in a sorted set (``stream:viewers:{id}``) scored by time, and the stream is
+  stopped once nobody has heartbeated for ``STREAM_IDLE_TIMEOUT``.
+- ffmpeg is an asyncio subprocess watched by a monitor task, which restarts it
+  with backoff if it exits while viewers remain. Nothing blocks the event loop.
+- Per-stream health (owner, pid, state, restarts, last exit code) is published
+  to ``stream:health:{id}`` so any worker can report it.
+- Readiness is driven by ffmpeg's own output (it logs each file it opens)
+  rather than by polling for the playlist.
+
+Streams flagged ``live_low_latency`` run in LL-HLS mode instead (see llhls.py).
+
+Stream files live in a directory shared by all workers; only the owner ever
+clears or writes it. If Redis is unreachable the worker behaves as the owner,
+which matches the single-worker setup.
+"""
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import redis
+
+from . import llhls, singleflight
+from .redis_client import redis_client
+
+STREAMS_DIR = "/app/streams"
+OWNER_TTL = 15  # Seconds; renewed every SUPERVISOR_INTERVAL by the owner
+SUPERVISOR_INTERVAL = 5
+VIEWER_TTL = 30  # A viewer counts as watching for this long after its last playlist request
+STREAM_IDLE_TIMEOUT = 60  # Stop a stream after this long with no viewers
+MAX_RESTART_BACKOFF = 30
+PLAYLIST_WAIT_TIMEOUT = 10  # Seconds a cold start may take before we give up
+
+WORKER_ID = uuid.uuid4().hex
+
+# Concurrent first viewers of a stream share one claim/start attempt
+_start_flight = singleflight.group("stream_start")
+
+# Only the owner extends or releases its claim
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def stream_dir(video_id: int) -> str:
+    return os.path.join(STREAMS_DIR, str(video_id))
+
+
+def playlist_path(video_id: int) -> str:
+    return os.path.join(stream_dir(video_id), "playlist.m3u8")
+
+
+def _owner_key(video_id: int) -> str:
+    return f"stream:owner:{video_id}"
+
+
+def _viewers_key(video_id: int) -> str:
+    return f"stream:viewers:{video_id}"
+
+
+def _health_key(video_id: int) -> str:
+    return f"stream:health:{video_id}"
+
+
+def ffmpeg_command(stream_url: str, video_id: int) -> List[str]:
+    directory = stream_dir(video_id)
+    return [
+        "ffmpeg", "-nostats",  # No progress lines; stderr is parsed for readiness
+        "-rtsp_transport", "tcp",  # Use TCP for more reliable RTSP
+        "-i", stream_url,
+        "-c:v", "copy",  # Copy video codec (no re-encoding for speed)
+        "-c:a", "aac",   # Convert audio to AAC
+        "-f", "hls",
+        "-hls_time", "2",  # 2 second segments
+        "-hls_list_size", "3",  # Keep last 3 segments (lower latency)
+        "-hls_flags", "delete_segments+append_list+program_date_time",
+        "-hls_segment_filename", os.path.join(directory, "segment_%d.ts"),
+        "-hls_start_number_source", "epoch",  # Use epoch for segment numbering
+        playlist_path(video_id)
+    ]
+
+
+class SupervisedStream:
+    """An ffmpeg process owned by this worker"""
+
+    def __init__(self, video_id: int, stream_url: str, low_latency: bool = False):
+        self.video_id = video_id
+        self.stream_url = stream_url
+        self.low_latency = low_latency
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.monitor: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+        self.stopping = False
+        self.restarts = 0
+        self.run = 0  # LL-HLS file prefix of the current ffmpeg
+        self.started_at = time.time()
+        self.idle_since: Optional[float] = None
+
+
+class StreamSupervisor:
+    def __init__(self):
+        self.streams: Dict[int, SupervisedStream] = {}
+
+    # --- Redis coordination -------------------------------------------------
+
+    def _claim(self, video_id: int) -> bool:
+        try:
+            return bool(redis_client.set(_owner_key(video_id), WORKER_ID, nx=True, ex=OWNER_TTL))
+        except redis.RedisError as e:
+            print(f"Redis unavailable claiming stream {video_id}, running locally: {e}")
+            return True
+
+    def _renew(self, video_id: int) -> bool:
+        try:
+            return bool(redis_client.eval(_RENEW_SCRIPT, 1, _owner_key(video_id), WORKER_ID, OWNER_TTL))
+        except redis.RedisError:
+            return True  # Keep running; we can't tell whether anyone else took over
+
+    def _release(self, video_id: int):
+        try:
+            redis_client.eval(_RELEASE_SCRIPT, 1, _owner_key(video_id), WORKER_ID)
+        except redis.RedisError:
+            pass
+
+    def _publish_health(self, stream: SupervisedStream, state: str, **extra):
+        health = {
+            "owner": WORKER_ID,
+            "state": state,
+            "pid": stream.process.pid if stream.process else "",
+            "started_at": stream.started_at,
+            "restarts": stream.restarts,
+            "updated_at": time.time(),
+        }
+        health.update(extra)
+        try:
+            redis_client.hset(_health_key(stream.video_id), mapping=health)
+            redis_client.expire(_health_key(stream.video_id), OWNER_TTL * 4)
+        except redis.RedisError:
+            pass
+
+    def heartbeat(self, video_id: int, viewer: str):
+        """Record that a viewer is still watching"""
+        try:
+            now = time.time()
+            pipe = redis_client.pipeline()
+            pipe.zadd(_viewers_key(video_id), {viewer: now})
+            pipe.zremrangebyscore(_viewers_key(video_id), 0, now - VIEWER_TTL)
+            pipe.expire(_viewers_key(video_id), VIEWER_TTL * 2)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+        stream = self.streams.get(video_id)
+        if stream:
+            stream.idle_since = None
+
+    def viewer_count(self, video_id: int) -> Optional[int]:
+        try:
+            return redis_client.zcount(_viewers_key(video_id), time.time() - VIEWER_TTL, "+inf")
+        except redis.RedisError:
+            return None
+
+    # --- Process management -------------------------------------------------
+
+    async def _spawn(self, stream: SupervisedStream):
+        if stream.low_latency:
+            # Each run writes under its own prefix so restarts never reuse file names
+            stream.run = llhls.next_run()
+            command = llhls.ffmpeg_command(stream.stream_url, stream_dir(stream.video_id), stream.run)
+        else:
+            command = ffmpeg_command(stream.stream_url, stream.video_id)
+        stream.process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        asyncio.create_task(self._read_output(stream, stream.process))
+        self._publish_health(stream, "running")
+
+    async def _read_output(self, stream: SupervisedStream, process: asyncio.subprocess.Process):
+        """Drain ffmpeg's log and turn "Opening '...' for writing" lines into readiness events"""
+        directory = stream_dir(stream.video_id)
+        async for raw_line in process.stderr:
+            line = raw_line.decode("utf-8", "replace")
+            if "for writing" not in line:
+                continue
+            if stream.low_latency:
+                if llhls.is_part_opened(line):
+                    # The previous part is complete; pick it up from ffmpeg's playlist
+                    await llhls.refresh(stream.video_id, directory)
+            elif "playlist.m3u8" in line:
+                stream.ready.set()
+
+    async def _monitor(self, stream: SupervisedStream):
+        """Wait on ffmpeg and restart it with backoff if it exits unexpectedly"""
+        backoff = 1
+        while not stream.stopping:
+            spawned_at = time.monotonic()
+            return_code = await stream.process.wait()
+            if stream.stopping:
+                break
+            if time.monotonic() - spawned_at > MAX_RESTART_BACKOFF:
+                backoff = 1  # It ran fine for a while, so this isn't a crash loop
+            stream.restarts += 1
+            print(f"ffmpeg for stream {stream.video_id} exited with {return_code}, restarting in {backoff}s")
+            self._publish_health(stream, "restarting", last_exit_code=return_code)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+            if stream.stopping:
+                break
+            try:
+                await self._spawn(stream)
+            except OSError as e:
+                print(f"Failed to restart ffmpeg for stream {stream.video_id}: {e}")
+
+    async def _start(self, video_id: int, stream_url: str, low_latency: bool) -> SupervisedStream:
+        # Only the owner clears the directory, so other workers never wipe a running stream
+        directory = stream_dir(video_id)
+        if os.path.isdir(directory):
+            await asyncio.to_thread(
+                lambda: [os.remove(os.path.join(directory, f)) for f in os.listdir(directory)
+                         if os.path.isfile(os.path.join(directory, f))]
+            )
+        os.makedirs(directory, exist_ok=True)
+
+        stream = SupervisedStream(video_id, stream_url, low_latency)
+        if low_latency:
+            llhls.claim(video_id)
+        print(f"Starting stream for video {video_id} on worker {WORKER_ID[:8]}")
+        self._publish_health(stream, "starting")
+        await self._spawn(stream)
+        stream.monitor = asyncio.create_task(self._monitor(stream))
+        self.streams[video_id] = stream
+        return stream
+
+    async def stop(self, video_id: int, reason: str = "idle", owned: bool = True):
+        """Stop our ffmpeg. With owned=False another worker has already taken the stream over,
+        so its directory, health and claim are left alone."""
+        stream = self.streams.pop(video_id, None)
+        if stream is None:
+            return
+        stream.stopping = True
+        if stream.process and stream.process.returncode is None:
+            stream.process.terminate()
+            try:
+                await asyncio.wait_for(stream.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                stream.process.kill()
+                await stream.process.wait()
+        if stream.monitor:
+            stream.monitor.cancel()
+        llhls.forget(video_id, owned)
+        if owned:
+            self._publish_health(stream, "stopped", reason=reason)
+            # Remove files before releasing, so a new owner never has its fresh directory deleted
+            await asyncio.to_thread(shutil.rmtree, stream_dir(video_id), True)
+            self._release(video_id)
+        print(f"Stopped stream for video {video_id} ({reason})")
+
+    async def ensure_stream(self, video_id: int, stream_url: str, low_latency: bool = False) -> bool:
+        """Make sure some worker runs this stream, starting it here if nobody owns it.
+
+        Returns True once the playlist is ready to serve.
+        """
+        if video_id not in self.streams:
+            started = await _start_flight.do_async(
+                str(video_id), lambda: self._claim_and_start(video_id, stream_url, low_latency)
+            )
+            if not started:
+                return False
+        if low_latency:
+            return await llhls.wait_for(video_id, timeout=PLAYLIST_WAIT_TIMEOUT)
+        return await self.wait_for_playlist(video_id)
+
+    async def _claim_and_start(self, video_id: int, stream_url: str, low_latency: bool) -> bool:
+        if video_id in self.streams or not await asyncio.to_thread(self._claim, video_id):
+            return True  # Already running here, or another worker owns it
+        try:
+            await self._start(video_id, stream_url, low_latency)
+        except OSError as e:
+            print(f"Failed to start ffmpeg for stream {video_id}: {e}")
+            llhls.forget(video_id)
+            self._release(video_id)
+            return False
+        return True
+
+    async def wait_for_playlist(self, video_id: int) -> bool:
+        path = playlist_path(video_id)
+        stream = self.streams.get(video_id)
+        if stream is not None and not os.path.exists(path):
+            # Our own ffmpeg: wait for it to report the playlist instead of polling
+            try:
+                await asyncio.wait_for(stream.ready.wait(), PLAYLIST_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return False
+        # ffmpeg logs the open just before the rename; another worker's stream we can only poll
+        deadline = time.monotonic() + PLAYLIST_WAIT_TIMEOUT
+        while not os.path.exists(path):
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.02 if stream is not None else 0.1)
+        return True
+
+    # --- Supervisor loop ----------------------------------------------------
+
+    async def supervise_once(self):
+        now = time.time()
+        for video_id, stream in list(self.streams.items()):
+            if not await asyncio.to_thread(self._renew, video_id):
+                # Our claim lapsed and another worker took over; step aside
+                await self.stop(video_id, reason="ownership lost", owned=False)
+                continue
+            viewers = await asyncio.to_thread(self.viewer_count, video_id)
+            if viewers == 0:
+                stream.idle_since = stream.idle_since or now
+                if now - stream.idle_since >= STREAM_IDLE_TIMEOUT:
+                    await self.stop(video_id)
+                    continue
+            else:
+                stream.idle_since = None
+            state = "running" if stream.process and stream.process.returncode is None else "restarting"
+            self._publish_health(stream, state, viewers=viewers if viewers is not None else "")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(SUPERVISOR_INTERVAL)
+            try:
+                await self.supervise_once()
+            except Exception as e:
+                print(f"Error in stream supervisor: {e}")
+
+    async def shutdown(self):
+        for video_id in list(self.streams):
+            await self.stop(video_id, reason="shutdown")
+
+    def health(self, video_id: int) -> dict:
+        try:
+            health = redis_client.hgetall(_health_key(video_id))
+            owner = redis_client.get(_owner_key(video_id))
+        except redis.RedisError:
+            health, owner = {}, None
+        local = self.streams.get(video_id)
+        if not health and local:
+            health = {"owner": WORKER_ID, "state": "running", "restarts": local.restarts}
+        playlist = playlist_path(video_id)
+        last_update = os.path.getmtime(playlist) if os.path.exists(playlist) else None
+        return {
+            "video_id": video_id,
+            "active": bool(owner) or local is not None,
+            "owner": owner or health.get("owner"),
+            "owned_by_this_worker": local is not None,
+            "state": health.get("state", "stopped"),
+            "pid": health.get("pid") or None,
+            "restarts": int(health.get("restarts", 0)),
+            "last_exit_code": health.get("last_exit_code"),
+            "viewers": self.viewer_count(video_id),
+            "playlist_age_seconds": round(time.time() - last_update, 1) if last_update else None,
+        }
+
+    def active_stream_ids(self) -> List[int]:
+        try:
+            return sorted(int(key.rsplit(":", 1)[1]) for key in redis_client.scan_iter("stream:owner:*"))
+        except redis.RedisError:
+            return sorted(self.streams)
+
+
+supervisor = StreamSupervisor()
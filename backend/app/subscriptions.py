@@ -0,0 +1,86 @@
+"""Subscription graph reads and writes.
+
+Every operation here goes straight to the ``subscriptions`` table: an
+existence check or a single-row upsert/delete on its primary key
+``(subscriber_id, subscribed_to_id)``, or a lookup on the reverse index
+``ix_subscriptions_subscribed_to``. The ORM ``User.subscriptions`` and
+``User.subscribers`` collections are never loaded, so a channel with 100k
+followers costs the same as one with ten.
+
+Follower and video counts for a list of channels come from ``channel_counts``
+in one grouped query, instead of ``len(user.subscribers)`` per channel.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+sub = models.subscriptions
+
+
+def is_subscribed(db: Session, subscriber_id: int, channel_id: int) -> bool:
+    return db.query(exists().where(
+        sub.c.subscriber_id == subscriber_id,
+        sub.c.subscribed_to_id == channel_id
+    )).scalar()
+
+
+def subscribe(db: Session, subscriber_id: int, channel_id: int) -> bool:
+    """Returns False if the subscription already existed"""
+    stmt = insert(sub).values(subscriber_id=subscriber_id, subscribed_to_id=channel_id).on_conflict_do_nothing(
+        index_elements=[sub.c.subscriber_id, sub.c.subscribed_to_id]
+    ).returning(sub.c.subscriber_id)
+    inserted = db.execute(stmt).first() is not None
+    db.commit()
+    return inserted
+
+
+def unsubscribe(db: Session, subscriber_id: int, channel_id: int) -> bool:
+    """Returns False if there was no subscription to remove"""
+    result = db.execute(delete(sub).where(
+        sub.c.subscriber_id == subscriber_id,
+        sub.c.subscribed_to_id == channel_id
+    ))
+    db.commit()
+    return result.rowcount > 0
+
+
+def subscribed_channels(db: Session, subscriber_id: int) -> List[models.User]:
+    """Channels subscriber_id follows, most recently subscribed first"""
+    return db.query(models.User).join(sub, sub.c.subscribed_to_id == models.User.id).filter(
+        sub.c.subscriber_id == subscriber_id
+    ).order_by(sub.c.subscribed_at.desc()).all()
+
+
+def channel_counts(db: Session, channel_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """channel id -> (subscriber_count, video_count), for every id given"""
+    channel_ids = list(set(channel_ids))
+    if not channel_ids:
+        return {}
+    subscriber_counts = select(
+        sub.c.subscribed_to_id.label("channel_id"), func.count().label("subscribers")
+    ).where(sub.c.subscribed_to_id.in_(channel_ids)).group_by(sub.c.subscribed_to_id).subquery()
+    video_counts = select(
+        models.Video.owner_id.label("channel_id"), func.count().label("videos")
+    ).where(models.Video.owner_id.in_(channel_ids)).group_by(models.Video.owner_id).subquery()
+
+    stmt = select(
+        models.User.id,
+        func.coalesce(subscriber_counts.c.subscribers, 0),
+        func.coalesce(video_counts.c.videos, 0),
+    ).outerjoin(subscriber_counts, subscriber_counts.c.channel_id == models.User.id).outerjoin(
+        video_counts, video_counts.c.channel_id == models.User.id
+    ).where(models.User.id.in_(channel_ids))
+    counts = {channel_id: (subscribers, videos) for channel_id, subscribers, videos in db.execute(stmt)}
+    return {channel_id: counts.get(channel_id, (0, 0)) for channel_id in channel_ids}
+
+
+def attach_owner_counts(db: Session, videos: Iterable[models.Video]):
+    """Set subscriber_count/video_count on each video's owner for schemas.Video"""
+    owners = {video.owner.id: video.owner for video in videos if video.owner is not None}
+    for owner_id, (subscriber_count, video_count) in channel_counts(db, owners).items():
+        owners[owner_id].subscriber_count = subscriber_count
+        owners[owner_id].video_count = video_count
@@ -0,0 +1,207 @@
+"""Thumbnail derivative pipeline.
+
+Every image source (processor thumbnails, custom uploads, YouTube imports,
+avatars, banners) goes through the same path: the source is resized to a set of
+named widths and encoded as WebP (plus AVIF where Pillow supports it) with a
+JPEG fallback. Files are content-addressed by the SHA-256 of the source, so an
+unchanged image is never re-encoded and derivatives can be cached forever.
+A ~16px JPEG is inlined as a data URI for blur-up placeholders.
+
+Results are stored on the row as ``{"srcset": {size: {format: url, "width": w}},
+"placeholder": data_uri}``. Work runs on a small background pool.
+"""
+import base64
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, features
+
+from . import models, singleflight
+from .cleanup import local_thumbnail_path
+from .database import SessionLocal
+
+DERIVED_DIR = "/app/thumbnails/derived"
+DERIVED_URL_PREFIX = "/thumbnails/derived"
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# Named output widths per image kind
+VIDEO_SIZES = {"card": 320, "mobile": 480, "hero": 1280}
+AVATAR_SIZES = {"small": 48, "medium": 96, "large": 192}
+BANNER_SIZES = {"mobile": 640, "card": 1280, "hero": 2048}
+
+PLACEHOLDER_WIDTH = 16
+WEBP_QUALITY = 78
+AVIF_QUALITY = 55
+JPEG_QUALITY = 82
+
+SUPPORTS_AVIF = features.check("avif") if hasattr(features, "check") else False
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+
+# One encode per source image cluster-wide; concurrent requests share it
+_derive_flight = singleflight.group("thumbnail_derivatives")
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save(image: Image.Image, path: str, fmt: str):
+    tmp_path = f"{path}.tmp"
+    if fmt == "webp":
+        image.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif fmt == "avif":
+        image.save(tmp_path, "AVIF", quality=AVIF_QUALITY)
+    else:
+        image.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)  # Never expose half-written files
+
+
+def generate_derivatives(source_path: str, sizes: Dict[str, int]) -> dict:
+    """Create (or reuse) every size/format derivative of an image"""
+    content_hash = _hash_file(source_path)
+    # Keyed by content: two workers never write the same derivative files at once
+    return _derive_flight.do(
+        content_hash, _generate_derivatives, source_path, content_hash, sizes, distributed=True
+    )
+
+
+def _generate_derivatives(source_path: str, content_hash: str, sizes: Dict[str, int]) -> dict:
+    subdir = os.path.join(DERIVED_DIR, content_hash[:2])
+    os.makedirs(subdir, exist_ok=True)
+    formats = ["avif", "webp", "jpeg"] if SUPPORTS_AVIF else ["webp", "jpeg"]
+    extensions = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+
+    with Image.open(source_path) as source:
+        source = source.convert("RGB")
+        srcset = {}
+        for name, width in sizes.items():
+            # Never upscale; small sources just get re-encoded at their own width
+            target_width = min(width, source.width)
+            target_height = max(1, round(source.height * target_width / source.width))
+            resized = None
+            entry = {"width": target_width}
+            for fmt in formats:
+                filename = f"{content_hash}_{target_width}.{extensions[fmt]}"
+                path = os.path.join(subdir, filename)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = source.resize((target_width, target_height), Image.LANCZOS)
+                    _save(resized, path, fmt)
+                entry[fmt] = f"{DERIVED_URL_PREFIX}/{content_hash[:2]}/{filename}"
+            srcset[name] = entry
+
+        tiny = source.resize(
+            (PLACEHOLDER_WIDTH, max(1, round(source.height * PLACEHOLDER_WIDTH / source.width))),
+            Image.BILINEAR
+        )
+        buffer = io.BytesIO()
+        tiny.save(buffer, "JPEG", quality=40)
+        placeholder = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    return {"srcset": srcset, "placeholder": placeholder}
+
+
+def _derive_for_path(public_path: Optional[str], sizes: Dict[str, int]) -> Optional[dict]:
+    source_path = local_thumbnail_path(public_path)
+    if not source_path or not os.path.exists(source_path):
+        return None
+    return generate_derivatives(source_path, sizes)
+
+
+def derive_video_thumbnail(video_id: int) -> bool:
+    """Generate derivatives for a video's current thumbnail and store them on the row"""
+    db = SessionLocal()
+    try:
+        video = db.query(models.Video).filter(models.Video.id == video_id).first()
+        if not video or not video.thumbnail_path:
+            return False
+        source = video.thumbnail_path
+        variants = _derive_for_path(source, VIDEO_SIZES)
+        if variants is None:
+            return False
+        # Only store if the thumbnail didn't change while we were encoding
+        updated = db.query(models.Video).filter(
+            models.Video.id == video_id,
+            models.Video.thumbnail_path == source
+        ).update({models.Video.thumbnail_variants: variants}, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    except Exception as e:
+        db.rollback()
+        print(f"Error generating thumbnail derivatives for video {video_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def derive_user_image(user_id: int, kind: str) -> bool:
+    """Generate derivatives for a user's avatar or banner"""
+    url_column, variants_column, sizes = {
+        "avatar": (models.User.avatar_url, models.User.avatar_variants, AVATAR_SIZES),
+        "banner": (models.User.banner_url, models.User.banner_variants, BANNER_SIZES),
+    }[kind]
+    db = SessionLocal()
+    try:
+        source = db.query(url_column).filter(models.User.id == user_id).scalar()
+        variants = _derive_for_path(source, sizes)
+        if variants is None:
+            return False
+        updated = db.query(models.User).filter(
+            models.User.id == user_id,
+            url_column == source
+        ).update({variants_column: variants}, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    except Exception as e:
+        db.rollback()
+        print(f"Error generating {kind} derivatives for user {user_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def enqueue_video_thumbnail(video_id: int):
+    _executor.submit(derive_video_thumbnail, video_id)
+
+
+def enqueue_user_image(user_id: int, kind: str):
+    _executor.submit(derive_user_image, user_id, kind)
+
+
+def backfill_derivatives(limit: int) -> dict:
+    """Generate derivatives for existing videos and users that don't have them yet"""
+    db = SessionLocal()
+    try:
+        video_ids = [row.id for row in db.query(models.Video.id).filter(
+            models.Video.thumbnail_path.isnot(None),
+            models.Video.thumbnail_variants.is_(None)
+        ).order_by(models.Video.id.desc()).limit(limit)]
+        avatar_ids = [row.id for row in db.query(models.User.id).filter(
+            models.User.avatar_url.isnot(None),
+            models.User.avatar_variants.is_(None)
+        )]
+        banner_ids = [row.id for row in db.query(models.User.id).filter(
+            models.User.banner_url.isnot(None),
+            models.User.banner_variants.is_(None)
+        )]
+    finally:
+        db.close()
+
+    videos_done = sum(1 for ok in _executor.map(derive_video_thumbnail, video_ids) if ok)
+    avatars_done = sum(1 for ok in _executor.map(lambda uid: derive_user_image(uid, "avatar"), avatar_ids) if ok)
+    banners_done = sum(1 for ok in _executor.map(lambda uid: derive_user_image(uid, "banner"), banner_ids) if ok)
+
+    return {
+        "videos": videos_done,
+        "videos_skipped": len(video_ids) - videos_done,
+        "avatars": avatars_done,
+        "banners": banners_done,
+    }
@@ -0,0 +1,234 @@
+"""Precomputed "TV Channel" continuous-play queue (PERSONALIZED_VIEWING_FEATURE.md).
+
+Each user has a Redis list ``tvq:{user_id}`` of ready-to-play items. An item
+is a video card plus what the player needs to start or preload it: the
+master playlist, the first segment (or the YouTube id) and why it was picked.
+
+Advancing (``next_item``) is one Lua call. It pops items until it finds one
+that hasn't been deleted (``tvq:deleted``), served before
+(``tvq:seen:{user_id}``) or finished (``watch_history.finished_key``),
+records it as seen, and returns it along with the next few items for
+preloading. No SQL runs on that path. When fewer than
+``LOW_WATER`` items remain, ``refill`` runs on a background pool,
+single-flight per user across workers.
+
+``refill`` builds up to ``QUEUE_SIZE`` items following ``SLOT_PATTERN``:
+videos the user left unfinished (the watch_history resume positions), the
+user's most watched tags, new uploads from subscriptions, trending, and
+recent uploads for discovery. A source that runs dry gives its slots to
+trending. It skips anything already queued, seen, or finished in the last
+``SEEN_WINDOW``, and warms the segment cache for the first items it adds.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import redis
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import feeds, models, segment_cache, singleflight, watch_history, watch_stats
+from .database import SessionLocal
+from .redis_client import redis_client
+
+QUEUE_SIZE = 30
+LOW_WATER = 8
+UP_NEXT = 5  # Items returned with each advance for the "Up Next" list and preloading
+SEEN_WINDOW = 7 * 24 * 3600  # Don't repeat a video within this long
+QUEUE_TTL = 24 * 3600
+DELETED_KEY = "tvq:deleted"
+WARM_ITEMS = 2  # Opening segments of the first new items are loaded into the segment cache
+
+# Which source fills each slot; roughly tags 40%, subscriptions 30%, trending 20%, discovery 10%,
+# with one unfinished video per round while there are any
+SLOT_PATTERN = ["resume", "tags", "subscriptions", "trending", "tags", "subscriptions",
+                "tags", "discovery", "trending", "subscriptions", "tags"]
+REASONS = {
+    "resume": "Continue watching",
+    "tags": "Based on your interests",
+    "subscriptions": "New from your subscriptions",
+    "trending": "Trending now",
+    "discovery": "Something new",
+}
+
+# KEYS[1] = queue, KEYS[2] = seen zset, KEYS[3] = deleted set, KEYS[4] = finished zset
+# ARGV[1] = now, ARGV[2] = how many upcoming items to return, ARGV[3] = seen ttl
+# Returns {item or '', remaining length, upcoming items...}
+_NEXT_SCRIPT = """
+local function playable(item)
+    local id = tostring(cjson.decode(item)['id'])
+    return redis.call('SISMEMBER', KEYS[3], id) == 0 and not redis.call('ZSCORE', KEYS[2], id)
+        and not redis.call('ZSCORE', KEYS[4], id)
+end
+local current = ''
+while true do
+    local item = redis.call('LPOP', KEYS[1])
+    if not item then break end
+    if playable(item) then
+        current = item
+        redis.call('ZADD', KEYS[2], ARGV[1], tostring(cjson.decode(item)['id']))
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+        break
+    end
+end
+local result = {current, redis.call('LLEN', KEYS[1])}
+for _, item in ipairs(redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[2]) * 2 - 1)) do
+    if #result - 2 >= tonumber(ARGV[2]) then break end
+    if playable(item) then table.insert(result, item) end
+end
+return result
+"""
+
+_flight = singleflight.group("tv_channel")
+_refill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tv-channel")
+
+
+def _queue_key(user_id: int) -> str:
+    return f"tvq:{user_id}"
+
+
+def _seen_key(user_id: int) -> str:
+    return f"tvq:seen:{user_id}"
+
+
+def next_item(user_id: int) -> Tuple[Optional[dict], List[dict]]:
+    """Pop the next playable item and peek at the ones after it; schedules a refill when running low"""
+    result = redis_client.eval(
+        _NEXT_SCRIPT, 4, _queue_key(user_id), _seen_key(user_id), DELETED_KEY,
+        watch_history.finished_key(user_id), time.time(), UP_NEXT, SEEN_WINDOW
+    )
+    current, remaining, upcoming = result[0], int(result[1]), result[2:]
+    if remaining < LOW_WATER:
+        refill_in_background(user_id)
+    return (json.loads(current) if current else None), [json.loads(item) for item in upcoming]
+
+
+def peek(user_id: int, count: int) -> List[dict]:
+    return [json.loads(item) for item in redis_client.lrange(_queue_key(user_id), 0, count - 1)]
+
+
+def reset(user_id: int):
+    redis_client.delete(_queue_key(user_id))
+
+
+def forget_videos(video_ids: List[int]):
+    """Deleted videos are skipped by every queue that still holds them"""
+    if not video_ids:
+        return
+    try:
+        redis_client.sadd(DELETED_KEY, *video_ids)
+        redis_client.expire(DELETED_KEY, QUEUE_TTL * 2)
+    except redis.RedisError as e:
+        print(f"Error marking deleted videos for TV channel queues: {e}")
+
+
+def fill(user_id: int) -> int:
+    """Refill now, sharing the work with any refill of the same queue already running"""
+    return _flight.do(str(user_id), refill, user_id, distributed=True)
+
+
+def refill_in_background(user_id: int):
+    def run():
+        try:
+            fill(user_id)
+        except Exception as e:
+            print(f"TV channel refill failed for user {user_id}: {e}")
+
+    _refill_executor.submit(run)
+
+
+def _candidates(db: Session, user_id: int, source: str, exclude: set, limit: int, resume: dict) -> list:
+    if source == "resume" and not resume:
+        return []
+    query = feeds.card_query(db).add_columns(models.Video.hls_path, models.Video.youtube_url).filter(
+        models.Video.processing_status == "completed",
+        models.Video.is_live_stream.isnot(True),
+        models.Video.owner_id != user_id,
+    )
+    if exclude:
+        query = query.filter(models.Video.id.notin_(exclude))
+
+    if source == "resume":
+        query = query.filter(models.Video.id.in_(list(resume)[:limit]))
+    elif source == "tags":
+        tags = watch_stats.top_items(db, user_id, "tag", limit=10)
+        if not tags:
+            return []
+        query = query.filter(models.Video.tags.overlap(tags)).order_by(feeds.trending_score_expression().desc())
+    elif source == "subscriptions":
+        query = query.filter(models.Video.owner_id.in_(
+            select(models.subscriptions.c.subscribed_to_id).where(models.subscriptions.c.subscriber_id == user_id)
+        )).order_by(models.Video.upload_date.desc())
+    elif source == "trending":
+        query = query.order_by(feeds.trending_score_expression().desc())
+    else:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+        query = query.filter(models.Video.upload_date >= cutoff).order_by(func.random())
+    return query.limit(limit).all()
+
+
+def _item(row, source: str, resume: dict) -> dict:
+    item = feeds.card(row)
+    item.update(
+        reason=REASONS[source],
+        master_playlist=row.hls_path,
+        first_segment=segment_cache.first_segment_url(row.hls_path),
+        youtube_url=row.youtube_url,
+        resume_position=resume.get(row.id),
+    )
+    return item
+
+
+def refill(user_id: int) -> int:
+    """Top the user's queue back up to QUEUE_SIZE items. Returns how many were added."""
+    queued = [json.loads(item)["id"] for item in redis_client.lrange(_queue_key(user_id), 0, -1)]
+    needed = QUEUE_SIZE - len(queued)
+    if needed <= 0:
+        return 0
+    now = time.time()
+    redis_client.zremrangebyscore(_seen_key(user_id), 0, now - SEEN_WINDOW)
+    exclude = set(queued) | {int(video_id) for video_id in redis_client.zrange(_seen_key(user_id), 0, -1)}
+    exclude |= {int(video_id) for video_id in redis_client.smembers(DELETED_KEY)}
+    exclude.update(watch_history.finished_videos(user_id))
+    resume = {
+        video_id: position for video_id, position in watch_history.resume_positions(user_id).items()
+        if video_id not in exclude
+    }
+
+    db = SessionLocal()
+    try:
+        recent_cutoff = datetime.now(timezone.utc) - timedelta(seconds=SEEN_WINDOW)
+        exclude |= {row.video_id for row in db.query(models.WatchHistory.video_id).filter(
+            models.WatchHistory.user_id == user_id,
+            models.WatchHistory.watched_at >= recent_cutoff,
+            models.WatchHistory.completion_percentage >= watch_stats.COMPLETED_PERCENT
+        )}
+        pools = {}
+        for source in REASONS:
+            pools[source] = _candidates(db, user_id, source, exclude, needed, resume)
+            exclude |= {row.id for row in pools[source]}
+    finally:
+        db.close()
+
+    items = []
+    while len(items) < needed and any(pools.values()):
+        for source in SLOT_PATTERN:
+            if not pools[source]:
+                source = "trending" if pools["trending"] else next((s for s, pool in pools.items() if pool), None)
+                if source is None:
+                    break
+            items.append(_item(pools[source].pop(0), source, resume))
+            if len(items) >= needed:
+                break
+    if not items:
+        return 0
+
+    pipe = redis_client.pipeline()
+    pipe.rpush(_queue_key(user_id), *[json.dumps(item, default=str) for item in items])
+    pipe.expire(_queue_key(user_id), QUEUE_TTL)
+    pipe.execute()
+    for item in items[:WARM_ITEMS]:
+        segment_cache.warm_video(item["id"], item["master_playlist"])
+    return len(items)
@@ -0,0 +1,146 @@
+"""Unique viewer counting backed by Redis HyperLogLog.
+
+Every video gets one HLL per time window (all-time, hour, day, week). Each HLL
+is capped at ~12KB by Redis no matter how many viewers it sees, so we never keep
+exact viewer sets. The all-time estimate is periodically persisted to
+``videos.unique_viewers`` so SQL (e.g. the trending score) can use it.
+"""
+import hashlib
+import ipaddress
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import redis
+
+from . import models
+from .database import SessionLocal
+from .redis_client import redis_client
+
+# Window name -> (strftime bucket format, key TTL in seconds). "all" never expires.
+WINDOWS = {
+    "hour": ("%Y%m%d%H", 2 * 24 * 3600),
+    "day": ("%Y%m%d", 8 * 24 * 3600),
+    "week": ("%G%V", 5 * 7 * 24 * 3600),
+    "all": (None, None),
+}
+
+DIRTY_SET_KEY = "uv:dirty"
+PERSIST_BATCH_SIZE = 500
+
+# Reverse proxies (IPs or CIDRs, comma separated) whose X-Forwarded-For we believe
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+]
+
+
+def _is_trusted(address: Optional[str], proxies: List) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except (TypeError, ValueError):
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str], proxies: List = TRUSTED_PROXIES) -> Optional[str]:
+    """The client's address: the connecting peer, unless that is a trusted proxy.
+
+    Behind trusted proxies, X-Forwarded-For is read right to left and the first
+    hop that isn't a trusted proxy wins. Hops further left are client-supplied
+    and ignored.
+    """
+    if not forwarded_for or not _is_trusted(peer, proxies):
+        return peer
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+        if not _is_trusted(hop, proxies):
+            return hop
+    return peer
+
+
+def viewer_key(user_id: Optional[int], client_ip: Optional[str], user_agent: Optional[str]) -> str:
+    """Identify a viewer by user id, or by an anonymous fingerprint of IP + user agent"""
+    if user_id is not None:
+        return f"u:{user_id}"
+    fingerprint = f"{client_ip or ''}|{user_agent or ''}".encode("utf-8")
+    return "a:" + hashlib.sha1(fingerprint).hexdigest()[:16]
+
+
+def _window_key(video_id: int, window: str, now: datetime) -> str:
+    bucket_format, _ = WINDOWS[window]
+    if bucket_format is None:
+        return f"uv:{video_id}:all"
+    return f"uv:{video_id}:{window}:{now.strftime(bucket_format)}"
+
+
+def record_view(video_id: int, viewer: str) -> bool:
+    """Add a viewer to every window of a video.
+
+    Returns True if the viewer is new for the current hour, which callers use to
+    decide whether a replayed view should count towards the raw view counter.
+    """
+    now = datetime.utcnow()
+    pipe = redis_client.pipeline()
+    for window, (_, ttl) in WINDOWS.items():
+        key = _window_key(video_id, window, now)
+        pipe.pfadd(key, viewer)
+        if ttl:
+            pipe.expire(key, ttl)
+    pipe.sadd(DIRTY_SET_KEY, video_id)
+    results = pipe.execute()
+    # First command in the pipeline is PFADD on the hourly window
+    return bool(results[0])
+
+
+def count_unique_viewers(video_id: int, window: str = "all") -> int:
+    """Estimate unique viewers for a video in the current window"""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window: {window}")
+    return redis_client.pfcount(_window_key(video_id, window, datetime.utcnow()))
+
+
+def count_unique_viewers_all_windows(video_id: int) -> Dict[str, int]:
+    now = datetime.utcnow()
+    pipe = redis_client.pipeline()
+    for window in WINDOWS:
+        pipe.pfcount(_window_key(video_id, window, now))
+    return dict(zip(WINDOWS.keys(), pipe.execute()))
+
+
+def persist_unique_viewer_counts() -> int:
+    """Copy all-time HLL estimates of recently viewed videos into the videos table"""
+    try:
+        video_ids = [int(v) for v in redis_client.spop(DIRTY_SET_KEY, PERSIST_BATCH_SIZE) or []]
+        if not video_ids:
+            return 0
+        pipe = redis_client.pipeline()
+        for video_id in video_ids:
+            pipe.pfcount(f"uv:{video_id}:all")
+        counts = pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error reading unique viewer counts from Redis: {e}")
+        return 0
+
+    db = SessionLocal()
+    try:
+        existing_ids = {
+            row.id for row in db.query(models.Video.id).filter(models.Video.id.in_(video_ids))
+        }
+        db.bulk_update_mappings(models.Video, [
+            {"id": video_id, "unique_viewers": count}
+            for video_id, count in zip(video_ids, counts)
+            if video_id in existing_ids
+        ])
+        db.commit()
+        return len(existing_ids)
+    except Exception as e:
+        db.rollback()
+        print(f"Error persisting unique viewer counts: {e}")
+        # Put the ids back so the next run retries them
+        try:
+            redis_client.sadd(DIRTY_SET_KEY, *video_ids)
+        except redis.RedisError:
+            pass
+        return 0
+    finally:
+        db.close()
@@ -0,0 +1,326 @@
+"""Watch history ingestion: coalesced heartbeats, batched flushes, monthly partitions.
+
+Players send heartbeats in batches to ``POST /watch-events``. A heartbeat
+carries the position and the cumulative seconds watched in one playback
+session. Nothing touches Postgres on the request path:
+
+- ``record_heartbeats`` folds each heartbeat into a Redis hash per
+  (user, video, session), keeping the largest watched total and the latest
+  position. It also marks the session dirty and stores the resume position
+  in the user's ``wh:resume:{user_id}`` hash. Finished videos move from
+  there to the ``wh:finished:{user_id}`` zset for ``FINISHED_TTL``, which is
+  how the TV channel skips them.
+- ``flush_sessions`` (a background loop) writes sessions that ended or went
+  idle for ``SESSION_IDLE_SECONDS`` to ``watch_history`` as one multi-row
+  INSERT, one row per session. Rows are upserted on (user, video, session,
+  start). Session hashes stay in Redis until ``SESSION_TTL``, so a session
+  resumed after a pause, or a retried flush, updates its row instead of
+  adding a second one.
+
+The same transaction updates the per-user rollups in ``watch_stats``.
+
+``watch_history`` is range-partitioned by month on ``watched_at`` (the
+session start). ``ensure_partitions`` creates the current and upcoming
+months. ``drop_expired_partitions`` removes months older than
+``WATCH_HISTORY_RETENTION_MONTHS`` with a DROP TABLE instead of a DELETE.
+
+Resume positions never come from history: ``resume_position`` is a single
+HGET.
+"""
+import os
+import re
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models, watch_stats
+from .database import SessionLocal
+from .redis_client import redis_client
+
+SESSION_IDLE_SECONDS = 60  # A session with no heartbeat for this long is written out
+SESSION_TTL = 6 * 3600  # How long a session can be resumed into the same history row
+RESUME_TTL = 90 * 24 * 3600
+RESUME_MIN_POSITION = 10  # Don't offer to resume the first few seconds
+COMPLETED_FRACTION = 0.95  # Past this the video counts as finished and the resume point is cleared
+FINISHED_TTL = 7 * 24 * 3600
+FLUSH_BATCH_SIZE = 1000
+PARTITION_MONTHS_AHEAD = 2
+WATCH_HISTORY_RETENTION_MONTHS = int(os.getenv("WATCH_HISTORY_RETENTION_MONTHS", "12"))
+
+DIRTY_SET_KEY = "wh:dirty"
+
+# Fold one heartbeat into its session hash
+# KEYS[1] = session hash, KEYS[2] = dirty set
+# ARGV = session key, now, position, watched, video_duration ('' if unknown), source ('' if none), ended ('1'/'0'), ttl
+_HEARTBEAT_SCRIPT = """
+redis.call('HSETNX', KEYS[1], 'started_at', ARGV[2])
+redis.call('HSET', KEYS[1], 'last_seen', ARGV[2], 'position', ARGV[3])
+if tonumber(ARGV[4]) > tonumber(redis.call('HGET', KEYS[1], 'watched') or '0') then
+    redis.call('HSET', KEYS[1], 'watched', ARGV[4])
+end
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[1], 'duration', ARGV[5])
+end
+if ARGV[6] ~= '' then
+    redis.call('HSETNX', KEYS[1], 'source', ARGV[6])
+end
+if ARGV[7] == '1' then
+    redis.call('HSET', KEYS[1], 'ended', '1')
+end
+redis.call('EXPIRE', KEYS[1], ARGV[8])
+redis.call('SADD', KEYS[2], ARGV[1])
+"""
+
+_PARTITION_NAME = re.compile(r"^watch_history_(\d{4})_(\d{2})$")
+_known_partitions = set()
+
+
+def _session_key(user_id: int, video_id: int, session_id: str) -> str:
+    return f"wh:s:{user_id}:{video_id}:{session_id}"
+
+
+def _resume_key(user_id: int) -> str:
+    return f"wh:resume:{user_id}"
+
+
+def finished_key(user_id: int) -> str:
+    """Zset of video ids the user finished within FINISHED_TTL, scored by time"""
+    return f"wh:finished:{user_id}"
+
+
+def record_heartbeats(user_id: int, heartbeats: Iterable) -> int:
+    """Coalesce a batch of heartbeats (schemas.WatchHeartbeat) in one Redis round trip"""
+    now = f"{time.time():.3f}"
+    pipe = redis_client.pipeline(transaction=False)
+    count = 0
+    for beat in heartbeats:
+        key = _session_key(user_id, beat.video_id, beat.session_id)
+        pipe.eval(
+            _HEARTBEAT_SCRIPT, 2, key, DIRTY_SET_KEY,
+            key, now, beat.position, beat.watched, beat.video_duration or "", beat.source or "",
+            "1" if beat.ended else "0", SESSION_TTL,
+        )
+        finished = beat.ended or (beat.video_duration and beat.position >= beat.video_duration * COMPLETED_FRACTION)
+        if finished:
+            pipe.hdel(_resume_key(user_id), beat.video_id)
+            pipe.zadd(finished_key(user_id), {beat.video_id: float(now)})
+            pipe.expire(finished_key(user_id), FINISHED_TTL)
+        elif beat.position >= RESUME_MIN_POSITION:
+            pipe.hset(_resume_key(user_id), beat.video_id, beat.position)
+            pipe.expire(_resume_key(user_id), RESUME_TTL)
+        count += 1
+    if count:
+        pipe.execute()
+    return count
+
+
+def resume_position(user_id: int, video_id: int) -> Optional[int]:
+    position = redis_client.hget(_resume_key(user_id), video_id)
+    return int(position) if position is not None else None
+
+
+def resume_positions(user_id: int) -> Dict[int, int]:
+    """Every video the user left unfinished -> where they stopped"""
+    return {int(video_id): int(position) for video_id, position in redis_client.hgetall(_resume_key(user_id)).items()}
+
+
+def finished_videos(user_id: int) -> List[int]:
+    """Videos the user finished within FINISHED_TTL"""
+    key = finished_key(user_id)
+    redis_client.zremrangebyscore(key, 0, time.time() - FINISHED_TTL)
+    return [int(video_id) for video_id in redis_client.zrange(key, 0, -1)]
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"watch_history_{month:%Y_%m}"
+
+
+def ensure_partitions(db: Session, months: Iterable[date] = ()) -> List[str]:
+    """Create monthly partitions for the given months plus the current and next PARTITION_MONTHS_AHEAD"""
+    current = _month_start(datetime.now(timezone.utc).date())
+    wanted = {_month_start(month) for month in months}
+    wanted.update(_add_months(current, offset) for offset in range(PARTITION_MONTHS_AHEAD + 1))
+    created = []
+    for month in sorted(wanted):
+        name = partition_name(month)
+        if name in _known_partitions:
+            continue
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF watch_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        ))
+        db.commit()
+        _known_partitions.add(name)
+        created.append(name)
+    return created
+
+
+def drop_expired_partitions(db: Session, retention_months: int = WATCH_HISTORY_RETENTION_MONTHS) -> List[str]:
+    """Drop whole months that ended more than retention_months ago"""
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -retention_months)
+    names = db.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'watch_history'
+    """)).scalars().all()
+    dropped = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if not match or date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        _known_partitions.discard(name)
+        dropped.append(name)
+    db.commit()
+    return dropped
+
+
+def _history_row(key: str, data: Dict[str, str]) -> dict:
+    _, _, user_id, video_id, session_id = key.split(":", 4)
+    watched = int(float(data.get("watched") or 0))
+    duration = int(float(data["duration"])) if data.get("duration") else None
+    completion = round(min(watched / duration, 1.0) * 100, 2) if duration else None
+    return {
+        "user_id": int(user_id),
+        "video_id": int(video_id),
+        "session_id": session_id,
+        "watched_at": datetime.fromtimestamp(float(data["started_at"]), tz=timezone.utc),
+        "watch_duration": watched,
+        "video_duration": duration,
+        "completion_percentage": completion,
+        "last_position": int(float(data.get("position") or 0)),
+        "watch_source": data.get("source"),
+    }
+
+
+def _rollup_changes(db: Session, rows: List[dict], videos: dict) -> List[dict]:
+    """What each row adds to the rollups, net of what its session contributed in earlier flushes"""
+    WH = models.WatchHistory
+    session_key = tuple_(WH.user_id, WH.video_id, WH.session_id, WH.watched_at)
+    previous = {
+        (row.user_id, row.video_id, row.session_id, row.watched_at): row
+        for row in db.query(
+            WH.user_id, WH.video_id, WH.session_id, WH.watched_at, WH.watch_duration, WH.completion_percentage
+        ).filter(session_key.in_([
+            (row["user_id"], row["video_id"], row["session_id"], row["watched_at"]) for row in rows
+        ])).with_for_update()
+    }
+    # Days each (user, video) was already watched, so only its first session per day
+    # (and ever) counts towards the distinct-video counters
+    watched_day = func.date(func.timezone("UTC", WH.watched_at))
+    counted_days = {
+        (row.user_id, row.video_id, row.day)
+        for row in db.query(WH.user_id, WH.video_id, watched_day.label("day")).filter(
+            tuple_(WH.user_id, WH.video_id).in_({(row["user_id"], row["video_id"]) for row in rows})
+        ).distinct()
+    }
+    counted_ever = {(user_id, video_id) for user_id, video_id, _ in counted_days}
+
+    changes = []
+    for row in sorted(rows, key=lambda row: row["watched_at"]):
+        before = previous.get((row["user_id"], row["video_id"], row["session_id"], row["watched_at"]))
+        day_key = (row["user_id"], row["video_id"], row["watched_at"].astimezone(timezone.utc).date())
+        new_day = before is None and day_key not in counted_days
+        new_ever = before is None and day_key[:2] not in counted_ever
+        counted_days.add(day_key)
+        counted_ever.add(day_key[:2])
+        old_seconds = before.watch_duration if before else 0
+        old_completion = float(before.completion_percentage or 0) if before else 0.0
+        new_completion = float(row["completion_percentage"] or 0)
+        video = videos[row["video_id"]]
+        changes.append({
+            "user_id": row["user_id"],
+            "watched_at": row["watched_at"],
+            "owner_id": video.owner_id,
+            "tags": video.tags,
+            "sessions": 0 if before else 1,
+            "day_videos": int(new_day),
+            "all_time_videos": int(new_ever),
+            "seconds": max(row["watch_duration"] - old_seconds, 0),
+            "completions": int(new_completion >= watch_stats.COMPLETED_PERCENT)
+                           - int(before is not None and old_completion >= watch_stats.COMPLETED_PERCENT),
+            "completion_sum": new_completion - old_completion,
+        })
+    return changes
+
+
+def flush_sessions() -> int:
+    """Write sessions that ended or went idle to watch_history"""
+    try:
+        keys = redis_client.spop(DIRTY_SET_KEY, FLUSH_BATCH_SIZE) or []
+        if not keys:
+            return 0
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        sessions = pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error reading watch sessions from Redis: {e}")
+        return 0
+
+    now = time.time()
+    ready, active = {}, []
+    for key, data in zip(keys, sessions):
+        if not data or "started_at" not in data:
+            continue  # Expired
+        if data.get("ended") or now - float(data["last_seen"]) >= SESSION_IDLE_SECONDS:
+            ready[key] = data
+        else:
+            active.append(key)
+    try:
+        if active:
+            redis_client.sadd(DIRTY_SET_KEY, *active)
+    except redis.RedisError as e:
+        print(f"Error re-queueing active watch sessions: {e}")
+    if not ready:
+        return 0
+
+    rows = [_history_row(key, data) for key, data in ready.items()]
+    db = SessionLocal()
+    try:
+        ensure_partitions(db, (row["watched_at"].date() for row in rows))
+        videos = {
+            video.id: video for video in db.query(models.Video.id, models.Video.owner_id, models.Video.tags).filter(
+                models.Video.id.in_({row["video_id"] for row in rows})
+            )
+        }
+        rows = [row for row in rows if row["video_id"] in videos]
+        if rows:
+            watch_stats.lock_for_flush(db, (row["user_id"] for row in rows))
+            watch_stats.apply_sessions(db, _rollup_changes(db, rows, videos))
+            stmt = insert(models.WatchHistory).values(rows)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id", "video_id", "session_id", "watched_at"],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in ("watch_duration", "video_duration", "completion_percentage", "last_position")
+                },
+            ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error writing watch history: {e}")
+        # Put the sessions back so the next run retries them
+        try:
+            redis_client.sadd(DIRTY_SET_KEY, *ready)
+        except redis.RedisError:
+            pass
+        return 0
+    finally:
+        db.close()
+    return len(rows)
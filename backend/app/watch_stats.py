@@ -0,0 +1,220 @@
+"""Per-user viewing statistics, rolled up as watch history is written.
+
+``user_watch_rollups`` holds one row per (user, bucket, dimension, item):
+
+- bucket: a UTC day, or ``ALL_TIME_BUCKET`` for the running all-time total
+- dimension/item: ``total``/'', ``hour``/'00'..'23' (session start, UTC),
+  ``creator``/owner id, ``tag``/tag name
+- counters: sessions, distinct videos, seconds watched, completed sessions,
+  and the sum of completion percentages (for the average)
+
+``videos`` counts a video once per day bucket, and once ever in the all-time
+bucket. Rewatches in later sessions add sessions and seconds but no videos.
+Week and month sum their day buckets, so a video watched on two days counts
+twice there.
+
+``apply_sessions`` is called by ``watch_history.flush_sessions`` in the same
+transaction as the history upsert. It adds each session's change since its
+last flush to the day bucket and the all-time bucket with one multi-row upsert.
+
+The dashboard (``user_stats``) reads the all-time bucket for "all" and sums
+at most 30 day buckets for day/week/month. The totals and hours come back as
+at most 25 rows, and top creators and tags as ``TOP_N`` each. The cost does
+not depend on how much history a user has.
+
+``backfill`` rebuilds the day buckets covered by watch_history and then the
+all-time buckets from all day buckets, with all-time distinct videos recounted
+from the history that is still there. It holds an exclusive advisory lock,
+and flushes take the same lock shared, so the two never interleave.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+ALL_TIME_BUCKET = date(1970, 1, 1)
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30}  # "all" reads ALL_TIME_BUCKET
+COMPLETED_PERCENT = 95  # Matches watch_history.COMPLETED_FRACTION
+TOP_N = 5
+ROLLUP_LOCK_ID = 0x77687374  # pg advisory lock shared by flushes, exclusive for backfill
+COUNTERS = ("sessions", "videos", "seconds", "completions", "completion_sum")
+
+R = models.UserWatchRollup
+
+BACKFILL_DAYS_SQL = text("""
+INSERT INTO user_watch_rollups (user_id, bucket, dimension, item, sessions, videos, seconds, completions, completion_sum)
+SELECT h.user_id, (h.watched_at AT TIME ZONE 'UTC')::date, d.dimension, d.item,
+       count(*), count(DISTINCT h.video_id), sum(h.watch_duration),
+       count(*) FILTER (WHERE h.completion_percentage >= :completed),
+       coalesce(sum(h.completion_percentage), 0)
+FROM watch_history h
+LEFT JOIN videos v ON v.id = h.video_id
+CROSS JOIN LATERAL (
+    SELECT 'total'::text AS dimension, ''::text AS item
+    UNION ALL SELECT 'hour', to_char(h.watched_at AT TIME ZONE 'UTC', 'HH24')
+    UNION ALL SELECT 'creator', v.owner_id::text WHERE v.owner_id IS NOT NULL
+    UNION ALL (SELECT DISTINCT 'tag', tag FROM unnest(v.tags) AS tag)
+) d
+GROUP BY 1, 2, 3, 4
+""")
+
+REBUILD_ALL_TIME_SQL = text("""
+INSERT INTO user_watch_rollups (user_id, bucket, dimension, item, sessions, videos, seconds, completions, completion_sum)
+SELECT user_id, :all_time, dimension, item, sum(sessions), sum(videos), sum(seconds), sum(completions), sum(completion_sum)
+FROM user_watch_rollups
+WHERE bucket <> :all_time
+GROUP BY user_id, dimension, item
+""")
+
+# Summed day buckets count a video once per day; recount it once ever where history still covers it
+ALL_TIME_VIDEOS_SQL = text("""
+UPDATE user_watch_rollups r SET videos = c.videos
+FROM (
+    SELECT h.user_id, d.dimension, d.item, count(DISTINCT h.video_id) AS videos
+    FROM watch_history h
+    LEFT JOIN videos v ON v.id = h.video_id
+    CROSS JOIN LATERAL (
+        SELECT 'total'::text AS dimension, ''::text AS item
+        UNION ALL SELECT 'hour', to_char(h.watched_at AT TIME ZONE 'UTC', 'HH24')
+        UNION ALL SELECT 'creator', v.owner_id::text WHERE v.owner_id IS NOT NULL
+        UNION ALL (SELECT DISTINCT 'tag', tag FROM unnest(v.tags) AS tag)
+    ) d
+    GROUP BY 1, 2, 3
+) c
+WHERE r.user_id = c.user_id AND r.bucket = :all_time AND r.dimension = c.dimension AND r.item = c.item
+""")
+
+
+def lock_for_flush(db: Session, user_ids: Iterable[int] = ()):
+    """Shared rollup lock, plus one exclusive lock per user (in order) so two flushes can't both count a video as new"""
+    db.execute(text("SELECT pg_advisory_xact_lock_shared(:id)"), {"id": ROLLUP_LOCK_ID})
+    for user_id in sorted(set(user_ids)):
+        db.execute(text("SELECT pg_advisory_xact_lock(:id, :user_id)"), {"id": ROLLUP_LOCK_ID, "user_id": user_id})
+
+
+def apply_sessions(db: Session, changes: Iterable[dict]):
+    """Add flushed sessions to the rollups; call inside the flush transaction after lock_for_flush.
+
+    Each change has user_id, watched_at, owner_id, tags and the deltas since
+    the session was last flushed: sessions (1 if new, else 0), day_videos and
+    all_time_videos (1 for a new session of a video not yet counted in that
+    bucket), seconds, completions and completion_sum.
+    """
+    totals: Dict[tuple, List] = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for change in changes:
+        started = change["watched_at"].astimezone(timezone.utc)
+        items = [("total", ""), ("hour", f"{started.hour:02d}")]
+        if change["owner_id"] is not None:
+            items.append(("creator", str(change["owner_id"])))
+        items.extend(("tag", tag) for tag in set(change["tags"] or []))
+        for bucket, videos in ((started.date(), change["day_videos"]), (ALL_TIME_BUCKET, change["all_time_videos"])):
+            deltas = (change["sessions"], videos, change["seconds"], change["completions"], change["completion_sum"])
+            for dimension, item in items:
+                counters = totals[(change["user_id"], bucket, dimension, item)]
+                for index, delta in enumerate(deltas):
+                    counters[index] += delta
+
+    # Sorted so concurrent flushes lock rows in the same order
+    rows = [
+        {"user_id": user_id, "bucket": bucket, "dimension": dimension, "item": item, **dict(zip(COUNTERS, counters))}
+        for (user_id, bucket, dimension, item), counters in sorted(totals.items())
+        if any(counters)
+    ]
+    if not rows:
+        return
+    stmt = insert(R).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[R.user_id, R.bucket, R.dimension, R.item],
+        set_={column: getattr(R, column) + stmt.excluded[column] for column in COUNTERS},
+    ))
+
+
+def backfill(db: Session) -> dict:
+    """Rebuild rollups from watch_history (days it still covers) and all-time totals from the day buckets"""
+    db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID})
+    first_day = db.execute(text(
+        "SELECT min((watched_at AT TIME ZONE 'UTC')::date) FROM watch_history"
+    )).scalar()
+    if first_day is not None:
+        db.query(R).filter(R.bucket >= first_day, R.bucket != ALL_TIME_BUCKET).delete(synchronize_session=False)
+        db.execute(BACKFILL_DAYS_SQL, {"completed": COMPLETED_PERCENT})
+    db.query(R).filter(R.bucket == ALL_TIME_BUCKET).delete(synchronize_session=False)
+    db.execute(REBUILD_ALL_TIME_SQL, {"all_time": ALL_TIME_BUCKET})
+    db.execute(ALL_TIME_VIDEOS_SQL, {"all_time": ALL_TIME_BUCKET})
+    db.commit()
+    return {"first_day": first_day.isoformat() if first_day else None, "rows": db.query(func.count()).select_from(R).scalar()}
+
+
+def _bucket_filter(user_id: int, period: str) -> list:
+    if period == "all":
+        return [R.user_id == user_id, R.bucket == ALL_TIME_BUCKET]
+    today = datetime.now(timezone.utc).date()
+    return [R.user_id == user_id, R.bucket > today - timedelta(days=PERIOD_DAYS[period]), R.bucket != ALL_TIME_BUCKET]
+
+
+def _top(db: Session, filters: list, dimension: str, limit: int = TOP_N) -> list:
+    sessions = func.sum(R.sessions).label("sessions")
+    videos = func.sum(R.videos).label("videos")
+    seconds = func.sum(R.seconds).label("seconds")
+    return db.query(R.item, sessions, videos, seconds).filter(*filters, R.dimension == dimension).group_by(
+        R.item
+    ).order_by(seconds.desc(), sessions.desc()).limit(limit).all()
+
+
+def top_items(db: Session, user_id: int, dimension: str, period: str = "month", limit: int = TOP_N) -> List[str]:
+    """The user's most watched creators or tags over period, by watch time"""
+    return [row.item for row in _top(db, _bucket_filter(user_id, period), dimension, limit)]
+
+
+def user_stats(db: Session, user_id: int, period: str) -> dict:
+    """Dashboard numbers for period (day, week, month or all)"""
+    filters = _bucket_filter(user_id, period)
+    rows = db.query(
+        R.dimension, R.item, *[func.sum(getattr(R, column)) for column in COUNTERS],
+    ).filter(*filters, R.dimension.in_(("total", "hour"))).group_by(R.dimension, R.item).all()
+
+    sessions = videos = seconds = completions = 0
+    completion_sum = 0.0
+    viewing_by_hour = {}
+    for dimension, item, row_sessions, row_videos, row_seconds, row_completions, row_completion_sum in rows:
+        if dimension == "total":
+            sessions, videos = int(row_sessions), int(row_videos)
+            seconds, completions = int(row_seconds), int(row_completions)
+            completion_sum = float(row_completion_sum)
+        elif row_sessions:
+            viewing_by_hour[item] = int(row_sessions)
+
+    creators = _top(db, filters, "creator")
+    owners = {
+        user.id: user for user in db.query(models.User.id, models.User.username, models.User.channel_name).filter(
+            models.User.id.in_([int(row.item) for row in creators])
+        )
+    } if creators else {}
+
+    return {
+        "period": period,
+        "total_videos_watched": videos,
+        "total_watch_time": seconds,
+        "completed_videos": completions,
+        "average_completion": round(completion_sum / sessions, 2) if sessions else 0.0,
+        "most_watched_creators": [
+            {
+                "user_id": int(row.item),
+                "username": owners[int(row.item)].username,
+                "channel_name": owners[int(row.item)].channel_name,
+                "video_count": int(row.videos),
+                "watch_time": int(row.seconds),
+            }
+            for row in creators if int(row.item) in owners
+        ],
+        "most_watched_categories": [
+            {"category": row.item, "video_count": int(row.videos), "watch_time": int(row.seconds)}
+            for row in _top(db, filters, "tag")
+        ],
+        "viewing_by_hour": dict(sorted(viewing_by_hour.items())),
+    }
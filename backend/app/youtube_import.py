@@ -0,0 +1,331 @@
+"""YouTube auto-import pipeline.
+
+Stages:
+  1. Flat searches for every category, run concurrently (ids + titles only).
+  2. One ``IN`` query drops candidates that are already imported.
+  3. Full metadata is fetched only for the survivors, with bounded concurrency.
+  4. Thumbnails download in parallel over the ingest pool's pooled HTTP client.
+  5. Rows are written with a single ``INSERT ... ON CONFLICT DO NOTHING``
+     against the unique index on ``videos.youtube_url``.
+
+The extractor is pluggable so the pipeline can be benchmarked offline
+(see benchmarks/import_pipeline.py).
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import ingest, models, response_cache, thumbnails
+
+# Expanded category pool for more variety
+ALL_CATEGORIES = [
+    # Tech & Science
+    "technology news today",
+    "AI artificial intelligence explained",
+    "space exploration documentary",
+    "science experiments",
+    "robotics innovation",
+    "cybersecurity tutorial",
+    "programming tutorial",
+    "gadget review 2024",
+    "tech unboxing",
+    "web development",
+
+    # Gaming
+    "gaming highlights 2024",
+    "game review",
+    "esports tournament",
+    "indie game showcase",
+    "speedrun gameplay",
+    "retro gaming",
+    "game walkthrough",
+    "gaming news",
+
+    # Food & Cooking
+    "cooking tutorial easy",
+    "baking recipe",
+    "street food around world",
+    "chef cooking tips",
+    "vegan recipe",
+    "dessert recipe",
+    "meal prep ideas",
+    "food review",
+
+    # Entertainment
+    "comedy sketches",
+    "stand up comedy",
+    "funny moments compilation",
+    "prank videos",
+    "magic tricks revealed",
+    "talent show performance",
+
+    # Music
+    "music video 2024",
+    "live concert performance",
+    "guitar tutorial",
+    "music production tips",
+    "cover songs",
+    "piano performance",
+    "jazz music",
+    "electronic music",
+
+    # Education & How-to
+    "history documentary",
+    "DIY home improvement",
+    "art tutorial drawing",
+    "photography tips",
+    "animation tutorial",
+    "language learning",
+    "math explained simply",
+
+    # Lifestyle
+    "travel vlog 2024",
+    "fitness workout routine",
+    "yoga for beginners",
+    "meditation guide",
+    "fashion haul",
+    "beauty makeup tutorial",
+    "home organization",
+    "productivity tips",
+
+    # Sports & Outdoors
+    "sports highlights today",
+    "extreme sports",
+    "hiking adventure",
+    "cycling tips",
+    "workout motivation",
+    "martial arts training",
+    "camping survival",
+
+    # Nature & Animals
+    "wildlife documentary",
+    "cute animals compilation",
+    "nature photography",
+    "ocean life documentary",
+    "bird watching",
+    "pet training tips",
+
+    # Cars & Vehicles
+    "car review 2024",
+    "motorcycle review",
+    "classic car restoration",
+    "electric vehicle",
+    "racing highlights",
+
+    # Business & Finance
+    "investing for beginners",
+    "cryptocurrency explained",
+    "business startup tips",
+    "personal finance advice",
+
+    # Creative & Arts
+    "woodworking projects",
+    "pottery tutorial",
+    "crafts DIY",
+    "digital art process",
+    "film making tips",
+    "short film"
+]
+
+# Appended to searches so repeated cron runs get different results
+SEARCH_MODIFIERS = [
+    "",  # No modifier
+    " this week",
+    " recent",
+    " new",
+    " latest",
+    " popular",
+]
+
+
+class YtDlpExtractor:
+    """Extractor backed by yt-dlp. Outbound calls share the ingest fetch semaphore."""
+
+    def search(self, query: str, count: int) -> List[dict]:
+        """Flat search: returns lightweight entries (id, title) without resolving each video"""
+        import yt_dlp
+
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': True,
+        }
+        with ingest.fetch_slots:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                results = ydl.extract_info(f"ytsearch{count}:{query}", download=False)
+        return [entry for entry in (results or {}).get('entries') or [] if entry and entry.get('id')]
+
+    def extract(self, youtube_id: str) -> dict:
+        return ingest.fetch_youtube_info(youtube_id)
+
+
+def existing_youtube_ids(db: Session, youtube_ids: Iterable[str]) -> Set[str]:
+    """Return which of the given YouTube ids are already imported, in one query"""
+    youtube_ids = list(youtube_ids)
+    if not youtube_ids:
+        return set()
+    rows = db.query(models.Video.youtube_url).filter(models.Video.youtube_url.in_(youtube_ids)).all()
+    return {row.youtube_url for row in rows}
+
+
+def collect_import_rows(
+    categories: List[str],
+    videos_per_category: int,
+    owner_id: int,
+    extractor,
+    known_ids: Callable[[Iterable[str]], Set[str]],
+    thumbnail_fetcher: Callable[[str, str], str] = ingest.download_thumbnail,
+    concurrency: int = ingest.INGEST_FETCH_CONCURRENCY,
+) -> Dict[str, list]:
+    """Run the search/dedupe/extract/thumbnail stages and return rows ready to insert"""
+    errors = []
+    search_count = videos_per_category * 3  # Fetch more to account for duplicates
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # 1. Flat searches for every category at once
+        search_futures = {
+            category: pool.submit(extractor.search, f"{category}{random.choice(SEARCH_MODIFIERS)}", search_count)
+            for category in categories
+        }
+        candidates: Dict[str, List[str]] = {}
+        for category, future in search_futures.items():
+            try:
+                candidates[category] = [entry['id'] for entry in future.result()]
+            except Exception as e:
+                errors.append(f"Error searching {category}: {e}")
+                print(f"Error searching {category}: {e}")
+
+        # 2. Dedupe against the DB (one query) and across categories
+        known = known_ids({yid for ids in candidates.values() for yid in ids})
+        survivors: Dict[str, str] = {}  # youtube id -> category
+        for category, ids in candidates.items():
+            picked = 0
+            for youtube_id in ids:
+                if picked >= videos_per_category:
+                    break
+                if youtube_id in known or youtube_id in survivors:
+                    continue
+                survivors[youtube_id] = category
+                picked += 1
+
+        # 3. Full metadata only for survivors
+        info_futures = {youtube_id: pool.submit(extractor.extract, youtube_id) for youtube_id in survivors}
+        infos = {}
+        for youtube_id, future in info_futures.items():
+            try:
+                infos[youtube_id] = future.result()
+            except Exception as e:
+                errors.append(f"Error fetching {youtube_id}: {e}")
+                print(f"Error fetching {youtube_id}: {e}")
+
+        # 4. Thumbnails in parallel
+        thumb_futures = {
+            youtube_id: pool.submit(thumbnail_fetcher, info['thumbnail'], youtube_id)
+            for youtube_id, info in infos.items() if info.get('thumbnail')
+        }
+        thumbnail_paths = {}
+        for youtube_id, future in thumb_futures.items():
+            try:
+                thumbnail_paths[youtube_id] = future.result()
+            except Exception as e:
+                print(f"Failed to download thumbnail for {youtube_id}: {e}")
+
+    rows = []
+    for youtube_id, info in infos.items():
+        category = survivors[youtube_id]
+        description = info.get('description', '')
+
+        # Combine our category with the first 5 YouTube tags (keep it manageable)
+        video_tags = [category, "auto-imported"]
+        youtube_tags = info.get('tags', [])
+        if youtube_tags and isinstance(youtube_tags, list):
+            video_tags.extend(youtube_tags[:5])
+
+        rows.append({
+            "title": info.get('title', 'Untitled'),
+            "description": description[:500] if description else None,
+            "tags": video_tags,
+            "youtube_url": youtube_id,
+            "file_path": None,
+            "thumbnail_path": thumbnail_paths.get(youtube_id),
+            "owner_id": owner_id,
+            "processing_status": "completed",
+            "duration": info.get('duration', 0),
+            "views": 0,
+            "unique_viewers": 0,
+            "likes": 0,
+            "dislikes": 0,
+            "is_live_stream": False,
+        })
+
+    return {"rows": rows, "categories": survivors, "errors": errors}
+
+
+def insert_videos(db: Session, rows: List[dict]) -> Dict[str, int]:
+    """Insert rows in one statement, skipping any youtube_url that already exists.
+
+    Returns youtube id -> new video id for the rows actually inserted.
+    """
+    if not rows:
+        return {}
+    stmt = insert(models.Video).values(rows).on_conflict_do_nothing(
+        index_elements=[models.Video.youtube_url]
+    ).returning(models.Video.id, models.Video.youtube_url)
+    inserted = {row.youtube_url: row.id for row in db.execute(stmt)}
+    db.commit()
+    if inserted:
+        response_cache.invalidate("videos_imported")
+    return inserted
+
+
+def import_youtube_videos(
+    db: Session,
+    categories: Optional[List[str]],
+    videos_per_category: int,
+    username: str,
+    extractor=None,
+) -> dict:
+    """Import videos for a bot user from the given (or randomly sampled) categories"""
+    if not categories:
+        # Select 12 random categories from the pool for variety
+        categories = random.sample(ALL_CATEGORIES, min(12, len(ALL_CATEGORIES)))
+
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if not user:
+        print(f"User '{username}' not found, skipping import")
+        return {"status": "error", "message": f"User '{username}' not found"}
+
+    collected = collect_import_rows(
+        categories,
+        videos_per_category,
+        user.id,
+        extractor or YtDlpExtractor(),
+        known_ids=lambda ids: existing_youtube_ids(db, ids),
+    )
+
+    try:
+        inserted = insert_videos(db, collected["rows"])
+    except Exception as e:
+        db.rollback()
+        return {"status": "error", "message": f"Database error: {str(e)}", "imported": 0}
+
+    thumbnail_ids = [
+        inserted[row["youtube_url"]] for row in collected["rows"]
+        if row["thumbnail_path"] and row["youtube_url"] in inserted
+    ]
+    for video_id in thumbnail_ids:
+        thumbnails.enqueue_video_thumbnail(video_id)
+
+    titles = {row["youtube_url"]: row["title"] for row in collected["rows"]}
+    return {
+        "status": "success",
+        "imported_count": len(inserted),
+        "videos": [
+            {"id": youtube_id, "title": titles[youtube_id], "category": collected["categories"][youtube_id]}
+            for youtube_id in inserted
+        ],
+        "errors": collected["errors"] or None
+    }
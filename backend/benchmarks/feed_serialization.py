@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Compare list-endpoint payloads before and after card projections (feeds.py).
+
+Offline (default) it builds --rows synthetic videos and times, per 100 rows:
+  before: ORM-style objects -> schemas.Video (from_attributes, nested owner
+          profile) -> jsonable_encoder -> json.dumps, as FastAPI did
+  after:  projected rows -> feeds.card -> orjson
+and prints bytes per page of --page-size rows, raw and compressed.
+
+    python3 benchmarks/feed_serialization.py --rows 2000 --page-size 20
+
+With --base-url it also fetches the list endpoints from a running backend and
+reports the bytes on the wire with and without Accept-Encoding: gzip.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app import feeds, schemas  # noqa: E402
+
+LIVE_PATHS = [
+    "/videos?page_size={page_size}",
+    "/videos/trending?page_size={page_size}",
+    "/videos/search?q=a&page_size={page_size}",
+]
+
+
+def srcset(video_id):
+    prefix = f"/thumbnails/derived/{video_id % 256:02x}/{video_id:064x}"
+    return {
+        name: {"width": width, "webp": f"{prefix}_{width}.webp", "jpeg": f"{prefix}_{width}.jpg"}
+        for name, width in (("card", 320), ("mobile", 480), ("hero", 1280))
+    }
+
+
+def synthetic_rows(count):
+    now = datetime.now(timezone.utc)
+    owner = SimpleNamespace(
+        id=7, username="techreviewer", channel_name="Tech Reviews Daily",
+        channel_description="Honest reviews of the latest gadgets. " * 5,
+        avatar_url="/avatars/user_7_me.jpg", banner_url="/avatars/user_7_banner.jpg",
+        avatar_srcset=srcset(7), banner_srcset=srcset(8), subscriber_count=1200, video_count=300,
+    )
+    videos, cards = [], []
+    for i in range(count):
+        common = dict(
+            id=i, title=f"Video number {i} with a reasonably long title", thumbnail_path=f"/thumbnails/yt_{i}.jpg",
+            thumbnail_srcset=srcset(i), thumbnail_placeholder="data:image/jpeg;base64," + "A" * 400,
+            duration=300 + i, views=i * 3, upload_date=now - timedelta(hours=i), processing_status="completed",
+            is_live_stream=False, tags=["technology", "review", "auto-imported"], owner_id=owner.id,
+        )
+        videos.append(SimpleNamespace(
+            description="x" * 500, file_path=f"/app/uploads/video_{i}.mp4", stream_url=None,
+            live_low_latency=False, youtube_url=f"yt{i:09d}", hls_path=f"/processed/{i}/video_{i}.m3u8",
+            unique_viewers=i, likes=i, dislikes=0, owner=owner, **common,
+        ))
+        cards.append(SimpleNamespace(owner_username=owner.username, owner_channel_name=owner.channel_name, **common))
+    return videos, cards
+
+
+def before(videos):
+    models_ = [schemas.Video.model_validate(video) for video in videos]
+    return json.dumps(jsonable_encoder(models_)).encode("utf-8")
+
+
+def after(cards):
+    return orjson.dumps([feeds.card(row) for row in cards])
+
+
+def time_per_100(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for offset in range(0, len(rows), 100):
+            fn(rows[offset:offset + 100])
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / (len(rows) / 100)
+
+
+def offline(args):
+    videos, cards = synthetic_rows(args.rows)
+    for label, fn, rows in (("before", before, videos), ("after", after, cards)):
+        page = fn(rows[:args.page_size])
+        print(f"{label}: {time_per_100(fn, rows, args.repeat):.2f}ms per 100 rows, "
+              f"{len(page)} bytes/page raw, {len(gzip.compress(page, 5))} gzip")
+
+
+def live(args):
+    with httpx.Client(base_url=args.base_url, timeout=30.0) as client:
+        for path in LIVE_PATHS:
+            path = path.format(page_size=args.page_size)
+            sizes = []
+            for encoding in ("identity", "gzip"):
+                response = client.get(path, headers={"Accept-Encoding": encoding})
+                response.raise_for_status()
+                sizes.append(f"{encoding}={response.num_bytes_downloaded}")
+            print(f"{path}: {' '.join(sizes)} bytes on the wire")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--base-url", help="Also measure a running backend, e.g. http://localhost:8001")
+    args = parser.parse_args()
+    offline(args)
+    if args.base_url:
+        live(args)
+
+
+if __name__ == "__main__":
+    main()
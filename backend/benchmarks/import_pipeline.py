@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the YouTube auto-import pipeline against a fake extractor.
+
+No network or database is needed: the fake extractor sleeps to simulate yt-dlp
+latency, "known ids" come from an in-memory set and thumbnails are simulated
+downloads. It compares the old serial flow (full-metadata searches, one
+duplicate query per entry, serial thumbnails) with app.youtube_import's
+concurrent flat-search pipeline.
+
+    cd backend && python3 benchmarks/import_pipeline.py --categories 12 --per-category 2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import youtube_import  # noqa: E402
+
+
+class FakeExtractor:
+    """Simulates yt-dlp: flat searches are one round trip, full extraction is one per video"""
+
+    def __init__(self, search_latency, extract_latency):
+        self.search_latency = search_latency
+        self.extract_latency = extract_latency
+        self.calls = {"search": 0, "extract": 0}
+
+    def search(self, query, count):
+        self.calls["search"] += 1
+        time.sleep(self.search_latency)
+        # Same results regardless of the random search modifier, so both runs see the same duplicates
+        for modifier in youtube_import.SEARCH_MODIFIERS:
+            if modifier and query.endswith(modifier):
+                query = query[:-len(modifier)]
+        return [{"id": f"{abs(hash(query)) % 10**8:08d}{i:03d}", "title": f"{query} #{i}"} for i in range(count)]
+
+    def search_full(self, query, count):
+        """Old behaviour: extract_flat=False resolves every entry of the search"""
+        entries = self.search(query, count)
+        return [self.extract(entry["id"]) for entry in entries]
+
+    def extract(self, youtube_id):
+        self.calls["extract"] += 1
+        time.sleep(self.extract_latency)
+        return {
+            "id": youtube_id,
+            "title": f"Video {youtube_id}",
+            "description": "x" * 800,
+            "duration": 300,
+            "thumbnail": f"https://i.ytimg.com/vi/{youtube_id}/hqdefault.jpg",
+            "tags": ["a", "b", "c", "d", "e", "f"],
+        }
+
+
+def make_thumbnail_fetcher(latency):
+    def fetch(url, youtube_id):
+        time.sleep(latency)
+        return f"/thumbnails/youtube_{youtube_id}.jpg"
+    return fetch
+
+
+def serial_baseline(categories, per_category, extractor, known, db_latency, thumb_latency):
+    imported = 0
+    for category in categories:
+        count = 0
+        for info in extractor.search_full(category, per_category * 3):
+            if count >= per_category:
+                break
+            time.sleep(db_latency)  # SELECT ... WHERE youtube_url = ?
+            if info["id"] in known:
+                continue
+            time.sleep(thumb_latency)  # requests.get(thumbnail)
+            count += 1
+            imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--per-category", type=int, default=2)
+    parser.add_argument("--search-latency", type=float, default=0.8)
+    parser.add_argument("--extract-latency", type=float, default=0.6)
+    parser.add_argument("--thumbnail-latency", type=float, default=0.15)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--known-fraction", type=float, default=0.3, help="Fraction of results already imported")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    categories = youtube_import.ALL_CATEGORIES[:args.categories]
+    probe = FakeExtractor(0, 0)
+    all_ids = [e["id"] for c in categories for e in probe.search(c, args.per_category * 3)]
+    known = set(all_ids[:int(len(all_ids) * args.known_fraction)])
+
+    baseline_extractor = FakeExtractor(args.search_latency, args.extract_latency)
+    start = time.perf_counter()
+    baseline_count = serial_baseline(categories, args.per_category, baseline_extractor, known,
+                                     args.db_latency, args.thumbnail_latency)
+    baseline_time = time.perf_counter() - start
+
+    pipeline_extractor = FakeExtractor(args.search_latency, args.extract_latency)
+    start = time.perf_counter()
+
+    def known_ids(ids):
+        time.sleep(args.db_latency)  # One IN query
+        return known & set(ids)
+
+    result = youtube_import.collect_import_rows(
+        categories, args.per_category, owner_id=1,
+        extractor=pipeline_extractor,
+        known_ids=known_ids,
+        thumbnail_fetcher=make_thumbnail_fetcher(args.thumbnail_latency),
+        concurrency=args.concurrency,
+    )
+    pipeline_time = time.perf_counter() - start
+
+    print(f"serial baseline: {baseline_count} videos in {baseline_time:.2f}s, calls={baseline_extractor.calls}")
+    print(f"pipeline:        {len(result['rows'])} videos in {pipeline_time:.2f}s, calls={pipeline_extractor.calls}")
+    print(f"speedup: {baseline_time / pipeline_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Compare cold-start time and live edge latency of the normal and low-latency
+(LL-HLS) live proxy paths.
+
+Setup: publish a local RTSP test source, e.g. with mediamtx running on :8554
+    ffmpeg -re -f lavfi -i testsrc2=size=1280x720:rate=30 -f lavfi -i sine \\
+        -c:v libx264 -preset ultrafast -g 60 -c:a aac -f rtsp rtsp://localhost:8554/test
+and add it twice via /videos/add-stream (once with low_latency=true). Then,
+with neither stream running (wait out the idle timeout):
+    python3 benchmarks/live_latency.py --base-url http://localhost:8001 \\
+        --standard-video-id 41 --ll-video-id 42
+
+Startup is the time from the first playlist request until the first media
+segment/part can be fetched. Edge lag is wall clock minus the end of the newest
+media in the playlist (EXT-X-PROGRAM-DATE-TIME plus durations), sampled the
+way a player reloads. Estimated glass-to-glass adds the player's hold-back:
+three target durations for normal HLS (hls.js default), PART-HOLD-BACK for
+LL-HLS. Camera/RTSP delay is not included; it is the same for both paths.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+import httpx
+
+
+def parse_playlist(text):
+    """Return (edge timestamp, hold-back seconds, media URIs, next msn/part to block on)"""
+    edge = None
+    pending_parts = 0.0
+    target_duration = None
+    part_hold_back = None
+    uris = []
+    media_sequence = 0
+    segments = 0
+    parts_in_current = 0
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-SERVER-CONTROL:") and "PART-HOLD-BACK=" in line:
+            part_hold_back = float(line.split("PART-HOLD-BACK=")[1].split(",")[0])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            media_sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-PROGRAM-DATE-TIME:"):
+            edge = datetime.fromisoformat(line.split(":", 1)[1].replace("Z", "+00:00")).timestamp()
+            pending_parts = 0.0
+        elif line.startswith("#EXT-X-PART:"):
+            attrs = dict(item.split("=", 1) for item in line.split(":", 1)[1].split(","))
+            pending_parts += float(attrs["DURATION"])
+            parts_in_current += 1
+            uris.append(attrs["URI"].strip('"'))
+        elif line.startswith("#EXTINF:"):
+            if edge is not None:
+                edge += float(line.split(":", 1)[1].split(",")[0])
+            pending_parts = 0.0
+            parts_in_current = 0
+            segments += 1
+        elif line and not line.startswith("#"):
+            uris.append(line)
+    if edge is not None:
+        edge += pending_parts
+    hold_back = part_hold_back if part_hold_back is not None else 3 * (target_duration or 0)
+    next_block = (media_sequence + segments, parts_in_current) if part_hold_back is not None else None
+    return edge, hold_back, uris, next_block
+
+
+async def measure_startup(client, video_id):
+    base = f"/stream/proxy/{video_id}"
+    start = time.perf_counter()
+    while True:
+        response = await client.get(f"{base}/playlist.m3u8")
+        if response.status_code == 200:
+            _, _, uris, _ = parse_playlist(response.text)
+            if uris:
+                media = await client.get(f"{base}/{uris[-1]}")
+                if media.status_code == 200:
+                    return time.perf_counter() - start
+        if time.perf_counter() - start > 60:
+            raise RuntimeError(f"Stream {video_id} did not start within 60s")
+        await asyncio.sleep(0.05)
+
+
+async def sample_edge_lag(client, video_id, duration):
+    base = f"/stream/proxy/{video_id}/playlist.m3u8"
+    lags = []
+    hold_back = 0.0
+    next_block = None
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        params = {}
+        if next_block:
+            params = {"_HLS_msn": next_block[0], "_HLS_part": next_block[1]}
+        response = await client.get(base, params=params)
+        if response.status_code != 200:
+            await asyncio.sleep(0.2)
+            next_block = None
+            continue
+        edge, hold_back, _, next_block = parse_playlist(response.text)
+        if edge is not None:
+            lags.append(time.time() - edge)
+        if next_block is None:
+            await asyncio.sleep(0.5)  # Normal HLS: plain polling reload
+    return lags, hold_back
+
+
+def summarize(label, startup, lags, hold_back):
+    median_lag = statistics.median(lags)
+    print(f"{label}: startup={startup:.2f}s "
+          f"edge lag p50={median_lag:.2f}s max={max(lags):.2f}s "
+          f"hold-back={hold_back:.2f}s "
+          f"est. latency={median_lag + hold_back:.2f}s (n={len(lags)})")
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0) as client:
+        for label, video_id in (("normal HLS", args.standard_video_id), ("LL-HLS", args.ll_video_id)):
+            startup = await measure_startup(client, video_id)
+            lags, hold_back = await sample_edge_lag(client, video_id, args.duration)
+            summarize(label, startup, lags, hold_back)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--standard-video-id", type=int, required=True)
+    parser.add_argument("--ll-video-id", type=int, required=True)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to sample edge lag per stream")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measure tail latency of /processed segment requests while heavy DB queries run.
+
+Usage (against a running backend):
+    python3 benchmarks/segment_latency.py --base-url http://localhost:8001 \
+        --segment /processed/12/myvideo_000.ts --load-concurrency 32
+
+It first probes the segment URL with no background load, then again while
+--load-concurrency clients hammer search/similar/trending, and prints
+p50/p95/p99/max for both runs. With handlers blocking the event loop the loaded
+p99 jumps to the duration of the slowest query; with the threadpool-backed DB
+layer it should stay close to the idle numbers.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+HEAVY_PATHS = [
+    "/videos/search?q=a&page_size=50",
+    "/videos/trending?page_size=50",
+    "/videos/popular-tags?limit=50",
+    "/videos/{video_id}/similar",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    print(f"{label}: n={len(samples)} "
+          f"p50={percentile(samples, 50):.1f}ms "
+          f"p95={percentile(samples, 95):.1f}ms "
+          f"p99={percentile(samples, 99):.1f}ms "
+          f"max={max(samples):.1f}ms "
+          f"mean={statistics.mean(samples):.1f}ms")
+
+
+async def probe_segments(client, segment_path, requests_count, interval):
+    latencies = []
+    for _ in range(requests_count):
+        start = time.perf_counter()
+        response = await client.get(segment_path)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def generate_load(client, video_id, stop_event):
+    i = 0
+    while not stop_event.is_set():
+        path = HEAVY_PATHS[i % len(HEAVY_PATHS)].format(video_id=video_id)
+        try:
+            await client.get(path)
+        except httpx.HTTPError:
+            pass
+        i += 1
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.load_concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0, limits=limits) as client:
+        idle = await probe_segments(client, args.segment, args.requests, args.interval)
+        summarize("segment latency (idle)", idle)
+
+        stop_event = asyncio.Event()
+        load_tasks = [
+            asyncio.create_task(generate_load(client, args.video_id, stop_event))
+            for _ in range(args.load_concurrency)
+        ]
+        # Give the load a moment to saturate the worker
+        await asyncio.sleep(1.0)
+        loaded = await probe_segments(client, args.segment, args.requests, args.interval)
+        stop_event.set()
+        await asyncio.gather(*load_tasks, return_exceptions=True)
+        summarize(f"segment latency (under {args.load_concurrency} heavy clients)", loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--segment", required=True, help="Path of a processed segment, e.g. /processed/12/name_000.ts")
+    parser.add_argument("--video-id", type=int, default=1, help="Video id used for /similar load")
+    parser.add_argument("--load-concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between segment probes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
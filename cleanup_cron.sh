@@ -6,10 +6,8 @@
 
 echo "$(date): Starting cleanup of old bot videos..."
 
-# Clean up all bot users at once
-curl -X POST "http://192.168.1.198:8001/admin/cleanup-bot-videos" \
-  -H "Content-Type: application/json" \
-  -d '{"username": "all", "days_old": 7, "max_videos": 50}'
+# Clean up all bot users (users.is_bot) at once; parameters are query params
+curl -X POST "http://192.168.1.198:8001/admin/cleanup-bot-videos?username=all&days_old=7&max_videos=50"
 
 echo ""
 echo "$(date): Cleanup completed"
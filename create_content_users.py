@@ -107,7 +107,8 @@ def create_users():
                 hashed_password=get_password_hash(creator["password"]),
                 channel_name=creator["channel_name"],
                 channel_description=creator["channel_description"],
-                is_active=True
+                is_active=True,
+                is_bot=True
             )
             db.add(new_user)
             created_users.append(creator["username"])
@@ -7,6 +7,7 @@ function AddLiveStreamForm() {
   const [description, setDescription] = useState('');
   const [tags, setTags] = useState('');
   const [streamUrl, setStreamUrl] = useState('');
+  const [lowLatency, setLowLatency] = useState(false);
   const [thumbnail, setThumbnail] = useState(null);
   const [thumbnailPreview, setThumbnailPreview] = useState(null);
   const [error, setError] = useState(null);
@@ -54,6 +55,7 @@ function AddLiveStreamForm() {
       formData.append('description', description);
       formData.append('tags', tags);
       formData.append('stream_url', streamUrl);
+      formData.append('low_latency', lowLatency);
       if (thumbnail) {
         formData.append('thumbnail', thumbnail);
       }
@@ -149,6 +151,22 @@ function AddLiveStreamForm() {
           </p>
         </div>
 
+        {streamUrl.startsWith('rtsp://') && (
+          <div style={{ marginBottom: '20px' }}>
+            <label style={{ display: 'flex', alignItems: 'center', gap: '8px', fontWeight: '500' }}>
+              <input
+                type="checkbox"
+                checked={lowLatency}
+                onChange={(e) => setLowLatency(e.target.checked)}
+              />
+              Low-latency mode
+            </label>
+            <p style={{ fontSize: '12px', color: '#aaa', marginTop: '4px' }}>
+              Uses LL-HLS for ~1-2s delay. Re-encodes the video, so it needs more CPU.
+            </p>
+          </div>
+        )}
+
         <div style={{ marginBottom: '20px' }}>
           <label style={{ display: 'block', marginBottom: '8px', fontWeight: '500' }}>
             Title *
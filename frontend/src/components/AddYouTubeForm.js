@@ -43,14 +43,28 @@ function AddYouTubeForm() {
         throw new Error(errorData.detail || 'Failed to add YouTube video');
       }
 
-      const data = await response.json();
+      // Metadata is fetched in the background; poll the ingest job until it finishes
+      const { job_id: jobId } = await response.json();
+      let job = null;
+      for (let attempt = 0; attempt < 60; attempt++) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/jobs/${jobId}`);
+        if (!jobResponse.ok) continue;
+        job = await jobResponse.json();
+        if (job.status === 'completed' || job.status === 'failed') break;
+      }
+
+      if (!job || job.status !== 'completed') {
+        throw new Error((job && job.error) || 'Timed out waiting for YouTube video import');
+      }
+
       setSuccess(true);
       setYoutubeUrl('');
       setTags('');
 
       // Redirect to the video page after 1 second
       setTimeout(() => {
-        navigate(`/watch/${data.id}`);
+        navigate(`/watch/${job.result.video_id}`);
       }, 1000);
     } catch (err) {
       setError(err.message);
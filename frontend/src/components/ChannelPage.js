@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
+import VideoThumbnail from './VideoThumbnail';
 import EditProfileModal from './EditProfileModal';
 import EditVideoModal from './EditVideoModal';
 
@@ -302,11 +303,7 @@ function ChannelPage() {
                   >
                   <div className="video-thumbnail-container">
                     {video.thumbnail_path && isCompleted ? (
-                      <img
-                        src={`${process.env.REACT_APP_BACKEND_URL}${video.thumbnail_path}`}
-                        alt={video.title}
-                        className="video-thumbnail"
-                      />
+                      <VideoThumbnail video={video} />
                     ) : (
                       <div className="video-thumbnail" style={{
                         backgroundColor: '#272727',
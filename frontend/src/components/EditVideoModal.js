@@ -19,6 +19,16 @@ function EditVideoModal({ isOpen, onClose, video, onUpdate, onDelete }) {
       setTitle(video.title || '');
       setDescription(video.description || '');
       setTags(video.tags ? video.tags.join(', ') : '');
+
+      // List endpoints return cards without the description; load the full video
+      if (video.description === undefined) {
+        fetch(`${process.env.REACT_APP_BACKEND_URL}/videos/${video.id}`)
+          .then(response => (response.ok ? response.json() : null))
+          .then(data => {
+            if (data) setDescription(data.description || '');
+          })
+          .catch(() => {});
+      }
     }
   }, [video]);
 
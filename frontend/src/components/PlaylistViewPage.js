@@ -22,15 +22,18 @@ function PlaylistViewPage() {
   const [playlist, setPlaylist] = useState(null);
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  const fetchPlaylist = async () => {
+  // Videos come a page at a time; video_count is the playlist total. Later pages start
+  // at the number of videos already loaded, which stays right after local removals
+  const fetchPlaylist = async (offset = 0) => {
     try {
       const headers = {};
       if (token) {
         headers['Authorization'] = `Bearer ${token}`;
       }
 
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/playlists/${playlistId}`, {
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/playlists/${playlistId}?offset=${offset}`, {
         headers
       });
 
@@ -40,7 +43,11 @@ function PlaylistViewPage() {
       }
 
       const data = await response.json();
-      setPlaylist(data);
+      if (offset === 0) {
+        setPlaylist(data);
+      } else {
+        setPlaylist(prev => ({ ...data, videos: [...prev.videos, ...data.videos] }));
+      }
     } catch (err) {
       setError(err.message);
     } finally {
@@ -48,6 +55,12 @@ function PlaylistViewPage() {
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    await fetchPlaylist(playlist.videos.length);
+    setLoadingMore(false);
+  };
+
   useEffect(() => {
     fetchPlaylist();
   }, [playlistId, token]);
@@ -73,8 +86,12 @@ function PlaylistViewPage() {
         throw new Error('Failed to remove video from playlist');
       }
 
-      // Refresh playlist
-      fetchPlaylist();
+      // Other videos keep their positions, so drop it locally instead of refetching every page
+      setPlaylist(prev => ({
+        ...prev,
+        videos: prev.videos.filter(video => video.id !== videoId),
+        video_count: Math.max((prev.video_count || 1) - 1, 0)
+      }));
     } catch (err) {
       alert(err.message);
     }
@@ -263,6 +280,25 @@ function PlaylistViewPage() {
             ))}
           </div>
         )}
+        {playlist.videos && playlist.videos.length < (playlist.video_count || 0) && (
+          <div style={{ display: 'flex', justifyContent: 'center', padding: '16px' }}>
+            <button
+              onClick={handleLoadMore}
+              disabled={loadingMore}
+              style={{
+                padding: '10px 24px',
+                backgroundColor: '#272727',
+                color: '#f1f1f1',
+                border: '1px solid #303030',
+                borderRadius: '18px',
+                cursor: 'pointer',
+                opacity: loadingMore ? 0.6 : 1
+              }}
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -21,8 +21,29 @@ function SubscriptionsPage() {
   const [selectedTag, setSelectedTag] = useState(null);
   const [popularTags, setPopularTags] = useState([]);
   const [filteredVideos, setFilteredVideos] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { token } = useAuth();
 
+  // The feed is cursor-paginated; X-Next-Cursor is absent on the last page
+  const fetchSubscriptionsPage = async (cursor) => {
+    const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/videos/subscriptions-feed${params}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.detail || 'Failed to fetch subscriptions feed');
+    }
+
+    const data = await response.json();
+    setNextCursor(response.headers.get('X-Next-Cursor'));
+    return data;
+  };
+
   useEffect(() => {
     const fetchSubscriptionsFeed = async () => {
       if (!token) {
@@ -31,19 +52,7 @@ function SubscriptionsPage() {
       }
 
       try {
-        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/videos/subscriptions-feed`, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-          },
-        });
-
-        if (!response.ok) {
-          const errorData = await response.json();
-          throw new Error(errorData.detail || 'Failed to fetch subscriptions feed');
-        }
-
-        const data = await response.json();
-        setVideos(data);
+        setVideos(await fetchSubscriptionsPage(null));
       } catch (err) {
         setError(err.message);
       }
@@ -52,6 +61,18 @@ function SubscriptionsPage() {
     fetchSubscriptionsFeed();
   }, [token]);
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await fetchSubscriptionsPage(nextCursor);
+      setVideos(prev => [...prev, ...data]);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const fetchPopularTags = async () => {
       if (!token) return;
@@ -227,6 +248,25 @@ function SubscriptionsPage() {
           </Link>
         ))}
       </div>
+      {nextCursor && (
+        <div style={{display: 'flex', justifyContent: 'center', padding: '24px'}}>
+          <button
+            onClick={handleLoadMore}
+            disabled={loadingMore}
+            style={{
+              padding: '10px 24px',
+              backgroundColor: '#272727',
+              color: '#f1f1f1',
+              border: '1px solid #303030',
+              borderRadius: '18px',
+              cursor: 'pointer',
+              opacity: loadingMore ? 0.6 : 1
+            }}
+          >
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
+import VideoThumbnail from './VideoThumbnail';
 
 function formatDuration(seconds) {
   if (!seconds) return '';
@@ -243,11 +244,7 @@ function TrendingPage() {
           >
             <div className="video-thumbnail-container">
               {video.thumbnail_path ? (
-                <img
-                  src={`${process.env.REACT_APP_BACKEND_URL}${video.thumbnail_path}`}
-                  alt={video.title}
-                  className="video-thumbnail"
-                />
+                <VideoThumbnail video={video} />
               ) : (
                 <div className="video-thumbnail" style={{
                   backgroundColor: '#272727',
@@ -80,22 +80,29 @@ function VideoPlayer() {
         setDislikeCount(currentVideo.dislikes || 0);
         setIsLoading(false);
 
-        // Fetch like status
-        try {
-          const statusResponse = await fetch(
-            `${process.env.REACT_APP_BACKEND_URL}/videos/${videoId}/like-status`,
-            {
-              headers: {
-                'Authorization': `Bearer ${token}`,
-              },
+        // Fetch like status (batched viewer-state endpoint, one video here)
+        if (token) {
+          try {
+            const statusResponse = await fetch(
+              `${process.env.REACT_APP_BACKEND_URL}/videos/viewer-state`,
+              {
+                method: 'POST',
+                headers: {
+                  'Authorization': `Bearer ${token}`,
+                  'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ video_ids: [currentVideo.id] }),
+              }
+            );
+            if (statusResponse.ok) {
+              const [state] = await statusResponse.json();
+              if (state) {
+                setLikeStatus(state.like_status);
+              }
             }
-          );
-          if (statusResponse.ok) {
-            const statusData = await statusResponse.json();
-            setLikeStatus(statusData.status);
+          } catch (err) {
+            console.error('Failed to fetch like status:', err);
           }
-        } catch (err) {
-          console.error('Failed to fetch like status:', err);
         }
       } catch (err) {
         console.error('Failed to fetch video metadata:', err);
@@ -153,6 +160,99 @@ function VideoPlayer() {
     }
   }, [isLooping]);
 
+  // Watch history: heartbeats are queued locally and sent in batches; the
+  // backend coalesces them per session and keeps the resume position
+  useEffect(() => {
+    if (!token || !videoData || videoData.youtube_url || videoData.is_live_stream || !videoRef.current) return;
+
+    const video = videoRef.current;
+    const sessionId = `${Date.now().toString(36)}${Math.random().toString(36).slice(2, 10)}`;
+    const source = new URLSearchParams(location.search).get('playlist') ? 'playlist' : null;
+    const pending = [];
+    let watched = 0;
+    let lastTime = null;
+
+    const queueHeartbeat = (ended = false) => {
+      pending.push({
+        video_id: videoData.id,
+        session_id: sessionId,
+        position: Math.floor(video.currentTime || 0),
+        watched: Math.floor(watched),
+        video_duration: Number.isFinite(video.duration) ? Math.floor(video.duration) : null,
+        source,
+        ended,
+      });
+    };
+
+    const sendHeartbeats = (keepalive = false) => {
+      if (pending.length === 0 || watched < 5) return;
+      const events = pending.splice(0, pending.length);
+      fetch(`${process.env.REACT_APP_BACKEND_URL}/watch-events`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ events }),
+        keepalive,
+      }).catch(err => console.error('Failed to send watch events:', err));
+    };
+
+    // Count only time actually played, not seeks
+    const handleTimeUpdate = () => {
+      if (lastTime !== null && !video.paused) {
+        const delta = video.currentTime - lastTime;
+        if (delta > 0 && delta < 2) watched += delta;
+      }
+      lastTime = video.currentTime;
+    };
+    const handleSeeking = () => { lastTime = null; };
+    const handlePause = () => { queueHeartbeat(); sendHeartbeats(); };
+    const handleEnded = () => { queueHeartbeat(true); sendHeartbeats(); };
+    const handlePageHide = () => { queueHeartbeat(); sendHeartbeats(true); };
+
+    // Pick up where the user left off
+    const handleLoadedMetadata = () => {
+      fetch(`${process.env.REACT_APP_BACKEND_URL}/videos/${videoData.id}/resume`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      })
+        .then(response => (response.ok ? response.json() : null))
+        .then(data => {
+          if (data && data.position && video.currentTime < 1) {
+            video.currentTime = data.position;
+          }
+        })
+        .catch(() => {});
+    };
+
+    video.addEventListener('timeupdate', handleTimeUpdate);
+    video.addEventListener('seeking', handleSeeking);
+    video.addEventListener('pause', handlePause);
+    video.addEventListener('ended', handleEnded);
+    video.addEventListener('loadedmetadata', handleLoadedMetadata, { once: true });
+    window.addEventListener('pagehide', handlePageHide);
+
+    const heartbeatTimer = setInterval(() => {
+      if (!video.paused) queueHeartbeat();
+    }, 10000);
+    const sendTimer = setInterval(() => sendHeartbeats(), 30000);
+
+    return () => {
+      clearInterval(heartbeatTimer);
+      clearInterval(sendTimer);
+      video.removeEventListener('timeupdate', handleTimeUpdate);
+      video.removeEventListener('seeking', handleSeeking);
+      video.removeEventListener('pause', handlePause);
+      video.removeEventListener('ended', handleEnded);
+      video.removeEventListener('loadedmetadata', handleLoadedMetadata);
+      window.removeEventListener('pagehide', handlePageHide);
+      queueHeartbeat();
+      sendHeartbeats(true);
+    };
+  }, [videoData, token, location.search]);
+
   useEffect(() => {
     if (!videoData || !videoRef.current) return;
 
@@ -205,7 +305,7 @@ function VideoPlayer() {
         const proxyUrl = `${process.env.REACT_APP_BACKEND_URL}/stream/proxy/${videoData.id}/playlist.m3u8`;
 
         if (Hls.isSupported()) {
-          const hls = new Hls();
+          const hls = new Hls(videoData.live_low_latency ? { lowLatencyMode: true, backBufferLength: 30 } : {});
           hls.loadSource(proxyUrl);
           hls.attachMedia(video);
           hlsRef.current = hls;
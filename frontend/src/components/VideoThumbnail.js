@@ -0,0 +1,49 @@
+import React from 'react';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Builds a srcset string for one format from the API's {size: {format: url, width}} map
+function buildSrcSet(srcset, format) {
+  return Object.values(srcset)
+    .filter((entry) => entry[format])
+    .map((entry) => `${BACKEND_URL}${entry[format]} ${entry.width}w`)
+    .join(', ');
+}
+
+function VideoThumbnail({ video, sizes = '(max-width: 600px) 100vw, 320px' }) {
+  const srcset = video.thumbnail_srcset;
+  const placeholderStyle = video.thumbnail_placeholder ? {
+    backgroundImage: `url(${video.thumbnail_placeholder})`,
+    backgroundSize: 'cover'
+  } : undefined;
+
+  if (!srcset) {
+    return (
+      <img
+        src={`${BACKEND_URL}${video.thumbnail_path}`}
+        alt={video.title}
+        className="video-thumbnail"
+        loading="lazy"
+      />
+    );
+  }
+
+  const fallback = srcset.card || Object.values(srcset)[0];
+  return (
+    <picture>
+      {fallback.avif && <source type="image/avif" srcSet={buildSrcSet(srcset, 'avif')} sizes={sizes} />}
+      <source type="image/webp" srcSet={buildSrcSet(srcset, 'webp')} sizes={sizes} />
+      <img
+        src={`${BACKEND_URL}${fallback.jpeg}`}
+        srcSet={buildSrcSet(srcset, 'jpeg')}
+        sizes={sizes}
+        alt={video.title}
+        className="video-thumbnail"
+        loading="lazy"
+        style={placeholderStyle}
+      />
+    </picture>
+  );
+}
+
+export default VideoThumbnail;